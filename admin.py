@@ -0,0 +1,129 @@
+import hmac
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import FileResponse
+from pydantic import BaseModel
+
+import memory_profiling
+import profiling
+import slow_query_log
+import tracing
+from config import settings
+from loop_monitor import monitor as loop_monitor
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Allow the request only with the configured X-Admin-Token; admin endpoints are off when ADMIN_TOKEN is unset."""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+@router.get("/slow-queries")
+async def get_slow_queries(top: int = Query(10, ge=1, le=100)):
+    """Top statement shapes over the slow-query threshold in this worker, by total time."""
+    return {
+        "enabled": settings.SLOW_QUERY_LOG_ENABLED,
+        "threshold_ms": settings.SLOW_QUERY_THRESHOLD_MS,
+        "log_file": settings.SLOW_QUERY_LOG_FILE,
+        "queries": slow_query_log.summary(top),
+    }
+
+@router.delete("/slow-queries")
+async def reset_slow_queries():
+    """Clear this worker's slow-query summary."""
+    slow_query_log.reset()
+    return {"message": "Slow query summary cleared"}
+
+@router.get("/loop-stalls")
+async def get_loop_stalls():
+    """Recent event loop stalls in this worker with the blocking stack, newest first."""
+    return {
+        "threshold_ms": loop_monitor.threshold * 1000,
+        "stalls": loop_monitor.recent_stalls(),
+    }
+
+class ProfilingArmRequest(BaseModel):
+    path_prefix: str
+    count: int = 1
+
+@router.get("/profiling")
+async def get_profiling():
+    """Profiling state for this worker and the stored profiles."""
+    return {
+        "enabled": settings.PROFILING_ENABLED,
+        "armed": profiling.state.armed(),
+        "profiles": profiling.list_profiles(),
+    }
+
+@router.post("/profiling/arm")
+async def arm_profiling(request: ProfilingArmRequest):
+    """Profile the next `count` requests in this worker whose path starts with `path_prefix`."""
+    if not settings.PROFILING_ENABLED:
+        raise HTTPException(status_code=409, detail="Profiling is disabled (PROFILING_ENABLED=false)")
+    profiling.state.arm(request.path_prefix, max(0, min(request.count, settings.PROFILING_RATE_LIMIT_PER_MINUTE)))
+    return profiling.state.armed()
+
+@router.delete("/profiling/arm")
+async def disarm_profiling():
+    """Cancel any armed profiles."""
+    profiling.state.disarm()
+    return profiling.state.armed()
+
+@router.get("/profiling/{name}")
+async def download_profile(name: str):
+    """Download a stored profile."""
+    path = profiling.profile_path(name)
+    if not path:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=name)
+
+@router.get("/memory")
+def get_memory():
+    """Memory usage and tracemalloc state for this worker."""
+    return memory_profiling.status()
+
+@router.post("/memory/tracemalloc/start")
+def start_tracemalloc(frames: int = Query(1, ge=1, le=50)):
+    """Start tracing allocations in this worker."""
+    memory_profiling.start(frames)
+    return memory_profiling.status()
+
+@router.post("/memory/tracemalloc/stop")
+def stop_tracemalloc():
+    """Stop tracing allocations and drop stored snapshots."""
+    memory_profiling.stop()
+    return memory_profiling.status()
+
+@router.post("/memory/snapshots/{name}")
+def take_memory_snapshot(name: str):
+    """Take a named tracemalloc snapshot."""
+    try:
+        return memory_profiling.take_snapshot(name)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.get("/memory/diff")
+def get_memory_diff(base: str, target: Optional[str] = None,
+                    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+                    top: int = Query(20, ge=1, le=200)):
+    """Top allocation changes between two snapshots, or from `base` to now."""
+    try:
+        return {"base": base, "target": target or "now", "group_by": group_by,
+                "stats": memory_profiling.diff(base, target, group_by, top)}
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Snapshot {e.args[0]} not found")
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.get("/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    """Spans of a recent trace recorded by this worker, in start order."""
+    if tracing.exporter is None:
+        raise HTTPException(status_code=409, detail="Tracing is disabled (TRACING_ENABLED=false)")
+    spans = sorted(tracing.exporter.spans(trace_id), key=lambda span: span.start_ns)
+    if not spans:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return {"trace_id": trace_id, "spans": [span.to_dict() for span in spans]}
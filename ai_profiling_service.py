@@ -1,8 +1,10 @@
 import json
 import logging
 from typing import Dict, List, Any, Optional
+from sqlalchemy.orm import Session
 from datetime import datetime
-from openai_service import get_openai_service, SYSTEM_MSG, DEV_MSG, TOOLS, PROFILE_SCHEMA
+from openai_service import get_openai_service, UpstreamError, SYSTEM_MSG, DEV_MSG, TOOLS, PROFILE_SCHEMA
+import meal_plan_cache
 
 logger = logging.getLogger(__name__)
 
@@ -66,6 +68,9 @@ class AIProfilingService:
                 "is_complete": session_data.get("is_complete", False)
             }
 
+        except UpstreamError:
+            # The caller answers 503 so the turn can be retried
+            raise
         except Exception as e:
             logger.error(f"Error processing user response: {e}")
             return {
@@ -123,6 +128,8 @@ class AIProfilingService:
             else:
                 return choice.message.content or "I'm here to help you. What would you like to share?", []
                 
+        except UpstreamError:
+            raise
         except Exception as e:
             logger.error(f"Error getting AI response: {e}")
             return "I'm here to help you build your health profile. What brought you here today?", []
@@ -146,14 +153,13 @@ class AIProfilingService:
                     # GPT wants to generate a meal plan
                     profile_id = function_args.get("profile_id")
                     logger.info(f"Meal plan generation requested for profile {profile_id}")
+                    if session_data.get("collected_data"):
+                        session_data["meal_plan"] = self.build_meal_plan(session_data["collected_data"])
             
         except Exception as e:
             logger.error(f"Error handling tool calls: {e}")
 
-    def build_meal_plan(self, profile_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Build a personalized meal plan from profile data"""
-        # This would integrate with your existing meal plan generation logic
-        return {
-            "message": "Meal plan generation not yet implemented",
-            "profile_data": profile_data
-        }
\ No newline at end of file
+    def build_meal_plan(self, profile_data: Dict[str, Any], db: Optional[Session] = None) -> Dict[str, Any]:
+        """Build a personalized 7-day meal plan from profile data with the local planner (no LLM call)"""
+        # Shared with similar profiles through the plan cache; db adds its persistent tier
+        return meal_plan_cache.build_plan(profile_data, db)
@@ -0,0 +1,75 @@
+"""Contention benchmark for request coalescing on hot read endpoints.
+
+Fires bursts of identical concurrent requests (as a dashboard with several tabs
+open does) at the progress, feedback and health-profile endpoints, with
+coalescing disabled and enabled, and reports wall time and SQL statements.
+
+    python benchmarks/bench_coalescing.py --concurrency 32 --rounds 20
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import date
+
+from common import use_temporary_database, seed_user, asgi_request, percentile
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=32, help="identical requests per burst")
+    parser.add_argument("--rounds", type=int, default=20, help="bursts per endpoint")
+    parser.add_argument("--days", type=int, default=365, help="days of seeded habit logs")
+    args = parser.parse_args()
+
+    db_path = use_temporary_database()
+    from sqlalchemy import event
+    import coalesce
+    from config import settings
+    from database import SessionLocal, engine
+    from main import app
+
+    db = SessionLocal()
+    user_id = seed_user(db, days=args.days)
+    db.close()
+
+    statements = {"count": 0}
+    event.listen(engine, "before_cursor_execute", lambda *a: statements.__setitem__("count", statements["count"] + 1))
+
+    today = date.today()
+    week_start = today.fromordinal(today.toordinal() - today.weekday())
+    urls = [
+        f"/users/{user_id}/progress/weekly/{week_start.isoformat()}/water",
+        f"/users/{user_id}/progress/monthly/{today.year}/{today.month}/water",
+        f"/users/{user_id}/feedback/water?days=30",
+        f"/users/{user_id}/health-profile",
+    ]
+
+    async def burst(url):
+        start = time.perf_counter()
+        results = await asyncio.gather(*[asgi_request(app, "GET", url) for _ in range(args.concurrency)])
+        assert all(status == 200 for status, _ in results), results[0]
+        return time.perf_counter() - start
+
+    async def run(url):
+        timings = []
+        for _ in range(args.rounds):
+            coalesce.clear()
+            timings.append(await burst(url))
+        return timings
+
+    print(f"{'endpoint':<58} {'mode':<10} {'p50 ms':>8} {'p95 ms':>8} {'stmts/burst':>12}")
+    try:
+        for url in urls:
+            for enabled in (False, True):
+                settings.COALESCE_ENABLED = enabled
+                statements["count"] = 0
+                timings = asyncio.run(run(url))
+                mode = "coalesced" if enabled else "baseline"
+                print(f"{url[:58]:<58} {mode:<10} {percentile(timings, 50) * 1000:>8.2f} "
+                      f"{percentile(timings, 95) * 1000:>8.2f} {statements['count'] / args.rounds:>12.1f}")
+    finally:
+        engine.dispose()
+        os.remove(db_path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Serialization benchmark for the habit-log and user list endpoints.
+
+Compares the previous path (ORM objects -> response_model validation -> JSON)
+with the fast path (Core rows -> orjson bytes) on a large response, reporting
+CPU time and peak Python memory per request.
+
+    python benchmarks/bench_list_serialization.py --rows 10000
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import time
+import tracemalloc
+from datetime import date, timedelta
+from typing import List
+
+from common import use_temporary_database, asgi_request
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000, help="rows in the response")
+    parser.add_argument("--repeat", type=int, default=5, help="requests per measurement")
+    args = parser.parse_args()
+
+    db_path = use_temporary_database()
+    from fastapi import Depends, FastAPI
+    from sqlalchemy.orm import Session
+    from crud import get_habit_logs, get_users
+    from database import SessionLocal, engine, get_db
+    from main import app
+    from models import DailyHabitLog, User
+    from schemas import HabitLogResponse, UserResponse
+
+    db = SessionLocal()
+    user = User(email="bench@example.com", username="bench", hashed_password="not-a-real-hash")
+    db.add(user)
+    db.flush()
+    user_id = user.id
+    today = date.today()
+    db.add_all([
+        DailyHabitLog(user_id=user_id, log_date=today - timedelta(days=i), habit_type="water",
+                      logged_value=1500 + i % 700, unit="ml", notes="after lunch" if i % 3 else None)
+        for i in range(args.rows)
+    ])
+    db.add_all([
+        User(email=f"user{i}@example.com", username=f"user{i}", full_name=f"User {i}", hashed_password="x")
+        for i in range(args.rows - 1)
+    ])
+    db.commit()
+    db.close()
+
+    # The endpoints as they were before the fast path
+    before_app = FastAPI()
+
+    @before_app.get("/users/{user_id}/habit-logs", response_model=List[HabitLogResponse])
+    async def old_habit_logs(user_id: int, db: Session = Depends(get_db)):
+        return get_habit_logs(db, user_id)
+
+    @before_app.get("/users/", response_model=List[UserResponse])
+    async def old_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+        return get_users(db, skip=skip, limit=limit)
+
+    def measure(target_app, url):
+        async def run():
+            status, body = await asgi_request(target_app, "GET", url)
+            assert status == 200, body[:200]
+            return body
+
+        body = asyncio.run(run())  # warm up
+        gc.collect()
+        cpu_start = time.process_time()
+        for _ in range(args.repeat):
+            asyncio.run(run())
+        cpu_ms = (time.process_time() - cpu_start) / args.repeat * 1000
+
+        gc.collect()
+        tracemalloc.start()
+        asyncio.run(run())
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return cpu_ms, peak / 1024 / 1024, body
+
+    print(f"{'endpoint':<32} {'path':<16} {'cpu ms/req':>11} {'peak MiB':>9} {'bytes':>10}")
+    try:
+        for url in [f"/users/{user_id}/habit-logs", f"/users/?limit={args.rows}"]:
+            results = {}
+            for label, target_app in [("orm+pydantic", before_app), ("rows+orjson", app)]:
+                cpu_ms, peak_mib, body = measure(target_app, url)
+                results[label] = body
+                print(f"{url.split('?')[0]:<32} {label:<16} {cpu_ms:>11.1f} {peak_mib:>9.1f} {len(body):>10}")
+            assert json.loads(results["orm+pydantic"]) == json.loads(results["rows+orjson"]), "responses differ"
+    finally:
+        engine.dispose()
+        os.remove(db_path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Request logging overhead benchmark on /health.
+
+Compares throughput of a bare app, the previous @app.middleware("http")
+logging middleware and the pure ASGI RequestLoggingMiddleware with its
+queue listener. Log output goes to os.devnull so only the middleware cost
+is measured.
+
+    python benchmarks/bench_middleware.py --requests 5000 --concurrency 50
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+from common import use_temporary_database, asgi_request
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000, help="requests per variant")
+    parser.add_argument("--concurrency", type=int, default=50, help="requests in flight at once")
+    parser.add_argument("--sample-rate", type=float, default=1.0, help="ACCESS_LOG_SAMPLE_RATE for the new middleware")
+    args = parser.parse_args()
+
+    db_path = use_temporary_database()
+    from fastapi import FastAPI, Request
+    from config import settings
+    import request_logging
+    from request_logging import JSONFormatter, RequestLoggingMiddleware
+
+    devnull = open(os.devnull, "w")
+    settings.ACCESS_LOG_SAMPLE_RATE = args.sample_rate
+
+    def make_app():
+        app = FastAPI()
+
+        @app.get("/health")
+        async def health_check():
+            return {"status": "healthy", "timestamp": time.time()}
+
+        return app
+
+    bare_app = make_app()
+
+    # The middleware as it was before
+    old_app = make_app()
+    old_logger = logging.getLogger("bench.old")
+    old_logger.propagate = False
+    old_logger.setLevel(logging.INFO)
+    old_logger.addHandler(logging.StreamHandler(devnull))
+
+    @old_app.middleware("http")
+    async def log_requests(request: Request, call_next):
+        start_time = time.time()
+        response = await call_next(request)
+        process_time = time.time() - start_time
+        old_logger.info(f"{request.method} {request.url} - {response.status_code} - {process_time:.3f}s")
+        return response
+
+    new_app = make_app()
+    new_app.add_middleware(RequestLoggingMiddleware)
+    handler = logging.StreamHandler(devnull)
+    handler.setFormatter(JSONFormatter())
+    request_logging.start([handler])
+
+    async def run(target_app):
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def one():
+            async with semaphore:
+                status, _ = await asgi_request(target_app, "GET", "/health")
+                assert status == 200
+
+        await asyncio.gather(*(one() for _ in range(200)))  # warm up
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(args.requests)))
+        return args.requests / (time.perf_counter() - start)
+
+    print(f"{'variant':<28} {'req/s':>10} {'overhead':>9}")
+    try:
+        baseline = asyncio.run(run(bare_app))
+        print(f"{'no middleware':<28} {baseline:>10.0f} {'-':>9}")
+        for label, target_app in [("@app.middleware('http')", old_app), ("pure ASGI + QueueListener", new_app)]:
+            throughput = asyncio.run(run(target_app))
+            overhead = (baseline / throughput - 1) * 100
+            print(f"{label:<28} {throughput:>10.0f} {overhead:>8.1f}%")
+    finally:
+        request_logging.stop()
+        devnull.close()
+        os.remove(db_path)
+
+if __name__ == "__main__":
+    main()
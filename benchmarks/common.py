@@ -0,0 +1,103 @@
+"""Shared helpers for the benchmark scripts.
+
+Benchmarks drive the ASGI app in-process so they need nothing beyond the app's
+own requirements. Call use_temporary_database() before importing any app module.
+"""
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+from datetime import date, timedelta
+from typing import Iterable, Optional, Tuple
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+HABITS = [("water", 2000, "ml"), ("exercise", 30, "minutes"), ("sleep", 8, "hours"), ("meals", 3, "count")]
+
+def use_temporary_database() -> str:
+    """Point the app at a throwaway SQLite file and return its path."""
+    fd, path = tempfile.mkstemp(prefix="nutrition_bench_", suffix=".db")
+    os.close(fd)
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    return path
+
+def seed_user(db, index: int = 0, days: int = 365, seed: int = 42):
+    """Create a user with a health profile, habit targets and `days` of habit logs; return its id."""
+    from models import User, UserHealthProfile, HabitTarget, DailyHabitLog
+
+    rng = random.Random(seed + index)
+    user = User(email=f"bench{index}@example.com", username=f"bench{index}", hashed_password="not-a-real-hash")
+    db.add(user)
+    db.flush()
+    db.add(UserHealthProfile(
+        user_id=user.id, age=30 + index % 40, gender="female", height_cm=170, weight_kg=70,
+        activity_level="moderately_active", dietary_restrictions=["vegetarian"], health_conditions=[],
+        fitness_goals=["fat_loss"], allergies=["peanuts"] if index % 5 == 0 else [], medications=[]
+    ))
+    today = date.today()
+    for habit_type, target, unit in HABITS:
+        db.add(HabitTarget(user_id=user.id, habit_type=habit_type, target_value=target, target_unit=unit))
+        db.add_all([
+            DailyHabitLog(user_id=user.id, log_date=today - timedelta(days=offset), habit_type=habit_type,
+                          logged_value=round(target * rng.uniform(0.4, 1.3), 1), unit=unit)
+            for offset in range(days)
+        ])
+    db.commit()
+    return user.id
+
+async def asgi_request(app, method: str, url: str, body: Optional[dict] = None,
+                       headers: Iterable[Tuple[str, str]] = ()) -> Tuple[int, bytes]:
+    """Send one request straight to an ASGI app and return (status, body)."""
+    parts = urlsplit(url)
+    payload = json.dumps(body).encode() if body is not None else b""
+    raw_headers = [(b"host", b"bench")] + [(k.lower().encode(), v.encode()) for k, v in headers]
+    if body is not None:
+        raw_headers.append((b"content-type", b"application/json"))
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": parts.path,
+        "raw_path": parts.path.encode(),
+        "query_string": parts.query.encode(),
+        "root_path": "",
+        "headers": raw_headers,
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+    sent = False
+    status = 0
+    chunks = []
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        # Never report a disconnect while the response is still being produced
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, b"".join(chunks)
+
+def percentile(values, pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
@@ -0,0 +1,60 @@
+"""Compare two load_test.py reports endpoint by endpoint.
+
+Prints the change in throughput and p50/p95/p99 latency, and exits with
+status 1 when any endpoint's `--metric` latency grew by more than
+`--threshold` percent (or its error count went up), so it can gate CI.
+
+    python benchmarks/compare_load_reports.py reports/base.json reports/head.json --threshold 10
+"""
+import argparse
+import json
+import sys
+
+def _change(before: float, after: float) -> float:
+    if not before:
+        return 0.0
+    return (after - before) / before * 100
+
+def compare(base: dict, head: dict, metric: str, threshold: float, min_count: int):
+    """Yield (endpoint, base stats, head stats, regressed) for endpoints in either report."""
+    for endpoint in sorted(set(base["endpoints"]) | set(head["endpoints"])):
+        before, after = base["endpoints"].get(endpoint), head["endpoints"].get(endpoint)
+        regressed = False
+        if before and after and min(before["count"], after["count"]) >= min_count:
+            regressed = _change(before[metric], after[metric]) > threshold or after["errors"] > before["errors"]
+        yield endpoint, before, after, regressed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--metric", default="p95_ms", choices=["p50_ms", "p95_ms", "p99_ms", "mean_ms"])
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed latency increase in percent")
+    parser.add_argument("--min-count", type=int, default=20, help="ignore endpoints with fewer samples")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+    print(f"base {base['meta'].get('commit')}  vs  head {head['meta'].get('commit')}")
+    print(f"{'endpoint':<66} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+
+    regressions = []
+    for endpoint, before, after, regressed in compare(base, head, args.metric, args.threshold, args.min_count):
+        if not before or not after:
+            print(f"{endpoint:<66} {'only in ' + ('head' if after else 'base'):>35}")
+            continue
+        cells = [f"{_change(before[key], after[key]):+7.1f}%" for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")]
+        print(f"{endpoint:<66} {' '.join(cells)}{'  REGRESSION' if regressed else ''}")
+        if regressed:
+            regressions.append(endpoint)
+
+    summary = [f"{_change(base['summary'][key], head['summary'][key]):+7.1f}%" for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")]
+    print(f"{'TOTAL':<66} {' '.join(summary)}")
+    if regressions:
+        print(f"\n{len(regressions)} endpoint(s) regressed by more than {args.threshold}% on {args.metric} or added errors")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
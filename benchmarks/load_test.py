@@ -0,0 +1,495 @@
+"""Load test the API with a weighted mix of user scenarios.
+
+By default this seeds a fresh SQLite database (seed_load_data.py), starts
+the OpenAI emulator and runs the app under gunicorn with gunicorn.conf.py,
+then drives it with `--concurrency` virtual users for `--duration` seconds.
+Each virtual user repeatedly picks a scenario (signup, onboarding,
+profiling_chat, habit_logging, dashboard) by weight and runs its requests
+back to back over a keep-alive connection.
+
+The JSON report has throughput and p50/p95/p99 latency per endpoint (by
+route template) and per scenario, plus the git commit and settings used.
+Compare two reports with compare_load_reports.py.
+
+    python benchmarks/load_test.py --duration 60 --concurrency 50 --output reports/$(git rev-parse --short HEAD).json
+    python benchmarks/load_test.py --base-url http://127.0.0.1:8000 --mix dashboard=1
+
+SQLite serializes writes across workers; pass a PostgreSQL --database-url
+for numbers comparable to production.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, datetime, timezone, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from common import ROOT, HABITS, percentile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MIX = {"dashboard": 40, "habit_logging": 30, "profiling_chat": 10, "onboarding": 10, "signup": 10}
+
+class Connection:
+    """Minimal keep-alive HTTP/1.1 client so the load generator adds as little overhead as possible."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, method: str, path: str, body: Any = None,
+                      headers: Optional[Dict[str, str]] = None) -> Tuple[int, bytes]:
+        payload = json.dumps(body).encode() if body is not None else b""
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", f"Content-Length: {len(payload)}"]
+        if body is not None:
+            lines.append("Content-Type: application/json")
+        lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+        message = ("\r\n".join(lines) + "\r\n\r\n").encode() + payload
+
+        # The server may have closed an idle connection (uvicorn does after an
+        # unhandled exception); retry once on a fresh one in that case
+        reused = self.writer is not None
+        for attempt in range(2 if reused else 1):
+            if self.writer is None:
+                self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+            try:
+                self.writer.write(message)
+                await self.writer.drain()
+                return await self._read_response()
+            except ConnectionResetError:
+                self.close()
+                if attempt or not reused:
+                    raise
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                self.close()
+                raise
+
+    async def _read_response(self) -> Tuple[int, bytes]:
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed by server")
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        if "content-length" in response_headers:
+            data = await self.reader.readexactly(int(response_headers["content-length"]))
+        elif response_headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                chunks.append(chunk[:-2])
+            data = b"".join(chunks)
+        else:
+            data = await self.reader.read()
+            response_headers["connection"] = "close"
+        if response_headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, data
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+class Recorder:
+    """Collects one sample per request and per scenario run after the warm-up."""
+
+    def __init__(self):
+        self.recording = False
+        self.requests: Dict[str, List[Tuple[int, float]]] = defaultdict(list)
+        self.scenarios: Dict[str, List[Tuple[bool, float]]] = defaultdict(list)
+
+class VirtualUser:
+    def __init__(self, index: int, conn: Connection, recorder: Recorder, pool: "UserPool", seed: int):
+        self.index = index
+        self.conn = conn
+        self.recorder = recorder
+        self.pool = pool
+        self.rng = random.Random(seed + index)
+        self.ok = True
+
+    async def call(self, endpoint: str, method: str, path: str, body: Any = None,
+                   headers: Optional[Dict[str, str]] = None) -> Tuple[int, Any]:
+        """Send a request and record it under `endpoint` (the route template)."""
+        start = time.perf_counter()
+        try:
+            status, data = await self.conn.request(method, path, body, headers)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            status, data = 0, b""
+        elapsed = time.perf_counter() - start
+        if self.recorder.recording:
+            self.recorder.requests[f"{method} {endpoint}"].append((status, elapsed))
+        if status == 0 or status >= 500:
+            self.ok = False
+        try:
+            return status, json.loads(data) if data else None
+        except ValueError:
+            return status, None
+
+class UserPool:
+    """User ids the scenarios act as; signups add to it."""
+
+    def __init__(self, user_ids: List[int]):
+        self.user_ids = list(user_ids)
+
+    def pick(self, rng: random.Random) -> int:
+        return rng.choice(self.user_ids)
+
+# Scenarios
+async def signup(vu: VirtualUser) -> None:
+    name = f"load-{uuid.uuid4().hex[:12]}"
+    status, user = await vu.call("/users/", "POST", "/users/", {
+        "email": f"{name}@example.com", "username": name, "full_name": "Load Test", "password": "correct-horse-battery",
+    })
+    if status != 200:
+        return
+    user_id = user["id"]
+    await vu.call("/users/{user_id}/health-profile", "POST", f"/users/{user_id}/health-profile", {
+        "age": vu.rng.randint(18, 70), "gender": "female", "height_cm": 168, "weight_kg": 70,
+        "activity_level": "moderately_active", "dietary_restrictions": [], "fitness_goals": ["fat_loss"],
+    })
+    for habit_type, target, unit in HABITS:
+        await vu.call("/users/{user_id}/habit-targets", "POST", f"/users/{user_id}/habit-targets",
+                      {"habit_type": habit_type, "target_value": target, "target_unit": unit})
+    vu.pool.user_ids.append(user_id)
+
+ONBOARDING_ANSWERS = [
+    "A friend recommended it", "I want more energy for my kids", "I'm 172cm and about 80kg",
+    "I walk most days and lift twice a week", "I eat most things but not mushrooms",
+]
+
+async def onboarding(vu: VirtualUser) -> None:
+    user_id = vu.pool.pick(vu.rng)
+    status, started = await vu.call("/start-onboarding/{user_id}", "POST", f"/start-onboarding/{user_id}")
+    if status != 200:
+        return
+    session_data = started["session_data"]
+    for answer in ONBOARDING_ANSWERS[:vu.rng.randint(2, len(ONBOARDING_ANSWERS))]:
+        status, reply = await vu.call("/onboarding-chat", "POST", "/onboarding-chat",
+                                      {"user_id": user_id, "message": answer, "session_data": session_data})
+        if status != 200 or not reply or "session_data" not in reply:
+            return
+        session_data = reply["session_data"]
+
+PROFILING_ANSWERS = [
+    "I saw an ad on Instagram", "I want to lose weight before my wedding", "Honestly I want to feel confident again",
+    "I'm 165cm, 72kg and want to get to 63kg in six months", "I have a desk job and run twice a week",
+]
+
+async def profiling_chat(vu: VirtualUser) -> None:
+    user_id = vu.pool.pick(vu.rng)
+    status, started = await vu.call("/start-ai-profiling/{user_id}", "POST", f"/start-ai-profiling/{user_id}")
+    if status != 200 or not started or "session_data" not in started:
+        return
+    session_data = started["session_data"]
+    for answer in PROFILING_ANSWERS[:vu.rng.randint(2, len(PROFILING_ANSWERS))]:
+        status, reply = await vu.call("/ai-profiling-chat", "POST", "/ai-profiling-chat",
+                                      {"user_id": user_id, "message": answer, "session_data": session_data},
+                                      headers={"Idempotency-Key": uuid.uuid4().hex})
+        if status != 200 or not reply or "session_data" not in reply:
+            return
+        session_data = reply["session_data"]
+
+async def habit_logging(vu: VirtualUser) -> None:
+    user_id = vu.pool.pick(vu.rng)
+    today = date.today().isoformat()
+    habit_type, target, unit = vu.rng.choice(HABITS)
+    value = round(target * vu.rng.uniform(0.2, 1.2), 1)
+    status, _ = await vu.call("/users/{user_id}/habit-logs", "POST", f"/users/{user_id}/habit-logs",
+                              {"log_date": today, "habit_type": habit_type, "logged_value": value, "unit": unit},
+                              headers={"Idempotency-Key": uuid.uuid4().hex})
+    if status == 400:
+        # Already logged today: the app updates the day's entry instead
+        await vu.call("/users/{user_id}/habit-logs/{log_date}/{habit_type}", "PUT",
+                      f"/users/{user_id}/habit-logs/{today}/{habit_type}", {"logged_value": value})
+    await vu.call("/users/{user_id}/progress/daily/{target_date}/{habit_type}", "GET",
+                  f"/users/{user_id}/progress/daily/{today}/{habit_type}")
+
+async def dashboard(vu: VirtualUser) -> None:
+    user_id = vu.pool.pick(vu.rng)
+    today = date.today()
+    week_start = today - timedelta(days=today.weekday())
+    habit_type = vu.rng.choice(HABITS)[0]
+    await vu.call("/users/{user_id}", "GET", f"/users/{user_id}")
+    await vu.call("/users/{user_id}/habit-targets", "GET", f"/users/{user_id}/habit-targets")
+    await vu.call("/users/{user_id}/habit-logs", "GET",
+                  f"/users/{user_id}/habit-logs?start_date={(today - timedelta(days=30)).isoformat()}")
+    await vu.call("/users/{user_id}/progress/weekly/{week_start}/{habit_type}", "GET",
+                  f"/users/{user_id}/progress/weekly/{week_start.isoformat()}/{habit_type}")
+    await vu.call("/users/{user_id}/progress/monthly/{year}/{month}/{habit_type}", "GET",
+                  f"/users/{user_id}/progress/monthly/{today.year}/{today.month}/{habit_type}")
+    await vu.call("/users/{user_id}/feedback/{habit_type}", "GET", f"/users/{user_id}/feedback/{habit_type}")
+    await vu.call("/users/{user_id}/message-usage", "GET", f"/users/{user_id}/message-usage")
+
+SCENARIOS = {
+    "signup": signup,
+    "onboarding": onboarding,
+    "profiling_chat": profiling_chat,
+    "habit_logging": habit_logging,
+    "dashboard": dashboard,
+}
+
+async def run_virtual_user(vu: VirtualUser, mix: Dict[str, float], deadline: float) -> None:
+    names, weights = list(mix), list(mix.values())
+    while time.monotonic() < deadline:
+        name = vu.rng.choices(names, weights)[0]
+        vu.ok = True
+        recording = vu.recorder.recording
+        start = time.perf_counter()
+        await SCENARIOS[name](vu)
+        if recording and vu.recorder.recording:
+            vu.recorder.scenarios[name].append((vu.ok, time.perf_counter() - start))
+    vu.conn.close()
+
+async def discover_users(host: str, port: int) -> List[int]:
+    conn = Connection(host, port)
+    user_ids, skip = [], 0
+    while True:
+        status, data = await conn.request("GET", f"/users/?skip={skip}&limit=1000")
+        if status != 200:
+            raise RuntimeError(f"GET /users/ returned {status}")
+        page = json.loads(data)
+        user_ids.extend(user["id"] for user in page)
+        if len(page) < 1000:
+            break
+        skip += 1000
+    conn.close()
+    return user_ids
+
+async def drive(host: str, port: int, args) -> Tuple[Recorder, float]:
+    user_ids = await discover_users(host, port)
+    if not user_ids:
+        raise RuntimeError("No users to act as; seed the database first")
+    recorder = Recorder()
+    pool = UserPool(user_ids)
+    start = time.monotonic()
+    deadline = start + args.warmup + args.duration
+    vus = [VirtualUser(i, Connection(host, port), recorder, pool, args.seed) for i in range(args.concurrency)]
+    tasks = [asyncio.create_task(run_virtual_user(vu, args.mix, deadline)) for vu in vus]
+    await asyncio.sleep(args.warmup)
+    recorder.recording = True
+    measured_start = time.monotonic()
+    await asyncio.gather(*tasks)
+    return recorder, time.monotonic() - measured_start
+
+def _latency_stats(latencies: List[float]) -> Dict[str, float]:
+    millis = [latency * 1000 for latency in latencies]
+    return {
+        "mean_ms": round(sum(millis) / len(millis), 2) if millis else 0.0,
+        "p50_ms": round(percentile(millis, 50), 2),
+        "p95_ms": round(percentile(millis, 95), 2),
+        "p99_ms": round(percentile(millis, 99), 2),
+        "max_ms": round(max(millis), 2) if millis else 0.0,
+    }
+
+def build_report(recorder: Recorder, elapsed: float, meta: Dict[str, Any]) -> Dict[str, Any]:
+    endpoints = {}
+    for endpoint, samples in sorted(recorder.requests.items()):
+        statuses = defaultdict(int)
+        for status, _ in samples:
+            statuses[str(status)] += 1
+        endpoints[endpoint] = {
+            "count": len(samples),
+            "throughput_rps": round(len(samples) / elapsed, 2),
+            "errors": sum(1 for status, _ in samples if status == 0 or status >= 500),
+            "statuses": dict(statuses),
+            **_latency_stats([latency for _, latency in samples]),
+        }
+    scenarios = {
+        name: {
+            "count": len(runs),
+            "throughput_rps": round(len(runs) / elapsed, 2),
+            "failed": sum(1 for ok, _ in runs if not ok),
+            **_latency_stats([latency for _, latency in runs]),
+        }
+        for name, runs in sorted(recorder.scenarios.items())
+    }
+    all_samples = [sample for samples in recorder.requests.values() for sample in samples]
+    return {
+        "meta": meta,
+        "summary": {
+            "duration_s": round(elapsed, 2),
+            "requests": len(all_samples),
+            "throughput_rps": round(len(all_samples) / elapsed, 2),
+            "errors": sum(1 for status, _ in all_samples if status == 0 or status >= 500),
+            **_latency_stats([latency for _, latency in all_samples]),
+        },
+        "endpoints": endpoints,
+        "scenarios": scenarios,
+    }
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"{'endpoint':<66} {'count':>7} {'req/s':>8} {'err':>5} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for name, stats in list(report["endpoints"].items()) + [("TOTAL", report["summary"])]:
+        count = stats.get("count", stats.get("requests"))
+        print(f"{name:<66} {count:>7} {stats['throughput_rps']:>8.1f} {stats['errors']:>5} "
+              f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}")
+
+def git_commit() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def wait_for(host: str, port: int, path: str, process: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+
+    async def probe() -> int:
+        conn = Connection(host, port)
+        try:
+            return (await conn.request("GET", path))[0]
+        finally:
+            conn.close()
+
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{' '.join(process.args)} exited with {process.returncode}")
+        try:
+            if asyncio.run(probe()) == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {host}:{port}{path}")
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def add_server_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options for the server under test, shared with replay_traffic.py."""
+    parser.add_argument("--base-url", help="test an already running server instead of launching one (no seeding)")
+    parser.add_argument("--database-url", help="database for the launched server; default a fresh SQLite file")
+    parser.add_argument("--users", type=int, default=200, help="users to seed")
+    parser.add_argument("--years", type=float, default=1.0, help="years of habit logs to seed per user")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    parser.add_argument("--openai-latency", default="lognormal:400:0.4",
+                        help="emulated completion latency distribution (see openai_emulator.py)")
+    parser.add_argument("--openai-rate-limit-rate", type=float, default=0.0, help="fraction of emulated 429s")
+    parser.add_argument("--openai-server-error-rate", type=float, default=0.0, help="fraction of emulated 5xx errors")
+    parser.add_argument("--seed", type=int, default=42, help="seed for the dataset, the emulator and the virtual users")
+
+@contextmanager
+def server(args) -> Iterator[Tuple[str, int]]:
+    """
+    Yield (host, port) of the server under test.
+
+    Unless --base-url is given this seeds a database, then starts the OpenAI
+    emulator and gunicorn, and stops both on exit.
+    """
+    if args.base_url:
+        parts = urlsplit(args.base_url)
+        yield parts.hostname, parts.port or 80
+        return
+
+    processes = []
+    workdir = tempfile.mkdtemp(prefix="nutrition_load_")
+    try:
+        database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'load.db')}"
+        subprocess.run([sys.executable, os.path.join(BENCH_DIR, "seed_load_data.py"), "--database-url", database_url,
+                        "--users", str(args.users), "--years", str(args.years), "--seed", str(args.seed)], check=True)
+
+        emulator_port = free_port()
+        emulator_log = open(os.path.join(workdir, "openai_emulator.log"), "w")
+        processes.append(subprocess.Popen(
+            [sys.executable, os.path.join(BENCH_DIR, "openai_emulator.py"), "--port", str(emulator_port),
+             "--latency", args.openai_latency, "--seed", str(args.seed), "--tool-call-after", "3",
+             "--rate-limit-rate", str(args.openai_rate_limit_rate),
+             "--server-error-rate", str(args.openai_server_error_rate)],
+            stdout=emulator_log, stderr=subprocess.STDOUT))
+        wait_for("127.0.0.1", emulator_port, "/health", processes[-1])
+
+        host, port = "127.0.0.1", free_port()
+        env = {
+            **os.environ,
+            "DATABASE_URL": database_url,
+            "OPENAI_API_KEY": "sk-emulator",
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{emulator_port}/v1",
+            # Recycling workers mid-run would show up as latency spikes
+            "GUNICORN_MAX_REQUESTS": "0",
+            "GUNICORN_MAX_REQUESTS_JITTER": "0",
+            # A replay must not capture itself
+            "TRAFFIC_CAPTURE_ENABLED": "false",
+        }
+        server_log = open(os.path.join(workdir, "gunicorn.log"), "w")
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "main:app", "-c", "gunicorn.conf.py",
+             "--bind", f"{host}:{port}", "--workers", str(args.workers)],
+            cwd=ROOT, env=env, stdout=server_log, stderr=subprocess.STDOUT))
+        wait_for(host, port, "/health", processes[-1])
+        print(f"Server on {host}:{port} with {args.workers} workers; logs in {workdir}")
+        yield host, port
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+def write_report(report: Dict[str, Any], path: str) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {path}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_server_arguments(parser)
+    parser.add_argument("--concurrency", type=int, default=50, help="virtual users")
+    parser.add_argument("--duration", type=float, default=60.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds before measuring")
+    parser.add_argument("--mix", type=parse_mix, default=dict(DEFAULT_MIX),
+                        help="scenario weights, e.g. dashboard=40,habit_logging=30 (default: %(default)s)")
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    with server(args) as (host, port):
+        recorder, elapsed = asyncio.run(drive(host, port, args))
+    report = build_report(recorder, elapsed, {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        **git_commit(),
+        "target": args.base_url or "gunicorn",
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "base_url")},
+    })
+    print_report(report)
+    if args.output:
+        write_report(report, args.output)
+
+if __name__ == "__main__":
+    main()
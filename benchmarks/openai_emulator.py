@@ -0,0 +1,244 @@
+"""Local stand-in for the OpenAI chat completions API, for load tests.
+
+Implements the part of the API surface AsyncOpenAI uses here:
+POST /v1/chat/completions, streamed (SSE) or not, with usage blocks. So
+the app's LLM endpoints, including their concurrency limits, retries and
+streaming, can be exercised offline without cost. Point the app at it with
+OPENAI_BASE_URL=http://127.0.0.1:8100/v1 and any non-empty OPENAI_API_KEY.
+
+- Latency is drawn from a distribution: fixed:MS, uniform:LOW:HIGH,
+  normal:MEAN:SD or lognormal:MEDIAN:SIGMA (milliseconds). Streamed replies
+  use it for the first token and then wait --token-ms between chunks.
+- When the request offers the save_profile tool and the conversation
+  already has --tool-call-after assistant replies, the reply is a
+  save_profile tool call, as at the end of AI profiling.
+- --rate-limit-rate and --server-error-rate inject 429s (with
+  Retry-After) and 500/502/503s at those probabilities.
+
+    python benchmarks/openai_emulator.py --port 8100 --latency lognormal:600:0.5 --rate-limit-rate 0.05
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+REPLY = ("Thanks for sharing that. To tailor your plan I'd like to know a bit more - "
+         "how many meals do you usually eat in a day, and do you snack in between?")
+
+# Arguments for save_profile that satisfy PROFILE_SCHEMA in openai_service.py
+PROFILE = {
+    "goal": "fat_loss",
+    "target_calories": 1900,
+    "activity_pattern": "desk",
+    "exercise_summary": "Runs twice a week, walks daily",
+    "exercise_intensity": "mixed",
+    "protein_preferences": ["chicken", "eggs", "fish"],
+    "organ_meats": False,
+    "seafood_frequency": "weekly",
+    "carb_choices": ["rice", "sweet_potato"],
+    "fat_choices": ["olive_oil", "avocado"],
+    "veg_likes": ["broccoli", "spinach", "capsicum"],
+    "colors_ok": True,
+    "sulfur_ok": True,
+    "diet_style": "whole_food_mix",
+    "ferments_ok": True,
+    "meals_pattern": "small breakfast, big lunch, snack, dinner",
+    "constraints": [],
+    "dislikes": ["mushrooms"],
+    "region": "AU",
+    "kcal_confidence": 0.8,
+}
+
+def _tokens(text: str) -> int:
+    # Close enough to tiktoken's average for English text
+    return max(1, len(text) // 4)
+
+class Latency:
+    """A latency distribution parsed from "kind:params" in milliseconds."""
+
+    def __init__(self, spec: str):
+        kind, _, params = spec.partition(":")
+        values = [float(value) for value in params.split(":") if value]
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+        if kind not in expected or len(values) != expected[kind]:
+            raise ValueError(f"Invalid latency {spec!r}; use fixed:MS, uniform:LOW:HIGH, normal:MEAN:SD or lognormal:MEDIAN:SIGMA")
+        self.spec = spec
+        self.kind = kind
+        self.values = values
+
+    def sample(self, rng: random.Random) -> float:
+        """One latency in seconds."""
+        if self.kind == "fixed":
+            ms = self.values[0]
+        elif self.kind == "uniform":
+            ms = rng.uniform(*self.values)
+        elif self.kind == "normal":
+            ms = rng.gauss(*self.values)
+        else:
+            median, sigma = self.values
+            ms = median * rng.lognormvariate(0, sigma)
+        return max(0.0, ms) / 1000
+
+class Emulator:
+    """ASGI app emulating the chat completions endpoint."""
+
+    def __init__(self, latency: str = "fixed:400", token_ms: float = 10.0, tool_call_after: int = 6,
+                 rate_limit_rate: float = 0.0, server_error_rate: float = 0.0, retry_after_ms: int = 500,
+                 seed: Optional[int] = None, model: str = "gpt-4o-mini"):
+        self.latency = Latency(latency)
+        self.token_delay = token_ms / 1000
+        self.tool_call_after = tool_call_after
+        self.rate_limit_rate = rate_limit_rate
+        self.server_error_rate = server_error_rate
+        self.retry_after_ms = retry_after_ms
+        self.model = model
+        self.rng = random.Random(seed)
+        self._ids = itertools.count(1)
+        self.stats: Counter = Counter()
+
+    def _wants_tool_call(self, body: Dict[str, Any]) -> bool:
+        tools = {tool.get("function", {}).get("name") for tool in body.get("tools") or []}
+        replies = sum(1 for message in body.get("messages", []) if message.get("role") == "assistant")
+        return "save_profile" in tools and replies >= self.tool_call_after
+
+    def _usage(self, body: Dict[str, Any], completion: str) -> Dict[str, int]:
+        prompt_tokens = sum(_tokens(str(message.get("content") or "")) for message in body.get("messages", []))
+        completion_tokens = _tokens(completion)
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    def _tool_call(self) -> Dict[str, Any]:
+        return {"id": f"call_emu{next(self._ids)}", "type": "function",
+                "function": {"name": "save_profile", "arguments": json.dumps(PROFILE)}}
+
+    def completion(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """A non-streamed chat.completion response for a request body."""
+        if self._wants_tool_call(body):
+            tool_call = self._tool_call()
+            message = {"role": "assistant", "content": None, "tool_calls": [tool_call]}
+            finish_reason, generated = "tool_calls", tool_call["function"]["arguments"]
+        else:
+            message = {"role": "assistant", "content": REPLY}
+            finish_reason, generated = "stop", REPLY
+        return {
+            "id": f"chatcmpl-emu{next(self._ids)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", self.model),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": self._usage(body, generated),
+        }
+
+    def chunks(self, body: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """The chat.completion.chunk events of a streamed response, in order."""
+        base = {"id": f"chatcmpl-emu{next(self._ids)}", "object": "chat.completion.chunk",
+                "created": int(time.time()), "model": body.get("model", self.model)}
+
+        def chunk(delta, finish_reason=None):
+            return {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+        events = [chunk({"role": "assistant", "content": ""})]
+        if self._wants_tool_call(body):
+            tool_call = self._tool_call()
+            generated = tool_call["function"]["arguments"]
+            events.append(chunk({"tool_calls": [{"index": 0, **tool_call}]}))
+            events.append(chunk({}, "tool_calls"))
+        else:
+            generated = REPLY
+            words = REPLY.split(" ")
+            events.extend(chunk({"content": word if i == 0 else " " + word}) for i, word in enumerate(words))
+            events.append(chunk({}, "stop"))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            events.append({**base, "choices": [], "usage": self._usage(body, generated)})
+        return events
+
+    def _fault(self) -> Optional[int]:
+        roll = self.rng.random()
+        if roll < self.rate_limit_rate:
+            return 429
+        if roll < self.rate_limit_rate + self.server_error_rate:
+            return self.rng.choice([500, 502, 503])
+        return None
+
+    async def __call__(self, scope, receive, send):
+        body = b""
+        more = True
+        while more:
+            message = await receive()
+            body += message.get("body", b"")
+            more = message.get("more_body", False)
+
+        if scope["method"] == "GET" and scope["path"] == "/health":
+            await _json(send, 200, {"status": "ok", **self.stats})
+            return
+        if scope["method"] != "POST" or not scope["path"].endswith("/chat/completions"):
+            await _json(send, 404, _error(f"Unknown route {scope['path']}", "invalid_request_error"))
+            return
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            await _json(send, 400, _error("Invalid JSON body", "invalid_request_error"))
+            return
+
+        self.stats["requests"] += 1
+        fault = self._fault()
+        if fault == 429:
+            self.stats["rate_limited"] += 1
+            await _json(send, 429, _error("Rate limit reached for requests", "requests", "rate_limit_exceeded"),
+                        [(b"retry-after-ms", str(self.retry_after_ms).encode()),
+                         (b"retry-after", str(max(1, round(self.retry_after_ms / 1000))).encode())])
+            return
+
+        await asyncio.sleep(self.latency.sample(self.rng))
+        if fault:
+            self.stats["server_errors"] += 1
+            await _json(send, fault, _error("The server had an error while processing your request", "server_error"))
+            return
+
+        if request.get("stream"):
+            self.stats["streamed"] += 1
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache")]})
+            events = self.chunks(request)
+            for i, event in enumerate(events):
+                if i > 1 and self.token_delay:
+                    await asyncio.sleep(self.token_delay)
+                await send({"type": "http.response.body", "body": f"data: {json.dumps(event)}\n\n".encode(), "more_body": True})
+            await send({"type": "http.response.body", "body": b"data: [DONE]\n\n"})
+        else:
+            await _json(send, 200, self.completion(request))
+
+def _error(message: str, error_type: str, code: Optional[str] = None) -> Dict[str, Any]:
+    return {"error": {"message": message, "type": error_type, "param": None, "code": code}}
+
+async def _json(send, status: int, payload: dict, headers=()) -> None:
+    body = json.dumps(payload).encode()
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), *headers]})
+    await send({"type": "http.response.body", "body": body})
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", default="fixed:400",
+                        help="time to reply (or to the first streamed token): fixed:MS, uniform:LOW:HIGH, normal:MEAN:SD, lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--token-ms", type=float, default=10.0, help="delay between streamed chunks")
+    parser.add_argument("--tool-call-after", type=int, default=6, help="assistant replies before save_profile is called")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--server-error-rate", type=float, default=0.0, help="fraction of requests answered with 5xx")
+    parser.add_argument("--retry-after-ms", type=int, default=500, help="Retry-After sent with 429s")
+    parser.add_argument("--seed", type=int, help="seed for latencies and fault injection")
+    args = parser.parse_args()
+
+    emulator = Emulator(args.latency, args.token_ms, args.tool_call_after, args.rate_limit_rate,
+                        args.server_error_rate, args.retry_after_ms, args.seed)
+    import uvicorn
+    uvicorn.run(emulator, host=args.host, port=args.port, lifespan="off", log_level="warning")
+
+if __name__ == "__main__":
+    main()
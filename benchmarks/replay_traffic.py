@@ -0,0 +1,143 @@
+"""Replay captured production traffic against a local build.
+
+Reads the NDJSON written by TrafficCaptureMiddleware (TRAFFIC_CAPTURE_ENABLED),
+one file per worker process plus rotated files, and re-issues each request at
+its original offset divided by --speed. Like load_test.py it seeds a database
+with at least as many users as the capture references, then starts the OpenAI
+emulator and gunicorn; or use --base-url to target a running server. The report uses
+load_test.py's format, plus the captured latencies for the same endpoints,
+so replays of two builds can be diffed with compare_load_reports.py.
+
+    python benchmarks/replay_traffic.py "logs/traffic.*.ndjson*" --speed 4 --output reports/replay-$(git rev-parse --short HEAD).json
+"""
+import argparse
+import asyncio
+import glob
+import json
+import re
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+from urllib.parse import quote, urlencode
+
+from common import percentile
+from load_test import (Connection, Recorder, add_server_arguments, build_report, git_commit, print_report,
+                       server, write_report, _latency_stats)
+
+_PARAM = re.compile(r"{(\w+)(?::[^}]*)?}")
+
+def load_captures(patterns: List[str], limit: int = 0) -> List[Dict[str, Any]]:
+    """Captured requests from the given files or globs, oldest first."""
+    records = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            with open(path) as f:
+                records.extend(json.loads(line) for line in f if line.strip())
+    records = [record for record in records if record.get("route") or record.get("path")]
+    records.sort(key=lambda record: record["start"])
+    return records[:limit] if limit else records
+
+def request_path(record: Dict[str, Any]) -> str:
+    """Concrete path of a captured request, from its route template and parameters."""
+    params = record.get("path_params") or {}
+    route = record.get("route")
+    if route and all(name in params for name in _PARAM.findall(route)):
+        path = _PARAM.sub(lambda match: quote(str(params[match.group(1)]), safe=""), route)
+    else:
+        path = record.get("path") or route
+    query = record.get("query")
+    return f"{path}?{urlencode(query)}" if query else path
+
+def endpoint(record: Dict[str, Any]) -> str:
+    return f"{record['method']} {record.get('route') or record.get('path')}"
+
+def max_user_id(records: List[Dict[str, Any]]) -> int:
+    """Highest user id the capture refers to, so the seeded database contains it."""
+    ids = [0]
+    for record in records:
+        for value in ((record.get("path_params") or {}).get("user_id"), (record.get("body") or {}).get("user_id")):
+            if isinstance(value, int) or (isinstance(value, str) and value.isdigit()):
+                ids.append(int(value))
+    return max(ids)
+
+async def replay(host: str, port: int, records: List[Dict[str, Any]], speed: float,
+                 max_connections: int) -> Dict[str, Any]:
+    recorder = Recorder()
+    recorder.recording = True
+    idle: List[Connection] = []
+    slots = asyncio.Semaphore(max_connections)
+    lag = []
+
+    async def issue(record):
+        async with slots:
+            conn = idle.pop() if idle else Connection(host, port)
+            headers = {"Idempotency-Key": uuid.uuid4().hex} if record.get("idempotency_key") else None
+            start = time.perf_counter()
+            try:
+                status, _ = await conn.request(record["method"], request_path(record), record.get("body"), headers)
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                status = 0
+            recorder.requests[endpoint(record)].append((status, time.perf_counter() - start))
+            idle.append(conn)
+
+    first = records[0]["start"]
+    begin = time.monotonic()
+    tasks = []
+    for record in records:
+        due = (record["start"] - first) / speed if speed > 0 else 0
+        delay = due - (time.monotonic() - begin)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        lag.append(max(0.0, -delay) * 1000)
+        tasks.append(asyncio.create_task(issue(record)))
+    await asyncio.gather(*tasks)
+    elapsed = time.monotonic() - begin
+    for conn in idle:
+        conn.close()
+    return {"recorder": recorder, "elapsed": elapsed, "lag_ms": lag}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("captures", nargs="+", help="capture files or globs (rotated files included)")
+    add_server_arguments(parser)
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed-up; 0 sends everything at once")
+    parser.add_argument("--max-connections", type=int, default=64, help="requests in flight at most")
+    parser.add_argument("--limit", type=int, default=0, help="replay only the first N captured requests")
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    records = load_captures(args.captures, args.limit)
+    if not records:
+        parser.error("no captured requests found")
+    span = records[-1]["start"] - records[0]["start"]
+    args.users = max(args.users, max_user_id(records))
+    print(f"Replaying {len(records)} requests captured over {span:.0f}s at {args.speed}x")
+
+    with server(args) as (host, port):
+        result = asyncio.run(replay(host, port, records, args.speed, args.max_connections))
+
+    captured = defaultdict(list)
+    for record in records:
+        captured[endpoint(record)].append(record["duration_ms"] / 1000)
+    report = build_report(result["recorder"], result["elapsed"], {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        **git_commit(),
+        "target": args.base_url or "gunicorn",
+        "captures": args.captures,
+        "captured_span_s": round(span, 2),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "base_url", "captures")},
+    })
+    report["captured"] = {name: {"count": len(latencies), **_latency_stats(latencies)}
+                          for name, latencies in sorted(captured.items())}
+    report["summary"]["dispatch_lag_p99_ms"] = round(percentile(result["lag_ms"], 99), 2)
+    print_report(report)
+    if report["summary"]["dispatch_lag_p99_ms"] > 100:
+        print(f"Warning: requests went out up to {report['summary']['dispatch_lag_p99_ms']:.0f}ms late (p99); "
+              "lower --speed or raise --max-connections")
+    if args.output:
+        write_report(report, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Seed a database for load testing.
+
+Creates `--users` users, each with a health profile, a questionnaire, four
+habit targets and `--years` of daily habit logs ending yesterday (so the
+habit logging scenario can still create today's logs). Rows are written
+with bulk Core inserts, and the same --seed always produces the same data.
+
+    python benchmarks/seed_load_data.py --database-url sqlite:////tmp/load.db --users 200 --years 2
+"""
+import argparse
+import os
+import random
+import time
+from datetime import date, timedelta
+
+from common import HABITS
+
+GOALS = ["fat_loss", "maintenance", "muscle_gain"]
+ACTIVITY = ["sedentary", "lightly_active", "moderately_active", "very_active"]
+RESTRICTIONS = [[], [], ["vegetarian"], ["vegan"], ["gluten_free"], ["dairy_free"]]
+ALLERGIES = [[], [], [], ["peanuts"], ["shellfish"], ["tree_nuts", "soy"]]
+
+def seed(users: int, years: float, seed: int = 42, chunk_size: int = 5000) -> int:
+    """Write the dataset through the app's engine; return the number of habit log rows."""
+    from sqlalchemy import insert, select
+
+    from database import engine
+    from models import Base, User, UserHealthProfile, UserQuestionnaire, HabitTarget, DailyHabitLog
+
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(seed)
+    days = int(years * 365)
+    yesterday = date.today() - timedelta(days=1)
+
+    with engine.begin() as conn:
+        start = conn.execute(select(User.id).order_by(User.id.desc()).limit(1)).scalar() or 0
+        conn.execute(insert(User), [
+            {"email": f"load{start + i}@example.com", "username": f"load{start + i}", "full_name": f"Load User {start + i}",
+             "hashed_password": "not-a-real-hash", "is_active": True}
+            for i in range(users)
+        ])
+        user_ids = conn.execute(select(User.id).where(User.id > start).order_by(User.id)).scalars().all()
+
+        conn.execute(insert(UserHealthProfile), [
+            {"user_id": user_id, "age": rng.randint(18, 70), "gender": rng.choice(["female", "male", "other"]),
+             "height_cm": rng.randint(150, 195), "weight_kg": rng.randint(50, 120),
+             "activity_level": rng.choice(ACTIVITY), "dietary_restrictions": rng.choice(RESTRICTIONS),
+             "health_conditions": [], "fitness_goals": [rng.choice(GOALS)],
+             "allergies": rng.choice(ALLERGIES), "medications": []}
+            for user_id in user_ids
+        ])
+        conn.execute(insert(UserQuestionnaire), [
+            {"user_id": user_id, "sleep_hours": rng.choice([6, 7, 8, 9]), "water_goal_ml": 2000,
+             "meal_frequency": rng.randint(2, 5), "exercise_frequency": rng.randint(0, 6),
+             "exercise_duration": rng.choice([20, 30, 45, 60]), "stress_level": rng.choice(["low", "moderate", "high"]),
+             "energy_level": rng.choice(["low", "moderate", "high"]), "mood_tracking": False,
+             "weight_goal": rng.choice(["lose", "maintain", "gain"]), "target_weight_kg": rng.randint(50, 100)}
+            for user_id in user_ids
+        ])
+        conn.execute(insert(HabitTarget), [
+            {"user_id": user_id, "habit_type": habit_type, "target_value": target, "target_unit": unit, "is_active": True}
+            for user_id in user_ids for habit_type, target, unit in HABITS
+        ])
+
+        logs = 0
+        batch = []
+        for user_id in user_ids:
+            for habit_type, target, unit in HABITS:
+                for offset in range(days):
+                    batch.append({"user_id": user_id, "log_date": yesterday - timedelta(days=offset), "habit_type": habit_type,
+                                  "logged_value": round(target * rng.uniform(0.4, 1.3), 1), "unit": unit})
+                    if len(batch) >= chunk_size:
+                        conn.execute(insert(DailyHabitLog), batch)
+                        logs += len(batch)
+                        batch = []
+        if batch:
+            conn.execute(insert(DailyHabitLog), batch)
+            logs += len(batch)
+    return logs
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="defaults to the app's DATABASE_URL setting")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--years", type=float, default=2.0, help="years of daily habit logs per user")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    start = time.perf_counter()
+    logs = seed(args.users, args.years, args.seed)
+    print(f"Seeded {args.users} users and {logs} habit logs in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
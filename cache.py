@@ -0,0 +1,241 @@
+import functools
+import inspect
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, time as dt_time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import orjson
+
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from config import settings
+from metrics import counter
+
+try:
+    import redis
+except ImportError:  # optional dependency, only needed for CACHE_BACKEND=redis
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+cache_requests = counter(
+    "entity_cache_requests_total",
+    "Read-through cache lookups by entity and result (hit/miss)",
+    ["entity", "result"],
+)
+cache_invalidations = counter(
+    "entity_cache_invalidations_total",
+    "Read-through cache invalidations by entity",
+    ["entity"],
+)
+
+class MemoryBackend:
+    """Size-bounded LRU with per-entry TTL, local to one worker process."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_prefix(self, prefix: str) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+class RedisBackend:
+    """
+    Shared Redis (or Redis-compatible) store so all gunicorn workers see the same entries and invalidations.
+
+    Entries are JSON, never pickles, so a value planted in Redis can't run
+    code when it is read; anything that doesn't decode is treated as a miss.
+    """
+
+    def __init__(self, url: str, prefix: str = "nutrition-cache:"):
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url, socket_timeout=0.05, socket_connect_timeout=0.2)
+        self.client.ping()
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            raw = self.client.get(self.prefix + key)
+        except redis.RedisError as e:
+            logger.debug(f"Cache get failed for {key}: {e}")
+            return None
+        if raw is None:
+            return None
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            logger.warning(f"Ignoring undecodable cache entry for {key}")
+            return None
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        try:
+            self.client.set(self.prefix + key, orjson.dumps(value), px=int(ttl * 1000))
+        except redis.RedisError as e:
+            logger.debug(f"Cache set failed for {key}: {e}")
+
+    def delete(self, key: str) -> None:
+        try:
+            self.client.delete(self.prefix + key)
+        except redis.RedisError as e:
+            logger.warning(f"Cache delete failed for {key}: {e}")
+
+    def delete_prefix(self, prefix: str) -> None:
+        try:
+            keys = list(self.client.scan_iter(match=f"{self.prefix}{prefix}*"))
+            if keys:
+                self.client.delete(*keys)
+        except redis.RedisError as e:
+            logger.warning(f"Cache prefix delete failed for {prefix}: {e}")
+
+    def clear(self) -> None:
+        self.delete_prefix("")
+
+def _create_backend():
+    if settings.CACHE_BACKEND == "redis":
+        if redis is None:
+            logger.warning("CACHE_BACKEND=redis but the redis package is not installed - using in-process cache")
+        else:
+            try:
+                return RedisBackend(settings.CACHE_REDIS_URL)
+            except Exception as e:
+                logger.warning(f"Redis cache unavailable ({e}) - using in-process cache")
+    return MemoryBackend(settings.CACHE_MAX_ENTRIES)
+
+backend = _create_backend()
+
+# Time-to-live in seconds for each cached entity
+ENTITY_TTLS: Dict[str, float] = {
+    "user": settings.CACHE_TTL_USER_SECONDS,
+    "health_profile": settings.CACHE_TTL_HEALTH_PROFILE_SECONDS,
+    "questionnaire": settings.CACHE_TTL_QUESTIONNAIRE_SECONDS,
+    "habit_target": settings.CACHE_TTL_HABIT_TARGET_SECONDS,
+    "ai_context": settings.CACHE_TTL_AI_CONTEXT_SECONDS,
+}
+
+def entity_ttl(entity: str) -> float:
+    """TTL for an entity on the active backend; short on the per-worker memory backend, which other workers can't invalidate."""
+    ttl = ENTITY_TTLS[entity]
+    if isinstance(backend, MemoryBackend):
+        return min(ttl, settings.CACHE_MEMORY_MAX_TTL_SECONDS)
+    return ttl
+
+# Number of key parts per entity, used to tell full keys from prefixes
+_KEY_LENGTHS: Dict[str, int] = {}
+
+def make_key(entity: str, *key_parts: Any) -> str:
+    return ":".join([entity] + [str(part) for part in key_parts]) + ":"
+
+# Credentials are never written to the cache; reading one after a hit loads it from the database
+UNCACHED_COLUMNS = {"hashed_password"}
+
+# Column types that JSON carries as ISO strings
+_ISO_TYPES = (datetime, date, dt_time)
+
+def _row_to_dict(obj: Any) -> Optional[dict]:
+    if obj is None:
+        return None
+    return {attr.key: getattr(obj, attr.key) for attr in sa_inspect(obj).mapper.column_attrs
+            if attr.key not in UNCACHED_COLUMNS}
+
+def _python_type(column) -> Optional[type]:
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return None
+
+def _hydrate(db: Session, model: Any, row: dict) -> Any:
+    """Turn a cached row back into an instance attached to the caller's session without querying."""
+    row = dict(row)
+    for attr in sa_inspect(model).column_attrs:
+        value = row.get(attr.key)
+        python_type = _python_type(attr.columns[0])
+        if isinstance(value, str) and python_type in _ISO_TYPES:
+            row[attr.key] = python_type.fromisoformat(value)
+    obj = model(**row)
+    make_transient_to_detached(obj)
+    return db.merge(obj, load=False)
+
+def invalidate(entity: str, *key_parts: Any) -> None:
+    """Drop a cached entity; pass only leading key parts to drop every entry under them."""
+    cache_invalidations.inc(entity=entity)
+    if len(key_parts) < _KEY_LENGTHS.get(entity, 0):
+        backend.delete_prefix(make_key(entity, *key_parts))
+    else:
+        backend.delete(make_key(entity, *key_parts))
+
+def invalidate_user(user_id: int) -> None:
+    """Drop every cached entity belonging to a user."""
+    for entity in ENTITY_TTLS:
+        invalidate(entity, user_id)
+
+def clear() -> None:
+    """Drop all cached entities."""
+    backend.clear()
+
+def read_through(entity: str, model: Any):
+    """
+    Cache a crud getter of the form getter(db, *key) -> Optional[model].
+
+    Rows (and misses) are cached as column dicts for the entity's TTL and
+    returned as instances merged into the caller's session. Writers must call
+    invalidate() after committing. The undecorated getter is available as
+    `.uncached` for code that is about to modify the row.
+    """
+    def decorator(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+        key_params = list(signature.parameters)[1:]
+        _KEY_LENGTHS[entity] = len(key_params)
+
+        @functools.wraps(func)
+        def wrapper(db: Session, *args, **kwargs):
+            if not settings.CACHE_ENABLED:
+                return func(db, *args, **kwargs)
+
+            bound = signature.bind(db, *args, **kwargs)
+            key = make_key(entity, *(bound.arguments[name] for name in key_params))
+            cached = backend.get(key)
+            if cached is not None:
+                cache_requests.inc(entity=entity, result="hit")
+                return _hydrate(db, model, cached["row"]) if cached["row"] is not None else None
+
+            cache_requests.inc(entity=entity, result="miss")
+            obj = func(db, *args, **kwargs)
+            backend.set(key, {"row": _row_to_dict(obj)}, entity_ttl(entity))
+            return obj
+
+        wrapper.uncached = func
+        return wrapper
+
+    return decorator
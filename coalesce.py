@@ -0,0 +1,116 @@
+import asyncio
+import functools
+import inspect
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from config import settings
+from metrics import counter
+
+coalesced_requests = counter(
+    "coalesced_requests_total",
+    "Requests to coalesced routes by how they were answered",
+    ["namespace", "outcome"],
+)
+
+# key -> (expires_at, user_id, result)
+_results: Dict[Tuple, Tuple[float, Any, Any]] = {}
+# key -> future shared by concurrent identical requests
+_in_flight: Dict[Tuple, asyncio.Future] = {}
+# user_id -> generation, bumped on every write so in-flight stale results are not cached
+_generations: Dict[Any, int] = {}
+
+def _make_key(namespace: str, kwargs: dict, exclude: Iterable[str]) -> Tuple:
+    params = tuple(sorted((name, repr(value)) for name, value in kwargs.items() if name not in exclude))
+    return (namespace,) + params
+
+def invalidate(user_id: Any, namespaces: Optional[Iterable[str]] = None) -> None:
+    """Drop cached results for a user, optionally limited to some namespaces."""
+    _generations[user_id] = _generations.get(user_id, 0) + 1
+    namespaces = set(namespaces) if namespaces else None
+    for key, (_, key_user_id, _) in list(_results.items()):
+        if key_user_id == user_id and (namespaces is None or key[0] in namespaces):
+            _results.pop(key, None)
+
+def clear() -> None:
+    """Drop all cached results."""
+    _results.clear()
+
+def _prune(now: float) -> None:
+    for key, (expires_at, _, _) in list(_results.items()):
+        if expires_at <= now:
+            _results.pop(key, None)
+
+def coalesced(namespace: str, ttl: Optional[float] = None, exclude: Iterable[str] = ("db",)):
+    """
+    Share one computation between concurrent identical calls of a route.
+
+    Calls are keyed by namespace and the route's keyword arguments (minus
+    injected dependencies such as the db session). While a computation is in
+    flight, identical calls await its result; with a ttl the result is also
+    reused for that many seconds unless invalidate() is called for the user.
+    If the leading call is cancelled, its followers run the computation again.
+    Sync route functions run in the threadpool so identical requests can overlap.
+    """
+    ttl = settings.COALESCE_TTL_SECONDS if ttl is None else ttl
+    exclude = tuple(exclude)
+
+    def decorator(func: Callable) -> Callable:
+        is_async = inspect.iscoroutinefunction(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not settings.COALESCE_ENABLED:
+                if is_async:
+                    return await func(*args, **kwargs)
+                return await run_in_threadpool(func, *args, **kwargs)
+
+            key = _make_key(namespace, kwargs, exclude)
+            user_id = kwargs.get("user_id")
+            now = time.monotonic()
+
+            cached = _results.get(key)
+            if cached is not None and cached[0] > now:
+                coalesced_requests.inc(namespace=namespace, outcome="cached")
+                return cached[2]
+
+            while (future := _in_flight.get(key)) is not None:
+                coalesced_requests.inc(namespace=namespace, outcome="shared")
+                try:
+                    return await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    # The leader's client went away; unless this request was cancelled too,
+                    # follow (or become) a new leader rather than fail with it
+                    if not future.cancelled() or asyncio.current_task().cancelling():
+                        raise
+
+            future = asyncio.get_running_loop().create_future()
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            _in_flight[key] = future
+            generation = _generations.get(user_id, 0)
+            coalesced_requests.inc(namespace=namespace, outcome="leader")
+            try:
+                if is_async:
+                    result = await func(*args, **kwargs)
+                else:
+                    result = await run_in_threadpool(func, *args, **kwargs)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            else:
+                if ttl > 0 and _generations.get(user_id, 0) == generation:
+                    _prune(now)
+                    _results[key] = (time.monotonic() + ttl, user_id, result)
+                future.set_result(result)
+                return result
+            finally:
+                _in_flight.pop(key, None)
+
+        return wrapper
+
+    return decorator
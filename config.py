@@ -20,7 +20,118 @@ class Settings(BaseSettings):
     
     # OpenAI settings
     OPENAI_API_KEY: str = ""
-    
+    # Point the client at a compatible server (e.g. benchmarks/openai_emulator.py); empty uses api.openai.com
+    OPENAI_BASE_URL: str = ""
+    OPENAI_TIMEOUT_SECONDS: float = 30.0
+    OPENAI_MAX_CONCURRENCY: int = 8
+
+    # Per-endpoint deadlines for upstream LLM calls (below gunicorn's 30s timeout)
+    CHAT_DEADLINE_SECONDS: float = 25.0
+    AI_PROFILING_DEADLINE_SECONDS: float = 25.0
+    DISCONNECT_POLL_INTERVAL_SECONDS: float = 0.25
+
+    # Idempotency-Key settings
+    IDEMPOTENCY_TTL_SECONDS: int = 86400
+    IDEMPOTENCY_MAX_ENTRIES: int = 10000
+    IDEMPOTENCY_DB_ENABLED: bool = False
+
+    # Request coalescing for hot read endpoints; TTL of 0 disables the micro-cache
+    COALESCE_ENABLED: bool = True
+    COALESCE_TTL_SECONDS: float = 0.5
+
+    # Read-through entity cache; use CACHE_BACKEND=redis to share it between gunicorn workers.
+    # Invalidations only reach the worker that made the write, so the in-process backend
+    # caps every TTL at CACHE_MEMORY_MAX_TTL_SECONDS; the TTLs below apply in full with redis
+    CACHE_ENABLED: bool = True
+    CACHE_BACKEND: str = "memory"
+    CACHE_REDIS_URL: str = "redis://localhost:6379/0"
+    CACHE_MAX_ENTRIES: int = 10000
+    CACHE_MEMORY_MAX_TTL_SECONDS: float = 2.0
+    CACHE_TTL_USER_SECONDS: float = 300
+    CACHE_TTL_HEALTH_PROFILE_SECONDS: float = 600
+    CACHE_TTL_QUESTIONNAIRE_SECONDS: float = 600
+    CACHE_TTL_HABIT_TARGET_SECONDS: float = 600
+    CACHE_TTL_AI_CONTEXT_SECONDS: float = 3600
+
+    # Meal plans cached by canonical profile signature: in-process LRU, then the meal_plan_cache table.
+    # Target calories are rounded to the bucket and the cached plan is rescaled to the exact target
+    MEAL_PLAN_CACHE_ENABLED: bool = True
+    MEAL_PLAN_CACHE_MAX_ENTRIES: int = 1024
+    MEAL_PLAN_CACHE_DB_ENABLED: bool = True
+    MEAL_PLAN_CACHE_DB_RETENTION_DAYS: float = 30.0
+    MEAL_PLAN_CALORIE_BUCKET: int = 100
+
+    # Background jobs (meal plans): a jobs table polled by JOBS_WORKERS async workers in each app process.
+    # A running job whose lease isn't renewed within the visibility timeout is picked up by another worker
+    JOBS_ENABLED: bool = True
+    JOBS_WORKERS: int = 2
+    JOBS_POLL_INTERVAL_SECONDS: float = 1.0
+    JOBS_VISIBILITY_TIMEOUT_SECONDS: float = 60.0
+    JOBS_MAX_ATTEMPTS: int = 3
+    JOBS_RETRY_BACKOFF_SECONDS: float = 2.0
+    JOBS_RETENTION_HOURS: float = 24.0
+
+    # Per-request SQL statement counting (X-DB-Query-Count / X-DB-Time-Ms headers)
+    QUERY_STATS_ENABLED: bool = True
+    N_PLUS_ONE_THRESHOLD: int = 10
+
+    # Slow-query log; EXPLAIN capture runs the plan query on the same connection
+    SLOW_QUERY_LOG_ENABLED: bool = False
+    SLOW_QUERY_THRESHOLD_MS: float = 200.0
+    SLOW_QUERY_EXPLAIN: bool = False
+    SLOW_QUERY_LOG_FILE: str = "logs/slow_queries.log"
+    SLOW_QUERY_LOG_MAX_BYTES: int = 10 * 1024 * 1024
+    SLOW_QUERY_LOG_BACKUP_COUNT: int = 5
+
+    # Prometheus metrics at /metrics. Under gunicorn set METRICS_MULTIPROC_DIR to a directory
+    # shared by the workers so every scrape reports all of them
+    METRICS_ENABLED: bool = True
+    METRICS_MULTIPROC_DIR: str = ""
+    METRICS_FLUSH_INTERVAL_SECONDS: float = 5.0
+
+    # Event loop heartbeat; the watchdog captures the blocking stack when a beat is this late
+    LOOP_MONITOR_ENABLED: bool = True
+    EVENT_LOOP_LAG_INTERVAL_SECONDS: float = 0.1
+    LOOP_STALL_THRESHOLD_MS: float = 250.0
+    LOOP_STALL_BUFFER_SIZE: int = 100
+    LOOP_STALL_STACK_DEPTH: int = 30
+
+    # Access log: non-2xx and slow requests are always logged; lower the rate to sample other 2xx responses
+    ACCESS_LOG_SAMPLE_RATE: float = 1.0
+    ACCESS_LOG_SLOW_MS: float = 1000.0
+    ACCESS_LOG_QUEUE_SIZE: int = 10000
+
+    # On-demand request profiling via a signed X-Profile-Request header or /admin/profiling/arm.
+    # The middleware is only installed when enabled
+    PROFILING_ENABLED: bool = False
+    PROFILING_SECRET: str = ""
+    PROFILING_SIGNATURE_MAX_AGE_SECONDS: int = 300
+    PROFILING_DIR: str = "profiles"
+    PROFILING_MAX_FILES: int = 50
+    PROFILING_RATE_LIMIT_PER_MINUTE: int = 6
+
+    # tracemalloc snapshots kept per worker by /admin/memory
+    MEMORY_SNAPSHOT_LIMIT: int = 10
+
+    # Tracing (W3C traceparent, OTLP-style JSON lines); TRACING_EXPORTER is "jsonl" or "memory"
+    TRACING_ENABLED: bool = False
+    TRACING_EXPORTER: str = "jsonl"
+    TRACING_FILE: str = "logs/traces.jsonl"
+    TRACING_SAMPLE_RATE: float = 1.0
+    TRACING_MAX_SPANS: int = 10000
+
+    # Sampled capture of scrubbed requests for benchmarks/replay_traffic.py; the middleware is
+    # only installed when enabled. Request bodies larger than the limit are recorded by size only
+    TRAFFIC_CAPTURE_ENABLED: bool = False
+    TRAFFIC_CAPTURE_SAMPLE_RATE: float = 0.01
+    TRAFFIC_CAPTURE_FILE: str = "logs/traffic.ndjson"
+    TRAFFIC_CAPTURE_MAX_BYTES: int = 50 * 1024 * 1024
+    TRAFFIC_CAPTURE_BACKUP_COUNT: int = 10
+    TRAFFIC_CAPTURE_MAX_BODY_BYTES: int = 64 * 1024
+
+    # Admin endpoints (/admin/*) require this X-Admin-Token; empty disables them
+    ADMIN_TOKEN: str = ""
+
     # Environment settings
     DEBUG: bool = False
     ENVIRONMENT: str = "development"
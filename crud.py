@@ -1,9 +1,17 @@
+from sqlalchemy import delete, func, insert, select, type_coerce, update, RowMapping
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from passlib.context import CryptContext
 from datetime import datetime, date
-from models import User, MessageTracking, UserHealthProfile, UserQuestionnaire, DailyHabitLog, HabitTarget
+from models import (User, MessageTracking, UserHealthProfile, UserQuestionnaire, DailyHabitLog, HabitTarget, AIContextSnapshot,
+                    Job, HEALTH_PROFILE_LIST_FIELDS)
 from schemas import UserCreate, UserUpdate
+from coalesce import invalidate as invalidate_coalesced
+from cache import read_through, invalidate as invalidate_cached, invalidate_user as invalidate_cached_user
+from config import settings
+from tracing import instrument_module
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -16,7 +24,33 @@ def get_password_hash(password: str) -> str:
     """Hash a password."""
     return pwd_context.hash(password)
 
+# Single-statement write helpers. RETURNING loads server defaults such as
+# created_at with the write itself, so no refresh() SELECT is needed afterwards.
+def _insert_returning(db: Session, model, values: dict):
+    """INSERT a row and return it as a loaded instance."""
+    return db.scalars(insert(model).values(**values).returning(model)).one()
+
+def _update_returning(db: Session, model, values: dict, *conditions):
+    """UPDATE matching rows in place and return the first one, or None if nothing matched."""
+    return db.scalars(update(model).where(*conditions).values(**values).returning(model)).first()
+
+def _upsert_returning(db: Session, model, values: dict, conflict_columns: list, updates: dict, where=None):
+    """
+    INSERT a row, or apply updates to the row it conflicts with, and return the resulting row.
+
+    With `where`, the conflicting row is only updated when it matches; None is returned when it doesn't.
+    """
+    dialect_insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    statement = dialect_insert(model).values(**values)
+    statement = statement.on_conflict_do_update(index_elements=conflict_columns, set_=updates, where=where)
+    return db.scalars(statement.returning(model), execution_options={"populate_existing": True}).one_or_none()
+
+def _delete_where(db: Session, model, *conditions) -> bool:
+    """DELETE matching rows without loading them; return whether any existed."""
+    return db.execute(delete(model).where(*conditions).execution_options(synchronize_session=False)).rowcount > 0
+
 # User CRUD operations
+@read_through("user", User)
 def get_user(db: Session, user_id: int) -> Optional[User]:
     """Get a user by ID."""
     return db.query(User).filter(User.id == user_id).first()
@@ -33,50 +67,59 @@ def get_users(db: Session, skip: int = 0, limit: int = 100) -> List[User]:
     """Get multiple users with pagination."""
     return db.query(User).offset(skip).limit(limit).all()
 
+# Columns returned by UserResponse
+USER_RESPONSE_COLUMNS = (User.email, User.username, User.full_name, User.is_active, User.id, User.created_at, User.updated_at)
+
+def get_user_rows(db: Session, skip: int = 0, limit: int = 100) -> List[RowMapping]:
+    """Get multiple users as plain column rows, without building ORM objects."""
+    return db.execute(select(*USER_RESPONSE_COLUMNS).order_by(User.id).offset(skip).limit(limit)).mappings().all()
+
 def create_user(db: Session, user: UserCreate) -> User:
     """Create a new user."""
     hashed_password = get_password_hash(user.password)
-    db_user = User(
-        email=user.email,
-        username=user.username,
-        full_name=user.full_name,
-        hashed_password=hashed_password,
-        is_active=user.is_active
-    )
-    db.add(db_user)
+    db_user = _insert_returning(db, User, {
+        "email": user.email,
+        "username": user.username,
+        "full_name": user.full_name,
+        "hashed_password": hashed_password,
+        "is_active": user.is_active
+    })
     db.commit()
-    db.refresh(db_user)
+    invalidate_cached("user", db_user.id)
     return db_user
 
 def update_user(db: Session, user_id: int, user: UserUpdate) -> Optional[User]:
     """Update a user."""
-    db_user = db.query(User).filter(User.id == user_id).first()
-    if not db_user:
-        return None
-    
     update_data = user.dict(exclude_unset=True)
     
     # Hash password if it's being updated
     if "password" in update_data:
         update_data["hashed_password"] = get_password_hash(update_data.pop("password"))
     
-    for field, value in update_data.items():
-        setattr(db_user, field, value)
+    if not update_data:
+        return get_user.uncached(db, user_id)
     
+    db_user = _update_returning(db, User, update_data, User.id == user_id)
     db.commit()
-    db.refresh(db_user)
+    invalidate_cached("user", user_id)
     return db_user
 
 def delete_user(db: Session, user_id: int) -> bool:
     """Delete a user."""
-    db_user = db.query(User).filter(User.id == user_id).first()
-    if not db_user:
+    # Child rows first, so the users foreign keys don't reject the delete. Jobs have no foreign key but
+    # carry the user's profile in their payload; a running one finds its row gone and drops its result
+    for model in (Job, AIContextSnapshot, MessageTracking, UserHealthProfile, UserQuestionnaire, DailyHabitLog, HabitTarget):
+        _delete_where(db, model, model.user_id == user_id)
+    if not _delete_where(db, User, User.id == user_id):
+        db.rollback()
         return False
     
-    db.delete(db_user)
     db.commit()
+    invalidate_coalesced(user_id)
+    invalidate_cached_user(user_id)
     return True
 
+
 # Message tracking CRUD operations
 def get_current_month_year() -> str:
     """Get current month-year string in format 'YYYY-MM'."""
@@ -98,14 +141,12 @@ def create_message_tracking(db: Session, user_id: int, month_year: str = None) -
     if month_year is None:
         month_year = get_current_month_year()
     
-    db_tracking = MessageTracking(
-        user_id=user_id,
-        month_year=month_year,
-        message_count=0
-    )
-    db.add(db_tracking)
+    db_tracking = _insert_returning(db, MessageTracking, {
+        "user_id": user_id,
+        "month_year": month_year,
+        "message_count": 0
+    })
     db.commit()
-    db.refresh(db_tracking)
     return db_tracking
 
 def increment_message_count(db: Session, user_id: int, month_year: str = None) -> MessageTracking:
@@ -113,15 +154,13 @@ def increment_message_count(db: Session, user_id: int, month_year: str = None) -
     if month_year is None:
         month_year = get_current_month_year()
     
-    # Get or create tracking record
-    tracking = get_user_message_tracking(db, user_id, month_year)
-    if not tracking:
-        tracking = create_message_tracking(db, user_id, month_year)
-    
-    # Increment count
-    tracking.message_count += 1
+    # One upsert, so concurrent chats can neither lose an increment nor create two rows for the month
+    tracking = _upsert_returning(
+        db, MessageTracking, {"user_id": user_id, "month_year": month_year, "message_count": 1},
+        ["user_id", "month_year"],
+        {"message_count": MessageTracking.message_count + 1, "updated_at": func.now()}
+    )
     db.commit()
-    db.refresh(tracking)
     return tracking
 
 def check_message_limit(db: Session, user_id: int, limit: int = 50, month_year: str = None) -> tuple[bool, int, int]:
@@ -140,68 +179,59 @@ def check_message_limit(db: Session, user_id: int, limit: int = 50, month_year:
     return is_within_limit, current_count, remaining
 
 # Health profile CRUD operations
+@read_through("health_profile", UserHealthProfile)
 def get_user_health_profile(db: Session, user_id: int) -> Optional[UserHealthProfile]:
     """Get user's health profile."""
     return db.query(UserHealthProfile).filter(UserHealthProfile.user_id == user_id).first()
 
 def create_user_health_profile(db: Session, user_id: int, health_data: dict) -> UserHealthProfile:
     """Create a new health profile for a user."""
-    # Convert lists to JSON strings for storage
-    json_fields = ['dietary_restrictions', 'health_conditions', 'fitness_goals', 'allergies', 'medications']
-    for field in json_fields:
-        if field in health_data and health_data[field] is not None:
-            import json
-            health_data[field] = json.dumps(health_data[field])
-    
-    db_health_profile = UserHealthProfile(
-        user_id=user_id,
-        **health_data
-    )
-    db.add(db_health_profile)
+    db_health_profile = _insert_returning(db, UserHealthProfile, {"user_id": user_id, **health_data})
+    _mark_ai_context_stale(db, user_id)
     db.commit()
-    db.refresh(db_health_profile)
+    invalidate_cached("ai_context", user_id)
+    invalidate_cached("health_profile", user_id)
+    invalidate_coalesced(user_id, ["health-profile"])
     return db_health_profile
 
 def update_user_health_profile(db: Session, user_id: int, health_data: dict) -> Optional[UserHealthProfile]:
     """Update user's health profile."""
-    db_health_profile = get_user_health_profile(db, user_id)
+    # Update only provided fields
+    values = {field: value for field, value in health_data.items() if value is not None}
+    if not values:
+        return get_user_health_profile.uncached(db, user_id)
+    
+    db_health_profile = _update_returning(db, UserHealthProfile, values, UserHealthProfile.user_id == user_id)
     if not db_health_profile:
         return None
     
-    # Convert lists to JSON strings for storage
-    json_fields = ['dietary_restrictions', 'health_conditions', 'fitness_goals', 'allergies', 'medications']
-    for field in json_fields:
-        if field in health_data and health_data[field] is not None:
-            import json
-            health_data[field] = json.dumps(health_data[field])
-    
-    # Update only provided fields
-    for field, value in health_data.items():
-        if value is not None:
-            setattr(db_health_profile, field, value)
-    
+    _mark_ai_context_stale(db, user_id)
     db.commit()
-    db.refresh(db_health_profile)
+    invalidate_cached("ai_context", user_id)
+    invalidate_cached("health_profile", user_id)
+    invalidate_coalesced(user_id, ["health-profile"])
     return db_health_profile
 
 def delete_user_health_profile(db: Session, user_id: int) -> bool:
     """Delete user's health profile."""
-    db_health_profile = get_user_health_profile(db, user_id)
-    if not db_health_profile:
+    if not _delete_where(db, UserHealthProfile, UserHealthProfile.user_id == user_id):
         return False
     
-    db.delete(db_health_profile)
+    _mark_ai_context_stale(db, user_id)
     db.commit()
+    invalidate_cached("ai_context", user_id)
+    invalidate_cached("health_profile", user_id)
+    invalidate_coalesced(user_id, ["health-profile"])
     return True
 
 def get_health_profile_for_ai(db: Session, user_id: int) -> dict:
     """Get health profile data formatted for AI context."""
-    health_profile = get_user_health_profile(db, user_id)
+    return _health_profile_for_ai(get_user_health_profile(db, user_id))
+
+def _health_profile_for_ai(health_profile: Optional[UserHealthProfile]) -> dict:
     if not health_profile:
         return {}
     
-    # Convert JSON strings back to lists
-    import json
     result = {
         "age": health_profile.age,
         "gender": health_profile.gender,
@@ -209,62 +239,65 @@ def get_health_profile_for_ai(db: Session, user_id: int) -> dict:
         "weight_kg": health_profile.weight_kg,
         "activity_level": health_profile.activity_level,
     }
-    
-    # Parse JSON fields
-    json_fields = ['dietary_restrictions', 'health_conditions', 'fitness_goals', 'allergies', 'medications']
-    for field in json_fields:
-        value = getattr(health_profile, field)
-        if value:
-            try:
-                result[field] = json.loads(value)
-            except json.JSONDecodeError:
-                result[field] = []
-        else:
-            result[field] = []
+    for field in HEALTH_PROFILE_LIST_FIELDS:
+        result[field] = getattr(health_profile, field) or []
     
     return result
 
+def get_users_with_allergy(db: Session, allergen: str) -> List[User]:
+    """Get users whose health profile lists an allergen."""
+    if db.get_bind().dialect.name == "postgresql":
+        # JSONB containment, served by the GIN index
+        condition = type_coerce(UserHealthProfile.allergies, JSONB).contains([allergen])
+    else:
+        allergies = func.json_each(UserHealthProfile.allergies).table_valued("value")
+        condition = select(allergies.c.value).where(allergies.c.value == allergen).exists()
+    return db.query(User).join(UserHealthProfile, UserHealthProfile.user_id == User.id).filter(condition).all()
+
 # Questionnaire CRUD operations
+@read_through("questionnaire", UserQuestionnaire)
 def get_user_questionnaire(db: Session, user_id: int) -> Optional[UserQuestionnaire]:
     """Get user's questionnaire."""
     return db.query(UserQuestionnaire).filter(UserQuestionnaire.user_id == user_id).first()
 
 def create_user_questionnaire(db: Session, user_id: int, questionnaire_data: dict) -> UserQuestionnaire:
     """Create a new questionnaire for a user."""
-    db_questionnaire = UserQuestionnaire(
-        user_id=user_id,
-        **questionnaire_data
-    )
-    db.add(db_questionnaire)
+    db_questionnaire = _insert_returning(db, UserQuestionnaire, {"user_id": user_id, **questionnaire_data})
+    _mark_ai_context_stale(db, user_id)
     db.commit()
-    db.refresh(db_questionnaire)
+    invalidate_cached("ai_context", user_id)
+    invalidate_cached("questionnaire", user_id)
     return db_questionnaire
 
 def update_user_questionnaire(db: Session, user_id: int, questionnaire_data: dict) -> Optional[UserQuestionnaire]:
     """Update user's questionnaire."""
-    db_questionnaire = get_user_questionnaire(db, user_id)
+    # Update only provided fields
+    values = {field: value for field, value in questionnaire_data.items() if value is not None}
+    if not values:
+        return get_user_questionnaire.uncached(db, user_id)
+    
+    db_questionnaire = _update_returning(db, UserQuestionnaire, values, UserQuestionnaire.user_id == user_id)
     if not db_questionnaire:
         return None
     
-    # Update only provided fields
-    for field, value in questionnaire_data.items():
-        if value is not None:
-            setattr(db_questionnaire, field, value)
-    
+    _mark_ai_context_stale(db, user_id)
     db.commit()
-    db.refresh(db_questionnaire)
+    invalidate_cached("ai_context", user_id)
+    invalidate_cached("questionnaire", user_id)
     return db_questionnaire
 
 def delete_user_questionnaire(db: Session, user_id: int) -> bool:
     """Delete user's questionnaire."""
-    db_questionnaire = get_user_questionnaire(db, user_id)
-    if not db_questionnaire:
+    if not _delete_where(db, UserQuestionnaire, UserQuestionnaire.user_id == user_id):
         return False
     
-    db.delete(db_questionnaire)
+    _mark_ai_context_stale(db, user_id)
     db.commit()
+    invalidate_cached("ai_context", user_id)
+    invalidate_cached("questionnaire", user_id)
     return True
 
+
 # Habit Target CRUD operations
 def get_user_habit_targets(db: Session, user_id: int, habit_type: str = None) -> List[HabitTarget]:
     """Get user's habit targets, optionally filtered by habit type."""
@@ -273,6 +306,7 @@ def get_user_habit_targets(db: Session, user_id: int, habit_type: str = None) ->
         query = query.filter(HabitTarget.habit_type == habit_type)
     return query.all()
 
+@read_through("habit_target", HabitTarget)
 def get_habit_target(db: Session, user_id: int, habit_type: str) -> Optional[HabitTarget]:
     """Get a specific habit target for a user."""
     return db.query(HabitTarget).filter(
@@ -282,40 +316,46 @@ def get_habit_target(db: Session, user_id: int, habit_type: str) -> Optional[Hab
 
 def create_habit_target(db: Session, user_id: int, habit_target_data: dict) -> HabitTarget:
     """Create a new habit target for a user."""
-    db_habit_target = HabitTarget(
-        user_id=user_id,
-        **habit_target_data
-    )
-    db.add(db_habit_target)
+    db_habit_target = _insert_returning(db, HabitTarget, {"user_id": user_id, **habit_target_data})
+    _mark_ai_context_stale(db, user_id)
     db.commit()
-    db.refresh(db_habit_target)
+    invalidate_cached("ai_context", user_id)
+    invalidate_cached("habit_target", user_id, habit_target_data["habit_type"])
+    invalidate_coalesced(user_id, ["progress", "feedback"])
     return db_habit_target
 
 def update_habit_target(db: Session, user_id: int, habit_type: str, habit_target_data: dict) -> Optional[HabitTarget]:
     """Update a habit target for a user."""
-    db_habit_target = get_habit_target(db, user_id, habit_type)
+    # Update only provided fields
+    values = {field: value for field, value in habit_target_data.items() if value is not None}
+    if not values:
+        return get_habit_target.uncached(db, user_id, habit_type)
+    
+    db_habit_target = _update_returning(db, HabitTarget, values,
+                                        HabitTarget.user_id == user_id, HabitTarget.habit_type == habit_type)
     if not db_habit_target:
         return None
     
-    # Update only provided fields
-    for field, value in habit_target_data.items():
-        if value is not None:
-            setattr(db_habit_target, field, value)
-    
+    _mark_ai_context_stale(db, user_id)
     db.commit()
-    db.refresh(db_habit_target)
+    invalidate_cached("ai_context", user_id)
+    invalidate_cached("habit_target", user_id, habit_type)
+    invalidate_coalesced(user_id, ["progress", "feedback"])
     return db_habit_target
 
 def delete_habit_target(db: Session, user_id: int, habit_type: str) -> bool:
     """Delete a habit target for a user."""
-    db_habit_target = get_habit_target(db, user_id, habit_type)
-    if not db_habit_target:
+    if not _delete_where(db, HabitTarget, HabitTarget.user_id == user_id, HabitTarget.habit_type == habit_type):
         return False
     
-    db.delete(db_habit_target)
+    _mark_ai_context_stale(db, user_id)
     db.commit()
+    invalidate_cached("ai_context", user_id)
+    invalidate_cached("habit_target", user_id, habit_type)
+    invalidate_coalesced(user_id, ["progress", "feedback"])
     return True
 
+
 # Daily Habit Log CRUD operations
 def get_habit_logs(db: Session, user_id: int, habit_type: str = None, start_date: date = None, end_date: date = None) -> List[DailyHabitLog]:
     """Get user's habit logs with optional filters."""
@@ -330,6 +370,24 @@ def get_habit_logs(db: Session, user_id: int, habit_type: str = None, start_date
     
     return query.order_by(DailyHabitLog.log_date.desc()).all()
 
+# Columns returned by HabitLogResponse
+HABIT_LOG_RESPONSE_COLUMNS = (DailyHabitLog.id, DailyHabitLog.user_id, DailyHabitLog.log_date, DailyHabitLog.habit_type,
+                              DailyHabitLog.logged_value, DailyHabitLog.unit, DailyHabitLog.notes,
+                              DailyHabitLog.created_at, DailyHabitLog.updated_at)
+
+def get_habit_log_rows(db: Session, user_id: int, habit_type: str = None, start_date: date = None, end_date: date = None) -> List[RowMapping]:
+    """Get user's habit logs as plain column rows, without building ORM objects."""
+    query = select(*HABIT_LOG_RESPONSE_COLUMNS).where(DailyHabitLog.user_id == user_id)
+    
+    if habit_type:
+        query = query.where(DailyHabitLog.habit_type == habit_type)
+    if start_date:
+        query = query.where(DailyHabitLog.log_date >= start_date)
+    if end_date:
+        query = query.where(DailyHabitLog.log_date <= end_date)
+    
+    return db.execute(query.order_by(DailyHabitLog.log_date.desc())).mappings().all()
+
 def get_habit_log(db: Session, user_id: int, log_date: date, habit_type: str) -> Optional[DailyHabitLog]:
     """Get a specific habit log for a user on a specific date."""
     return db.query(DailyHabitLog).filter(
@@ -340,38 +398,35 @@ def get_habit_log(db: Session, user_id: int, log_date: date, habit_type: str) ->
 
 def create_habit_log(db: Session, user_id: int, habit_log_data: dict) -> DailyHabitLog:
     """Create a new habit log for a user."""
-    db_habit_log = DailyHabitLog(
-        user_id=user_id,
-        **habit_log_data
-    )
-    db.add(db_habit_log)
+    db_habit_log = _insert_returning(db, DailyHabitLog, {"user_id": user_id, **habit_log_data})
     db.commit()
-    db.refresh(db_habit_log)
+    invalidate_coalesced(user_id, ["progress", "feedback"])
     return db_habit_log
 
 def update_habit_log(db: Session, user_id: int, log_date: date, habit_type: str, habit_log_data: dict) -> Optional[DailyHabitLog]:
     """Update a habit log for a user."""
-    db_habit_log = get_habit_log(db, user_id, log_date, habit_type)
+    # Update only provided fields
+    values = {field: value for field, value in habit_log_data.items() if value is not None}
+    if not values:
+        return get_habit_log(db, user_id, log_date, habit_type)
+    
+    db_habit_log = _update_returning(db, DailyHabitLog, values, DailyHabitLog.user_id == user_id,
+                                     DailyHabitLog.log_date == log_date, DailyHabitLog.habit_type == habit_type)
     if not db_habit_log:
         return None
     
-    # Update only provided fields
-    for field, value in habit_log_data.items():
-        if value is not None:
-            setattr(db_habit_log, field, value)
-    
     db.commit()
-    db.refresh(db_habit_log)
+    invalidate_coalesced(user_id, ["progress", "feedback"])
     return db_habit_log
 
 def delete_habit_log(db: Session, user_id: int, log_date: date, habit_type: str) -> bool:
     """Delete a habit log for a user."""
-    db_habit_log = get_habit_log(db, user_id, log_date, habit_type)
-    if not db_habit_log:
+    if not _delete_where(db, DailyHabitLog, DailyHabitLog.user_id == user_id,
+                         DailyHabitLog.log_date == log_date, DailyHabitLog.habit_type == habit_type):
         return False
     
-    db.delete(db_habit_log)
     db.commit()
+    invalidate_coalesced(user_id, ["progress", "feedback"])
     return True
 
 
@@ -543,3 +598,101 @@ def generate_feedback(db: Session, user_id: int, habit_type: str, days: int = 7)
         "completion_percentage": completion_percentage,
         "streak_days": streak_days
     }
+
+
+# AI context snapshot operations
+# Bump when render_ai_context output changes so stored snapshots are rebuilt
+AI_CONTEXT_FORMAT_VERSION = 1
+# Format version of a snapshot a write has marked stale
+AI_CONTEXT_STALE = 0
+
+def render_ai_context(health_profile: dict, questionnaire: Optional[UserQuestionnaire], targets: List[HabitTarget]) -> str:
+    """Render a compact prompt fragment describing the user."""
+    lines = []
+    basics = [
+        f"{health_profile['age']}y" if health_profile.get("age") else None,
+        health_profile.get("gender"),
+        f"{health_profile['height_cm']}cm" if health_profile.get("height_cm") else None,
+        f"{health_profile['weight_kg']}kg" if health_profile.get("weight_kg") else None,
+        health_profile.get("activity_level"),
+    ]
+    basics = [item for item in basics if item]
+    if basics:
+        lines.append("Basics: " + ", ".join(basics))
+    for field, label in [("dietary_restrictions", "Diet"), ("allergies", "Allergies"), ("health_conditions", "Conditions"),
+                         ("medications", "Medications"), ("fitness_goals", "Goals")]:
+        if health_profile.get(field):
+            lines.append(f"{label}: " + ", ".join(str(item) for item in health_profile[field]))
+    if questionnaire:
+        habits = [
+            f"sleep {questionnaire.sleep_hours}h" if questionnaire.sleep_hours is not None else None,
+            f"{questionnaire.meal_frequency} meals/day" if questionnaire.meal_frequency is not None else None,
+            f"exercise {questionnaire.exercise_frequency}x/wk" if questionnaire.exercise_frequency is not None else None,
+            f"stress {questionnaire.stress_level}" if questionnaire.stress_level else None,
+            f"energy {questionnaire.energy_level}" if questionnaire.energy_level else None,
+            f"weight goal {questionnaire.weight_goal}" if questionnaire.weight_goal else None,
+            f"target {questionnaire.target_weight_kg}kg" if questionnaire.target_weight_kg is not None else None,
+        ]
+        habits = [item for item in habits if item]
+        if habits:
+            lines.append("Habits: " + ", ".join(habits))
+    active_targets = [f"{t.habit_type} {t.target_value:g}{t.target_unit}" for t in targets if t.is_active]
+    if active_targets:
+        lines.append("Daily targets: " + ", ".join(active_targets))
+    return "\n".join(lines)
+
+@read_through("ai_context", AIContextSnapshot)
+def get_ai_context_snapshot(db: Session, user_id: int) -> Optional[AIContextSnapshot]:
+    """Get the stored AI context snapshot for a user."""
+    return db.query(AIContextSnapshot).filter(AIContextSnapshot.user_id == user_id).first()
+
+def rebuild_ai_context_snapshot(db: Session, user_id: int) -> str:
+    """
+    Render and store the AI context snapshot for a user.
+
+    Rendered from the database rather than the entity cache, which may be
+    stale on this worker. The snapshot is only stored if no write has marked
+    it stale since its source_version was read, so a rebuild that lost a race
+    with a profile write can't put the old content back.
+    """
+    snapshot = get_ai_context_snapshot.uncached(db, user_id)
+    source_version = snapshot.source_version if snapshot else 0
+    content = render_ai_context(
+        _health_profile_for_ai(get_user_health_profile.uncached(db, user_id)),
+        get_user_questionnaire.uncached(db, user_id),
+        get_user_habit_targets(db, user_id),
+    )
+    # Upsert, so two first chats racing to build the snapshot both succeed instead of one hitting the unique user_id
+    _upsert_returning(
+        db, AIContextSnapshot,
+        {"user_id": user_id, "format_version": AI_CONTEXT_FORMAT_VERSION, "content": content, "source_version": source_version},
+        ["user_id"], {"format_version": AI_CONTEXT_FORMAT_VERSION, "content": content, "updated_at": func.now()},
+        where=AIContextSnapshot.source_version == source_version,
+    )
+    db.commit()
+    invalidate_cached("ai_context", user_id)
+    return content
+
+def get_ai_context(db: Session, user_id: int) -> str:
+    """Get the pre-rendered AI context for a user, rebuilding it only when missing or outdated."""
+    snapshot = get_ai_context_snapshot(db, user_id)
+    if snapshot and snapshot.format_version == AI_CONTEXT_FORMAT_VERSION:
+        return snapshot.content
+    if not get_user(db, user_id):
+        return ""
+    return rebuild_ai_context_snapshot(db, user_id)
+
+def _mark_ai_context_stale(db: Session, user_id: int) -> None:
+    """Mark a user's AI context snapshot stale in the current transaction so the next chat rebuilds it."""
+    # Bumping source_version (rather than deleting the row) also voids any rebuild already rendering old rows
+    _upsert_returning(
+        db, AIContextSnapshot,
+        {"user_id": user_id, "format_version": AI_CONTEXT_STALE, "content": "", "source_version": 1},
+        ["user_id"], {"format_version": AI_CONTEXT_STALE, "source_version": AIContextSnapshot.source_version + 1},
+    )
+
+
+# Tracing: one span per crud call, wrapped only when enabled so the default path is untouched
+if settings.TRACING_ENABLED:
+    instrument_module(globals(), __name__, "crud",
+                      span_names={"get_password_hash": "bcrypt.hash", "verify_password": "bcrypt.verify"})
@@ -3,14 +3,21 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from config import settings
 import logging
+import orjson
 
 logger = logging.getLogger(__name__)
 
+def json_serializer(value) -> str:
+    """Serialize JSON columns with orjson."""
+    return orjson.dumps(value).decode()
+
 # Create database engine
 if settings.DATABASE_URL.startswith("sqlite"):
     engine = create_engine(
         settings.DATABASE_URL,
         connect_args={"check_same_thread": False},
+        json_serializer=json_serializer,
+        json_deserializer=orjson.loads,
         echo=settings.DEBUG
     )
 else:
@@ -18,11 +25,14 @@ else:
         settings.DATABASE_URL,
         pool_pre_ping=True,
         pool_recycle=300,
+        json_serializer=json_serializer,
+        json_deserializer=orjson.loads,
         echo=settings.DEBUG
     )
 
 # Create SessionLocal class
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Objects stay loaded after commit; crud writes already return fresh rows via RETURNING
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 # Create Base class
 Base = declarative_base()
@@ -0,0 +1,124 @@
+import re
+from bisect import bisect_left
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Dict, List
+
+import nutrient_db
+
+MAX_RESULTS = 50
+# Fuzzy matches need at least this trigram similarity (Dice coefficient)
+MIN_SIMILARITY = 0.35
+
+# Ranking tiers; a fuzzy match scores its similarity (below 1)
+EXACT, PREFIX, WORD_PREFIX = 4.0, 3.0, 2.0
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+def normalize(text: str) -> str:
+    return _NON_ALNUM.sub(" ", text.lower()).strip()
+
+def trigrams(text: str) -> set:
+    """Character trigrams of each word, padded so short words and word starts count."""
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+class FoodSearchIndex:
+    """
+    Autocomplete index over food names and synonyms from the nutrient database.
+
+    Prefix matches come from a sorted list of every word-suffix of every term
+    ("firm tofu" is stored as "firm tofu" and "tofu"), searched with bisect.
+    Typos fall back to trigram postings: terms sharing trigrams with the
+    query are ranked by Dice similarity. Both are built once, before workers
+    fork, and only read afterwards.
+    """
+
+    def __init__(self, foods: nutrient_db.NutrientDB):
+        self.foods = foods
+        # One entry per searchable term: (normalized term, food row, whether it is the food's name)
+        self.entries = []
+        for row in range(len(foods)):
+            self.entries.append((normalize(foods.name(row)), row, True))
+            self.entries.extend((normalize(synonym), row, False) for synonym in foods.synonyms(row))
+
+        keys = []
+        self.postings: Dict[str, List[int]] = {}
+        self.sizes = []
+        for entry_id, (term, _, _) in enumerate(self.entries):
+            words = term.split()
+            keys.extend((" ".join(words[i:]), i, entry_id) for i in range(len(words)))
+            grams = trigrams(term)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(entry_id)
+        keys.sort()
+        self.keys = [key for key, _, _ in keys]
+        self.key_entries = [(position, entry_id) for _, position, entry_id in keys]
+        # Food rows the results are built from, rendered once
+        self.results = [self._result(row) for row in range(len(foods))]
+
+    def _result(self, row: int) -> Dict[str, Any]:
+        food = self.foods.food(row)
+        return {key: food[key] for key in ("id", "name", "category", "kcal", "protein_g", "carbs_g", "fat_g")}
+
+    def _prefix_scores(self, query: str) -> Dict[int, float]:
+        scores = {}
+        i = bisect_left(self.keys, query)
+        while i < len(self.keys) and self.keys[i].startswith(query):
+            position, entry_id = self.key_entries[i]
+            term = self.entries[entry_id][0]
+            score = EXACT if term == query else PREFIX if position == 0 else WORD_PREFIX
+            if scores.get(entry_id, 0) < score:
+                scores[entry_id] = score
+            i += 1
+        return scores
+
+    def _fuzzy_scores(self, query: str) -> Dict[int, float]:
+        grams = trigrams(query)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        scores = {}
+        for entry_id, count in shared.items():
+            similarity = 2 * count / (len(grams) + self.sizes[entry_id])
+            if similarity >= MIN_SIMILARITY:
+                scores[entry_id] = similarity
+        return scores
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Foods matching a partial or misspelt name, best first.
+
+        Exact names beat prefixes of a name, which beat prefixes of a later
+        word, which beat fuzzy matches. Within a tier, a food's own name beats
+        a synonym and shorter terms come first. Each food appears once, with
+        the term that matched it.
+        """
+        query = normalize(query)
+        if not query:
+            return []
+        limit = max(1, min(limit, MAX_RESULTS))
+        scores = self._prefix_scores(query)
+        if len(scores) < limit:
+            for entry_id, score in self._fuzzy_scores(query).items():
+                scores.setdefault(entry_id, score)
+
+        best: Dict[int, tuple] = {}
+        for entry_id, score in scores.items():
+            term, row, is_name = self.entries[entry_id]
+            rank = (-score, not is_name, len(term), term)
+            if row not in best or rank < best[row]:
+                best[row] = rank
+        ranked = sorted(best.items(), key=lambda item: item[1])[:limit]
+        return [{**self.results[row], "matched": rank[3], "score": round(-rank[0], 3)} for row, rank in ranked]
+
+@lru_cache(maxsize=1)
+def index() -> FoodSearchIndex:
+    return FoodSearchIndex(nutrient_db.load())
+
+def search(query: str, limit: int = 10) -> List[Dict[str, Any]]:
+    return index().search(query, limit)
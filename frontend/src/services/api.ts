@@ -10,6 +10,27 @@ const api = axios.create({
   },
 });
 
+// W3C trace context so server-side spans join the trace started by this request
+const randomHex = (bytes: number): string => {
+  const values = new Uint8Array(bytes);
+  if (typeof crypto !== 'undefined' && 'getRandomValues' in crypto) {
+    crypto.getRandomValues(values);
+  } else {
+    values.forEach((_, i) => { values[i] = Math.floor(Math.random() * 256); });
+  }
+  return Array.from(values, (b) => b.toString(16).padStart(2, '0')).join('');
+};
+
+// Flags are 00: the server makes its own sampling decision
+export const newTraceparent = (): string => `00-${randomHex(16)}-${randomHex(8)}-00`;
+
+api.interceptors.request.use((config) => {
+  if (!config.headers['traceparent']) {
+    config.headers['traceparent'] = newTraceparent();
+  }
+  return config;
+});
+
 // Add error interceptor
 api.interceptors.response.use(
   (response) => response,
@@ -25,6 +46,12 @@ api.interceptors.response.use(
   }
 );
 
+// Generate a key that stays the same across retries of one logical request
+export const newIdempotencyKey = (): string =>
+  (typeof crypto !== 'undefined' && 'randomUUID' in crypto)
+    ? crypto.randomUUID()
+    : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
 // Types
 export interface User {
   id: number;
@@ -155,8 +182,11 @@ export const habitTargetApi = {
 
 // Habit Log API
 export const habitLogApi = {
-  create: (userId: number, data: Omit<HabitLog, 'id' | 'user_id' | 'created_at' | 'updated_at'>) => 
-    api.post<HabitLog>(`/users/${userId}/habit-logs`, data),
+  create: (userId: number, data: Omit<HabitLog, 'id' | 'user_id' | 'created_at' | 'updated_at'>,
+           idempotencyKey: string = newIdempotencyKey()) => 
+    api.post<HabitLog>(`/users/${userId}/habit-logs`, data, {
+      headers: { 'Idempotency-Key': idempotencyKey }
+    }),
   getAll: (userId: number, filters?: { habit_type?: string; start_date?: string; end_date?: string }) => 
     api.get<HabitLog[]>(`/users/${userId}/habit-logs`, { params: filters }),
   getByDateAndType: (userId: number, logDate: string, habitType: string) => 
@@ -185,4 +215,78 @@ export const feedbackApi = {
     }),
 };
 
+// Food API
+export interface FoodSearchResult {
+  id: number;
+  name: string;
+  category: string;
+  kcal: number;
+  protein_g: number;
+  carbs_g: number;
+  fat_g: number;
+  matched: string;
+  score: number;
+}
+
+export const foodApi = {
+  // Autocomplete; tolerant of typos, so it can be called on every keystroke
+  search: (query: string, limit: number = 10) =>
+    api.get<FoodSearchResult[]>('/foods/search', { params: { q: query, limit } }),
+};
+
+// Meal plan jobs
+export interface Job<T = any> {
+  job_id: number;
+  kind: string;
+  user_id: number;
+  status: 'queued' | 'running' | 'succeeded' | 'failed';
+  progress: number;
+  progress_message: string | null;
+  attempts: number;
+  max_attempts: number;
+  error: string | null;
+  result: T | null;
+  created_at: string;
+  finished_at: string | null;
+  deduplicated?: boolean;
+}
+
+export const mealPlanApi = {
+  // Resubmitting while a job is active returns that job instead of queueing another;
+  // a changed profile while it is already running gets a 409
+  enqueue: (userId: number, profileData: Record<string, any>) =>
+    api.post<Job>(`/users/${userId}/meal-plan-jobs`, { profile_data: profileData }),
+  getJob: (jobId: number) => api.get<Job>(`/jobs/${jobId}`),
+  // Server-sent "progress" events, then a final "succeeded" or "failed" event
+  events: (jobId: number) => new EventSource(`${API_BASE_URL}/jobs/${jobId}/events`),
+};
+
+// Chat API
+export interface ChatReply {
+  response: string;
+  diet_plan_modifications?: Record<string, Record<string, string>> | null;
+}
+
+export const chatApi = {
+  // Retries reuse the same Idempotency-Key so the server answers them from the
+  // first attempt instead of making (and billing) another LLM call
+  send: async (payload: { user_id: number; message: string; health_profile?: any; current_diet_plan?: any },
+               retries: number = 2) => {
+    const idempotencyKey = newIdempotencyKey();
+    for (let attempt = 0; ; attempt++) {
+      try {
+        return await api.post<ChatReply>('/chat', payload, {
+          headers: { 'Idempotency-Key': idempotencyKey },
+          timeout: 30000,
+        });
+      } catch (error: any) {
+        const retryable = !error.response || error.response.status >= 500;
+        if (!retryable || attempt >= retries) {
+          throw error;
+        }
+      }
+    }
+  },
+};
+
 export default api;
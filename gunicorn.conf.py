@@ -1,9 +1,22 @@
+import os
+
 bind = "0.0.0.0:8000"
 workers = 4
 worker_class = "uvicorn.workers.UvicornWorker"
-max_requests = 1000
-max_requests_jitter = 100
+# Worker recycling; GUNICORN_MAX_REQUESTS=0 disables it (check /admin/memory for growth first)
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "100"))
 preload_app = True
 timeout = 30
 keepalive = 2
-max_requests_jitter = 100
+
+
+def on_starting(server):
+    """Clear metrics snapshots left by a previous run."""
+    from metrics import reset_multiprocess_dir
+    reset_multiprocess_dir()
+
+def child_exit(server, worker):
+    """Keep an exited worker's counters in the metrics archive."""
+    from metrics import mark_process_dead
+    mark_process_dead(worker.pid)
@@ -0,0 +1,70 @@
+import logging
+import time
+
+from database import engine
+from metrics import counter, gauge, histogram
+
+logger = logging.getLogger(__name__)
+
+http_requests = counter(
+    "http_requests_total",
+    "HTTP requests by method, route template and status code",
+    ["method", "route", "status"],
+)
+http_request_duration = histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by method and route template",
+    ["method", "route"],
+)
+http_requests_in_flight = gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being handled",
+)
+
+def _pool_stat(name: str):
+    def read() -> float:
+        return getattr(engine.pool, name)()
+    return read
+
+for _name, _documentation in [
+    ("size", "Configured size of the database connection pool"),
+    ("checkedout", "Database connections currently checked out"),
+    ("checkedin", "Idle database connections in the pool"),
+    ("overflow", "Database connections open beyond the pool size"),
+]:
+    if hasattr(engine.pool, _name):
+        gauge(f"db_pool_{_name}", _documentation, callback=_pool_stat(_name))
+
+def route_template(scope) -> str:
+    """Route path template such as /users/{user_id}; unmatched paths share one label to bound cardinality."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+class MetricsMiddleware:
+    """Record request count, latency and in-flight requests per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_flight.dec()
+            route = route_template(scope)
+            http_request_duration.observe(time.perf_counter() - start, method=scope["method"], route=route)
+            http_requests.inc(method=scope["method"], route=route, status=status)
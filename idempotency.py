@@ -0,0 +1,166 @@
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from config import settings
+from metrics import counter
+from models import IdempotencyRecord
+
+logger = logging.getLogger(__name__)
+
+idempotent_replays = counter(
+    "idempotent_replays_total",
+    "Requests answered from a stored or in-flight Idempotency-Key result",
+    ["scope", "source"],
+)
+
+def request_fingerprint(payload: Any) -> str:
+    """Hash a request payload so a reused key with a different body can be rejected."""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+class IdempotencyStore:
+    """
+    Stores completed responses by Idempotency-Key.
+
+    Completed responses live in a TTL-bounded in-memory LRU, optionally backed by
+    the idempotency_records table so they survive restarts and are visible to
+    other workers. Duplicates that arrive while the first request is still
+    running wait on the same future instead of repeating the work.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int, use_db: bool = False):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.use_db = use_db
+        self._entries: "OrderedDict[str, Tuple[float, str, Any]]" = OrderedDict()
+        self._in_flight: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self._lock = threading.Lock()
+
+    def clear(self) -> None:
+        """Drop all completed entries held in memory."""
+        with self._lock:
+            self._entries.clear()
+
+    def _get_memory(self, key: str) -> Optional[Tuple[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, fingerprint, body = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return fingerprint, body
+
+    def _put_memory(self, key: str, fingerprint: str, body: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, fingerprint, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _get_db(self, db: Session, key: str) -> Optional[Tuple[str, Any]]:
+        record = db.query(IdempotencyRecord).filter(
+            IdempotencyRecord.key == key,
+            IdempotencyRecord.expires_at > datetime.utcnow()
+        ).first()
+        if not record:
+            return None
+        return record.fingerprint, json.loads(record.response_body)
+
+    def _put_db(self, db: Session, key: str, fingerprint: str, body: Any) -> None:
+        now = datetime.utcnow()
+        try:
+            db.query(IdempotencyRecord).filter(IdempotencyRecord.expires_at <= now).delete(synchronize_session=False)
+            db.add(IdempotencyRecord(
+                key=key,
+                fingerprint=fingerprint,
+                response_body=json.dumps(body, default=str),
+                expires_at=now + timedelta(seconds=self.ttl_seconds)
+            ))
+            db.commit()
+        except Exception as e:
+            # Another worker stored the same key first; the in-memory copy is still valid
+            db.rollback()
+            logger.warning(f"Could not persist idempotency record {key}: {e}")
+
+    def _lookup(self, key: str, fingerprint: str, db: Optional[Session]) -> Optional[Tuple[str, Any]]:
+        stored = self._get_memory(key)
+        source = "memory"
+        if stored is None and self.use_db and db is not None:
+            stored = self._get_db(db, key)
+            source = "db"
+            if stored is not None:
+                self._put_memory(key, *stored)
+        if stored is None:
+            return None
+        if stored[0] != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+        return source, stored[1]
+
+    async def run(self, scope: str, idempotency_key: Optional[str], payload: Any,
+                  func: Callable[[], Awaitable[Any]], db: Optional[Session] = None) -> Any:
+        """
+        Run func once per (scope, Idempotency-Key) and return its JSON-compatible result.
+
+        Requests without a key run func directly. Failed requests are not stored,
+        so the client can retry them with the same key.
+        """
+        if not idempotency_key:
+            return await func()
+
+        key = f"{scope}:{idempotency_key}"
+        fingerprint = request_fingerprint(payload)
+
+        stored = self._lookup(key, fingerprint, db)
+        if stored is not None:
+            idempotent_replays.inc(scope=scope, source=stored[0])
+            return stored[1]
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            if in_flight[0] != fingerprint:
+                raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+            idempotent_replays.inc(scope=scope, source="in_flight")
+            return await asyncio.shield(in_flight[1])
+
+        future = asyncio.get_running_loop().create_future()
+        # Mark the outcome as retrieved so unshared failures don't log "never retrieved"
+        future.add_done_callback(lambda f: f.exception())
+        self._in_flight[key] = (fingerprint, future)
+        try:
+            body = await func()
+        except asyncio.CancelledError:
+            future.set_exception(HTTPException(
+                status_code=409,
+                detail="The original request with this Idempotency-Key was interrupted. Please retry."
+            ))
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            self._put_memory(key, fingerprint, body)
+            if self.use_db and db is not None:
+                self._put_db(db, key, fingerprint, body)
+            future.set_result(body)
+            return body
+        finally:
+            self._in_flight.pop(key, None)
+
+idempotency_store = IdempotencyStore(
+    ttl_seconds=settings.IDEMPOTENCY_TTL_SECONDS,
+    max_entries=settings.IDEMPOTENCY_MAX_ENTRIES,
+    use_db=settings.IDEMPOTENCY_DB_ENABLED,
+)
@@ -0,0 +1,322 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import meal_plan_cache
+from config import settings
+from database import SessionLocal
+from idempotency import request_fingerprint
+from metrics import counter, histogram
+from models import Job
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+FINISHED = (SUCCEEDED, FAILED)
+
+jobs_enqueued = counter(
+    "jobs_enqueued_total",
+    "Jobs submitted by kind and result (new, or deduplicated onto an active job)",
+    ["kind", "result"],
+)
+jobs_completed = counter(
+    "jobs_completed_total",
+    "Job attempts by kind and outcome (succeeded, retried, failed, lease_lost)",
+    ["kind", "outcome"],
+)
+job_duration = histogram(
+    "job_duration_seconds",
+    "Time a worker spent running one job attempt",
+    ["kind"],
+)
+
+# A handler gets the job payload, a session and a progress(percent, message) callback,
+# and returns a JSON-compatible result. Raising schedules a retry.
+Handler = Callable[[Dict[str, Any], Session, Callable[..., None]], Any]
+_handlers: Dict[str, Handler] = {}
+
+class JobConflict(Exception):
+    """The user's active job of this kind is already running with a different payload."""
+
+    def __init__(self, job: Job):
+        super().__init__(f"Job {job.id} is already running")
+        self.job = job
+
+def handler(kind: str) -> Callable[[Handler], Handler]:
+    """Register the function that runs jobs of this kind."""
+    def register(func: Handler) -> Handler:
+        _handlers[kind] = func
+        return func
+    return register
+
+class JobQueue:
+    """
+    Jobs stored in the jobs table and run by async workers inside the app.
+
+    A worker claims a job with a conditional UPDATE, so workers in every
+    process can poll the same table without an external broker. The claim
+    is a lease: while it runs, the job's progress reports renew it, and if
+    the worker dies the lease expires after the visibility timeout and
+    another worker picks the job up. Failed attempts are retried with
+    exponential backoff until max_attempts. A user has at most one active
+    job of each kind, enforced by a partial unique index; submitting again
+    returns it instead of queueing more work.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session], workers: int, visibility_timeout: float,
+                 max_attempts: int, retry_backoff: float, poll_interval: float, retention: float):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._tasks: List[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._last_prune = 0.0
+
+    def _active(self, db: Session, kind: str, user_id: int) -> Optional[Job]:
+        return db.query(Job).filter(
+            Job.kind == kind, Job.user_id == user_id, Job.status.in_((QUEUED, RUNNING))
+        ).populate_existing().first()
+
+    def enqueue(self, db: Session, kind: str, user_id: int, payload: Dict[str, Any]) -> Tuple[Job, bool]:
+        """
+        Queue a job and return it with whether it was deduplicated.
+
+        An active job for the same user and kind is reused: as is when the
+        payload matches, or with the new payload if it hasn't started yet.
+        A different payload while that job is running raises JobConflict.
+        """
+        fingerprint = request_fingerprint(payload)
+        for _ in range(2):
+            active = self._active(db, kind, user_id)
+            if active is not None:
+                if active.fingerprint == fingerprint:
+                    jobs_enqueued.inc(kind=kind, result="deduplicated")
+                    return active, True
+                replaced = db.query(Job).filter(Job.id == active.id, Job.status == QUEUED).update(
+                    {Job.payload: json.dumps(payload), Job.fingerprint: fingerprint}, synchronize_session=False)
+                db.commit()
+                if replaced:
+                    jobs_enqueued.inc(kind=kind, result="deduplicated")
+                    return self.get(db, active.id), True
+                # Claimed between the read and the update; look again (it may also have just finished)
+                active = self._active(db, kind, user_id)
+                if active is not None:
+                    raise JobConflict(active)
+
+            job = Job(kind=kind, user_id=user_id, status=QUEUED, payload=json.dumps(payload), fingerprint=fingerprint,
+                      max_attempts=self.max_attempts, available_at=datetime.utcnow())
+            db.add(job)
+            try:
+                db.commit()
+            except IntegrityError:
+                # A concurrent request queued this user's job first; dedupe against it
+                db.rollback()
+                continue
+            jobs_enqueued.inc(kind=kind, result="new")
+            if self._wake is not None:
+                self._wake.set()
+            return job, False
+        raise JobConflict(self._active(db, kind, user_id))
+
+    def get(self, db: Session, job_id: int) -> Optional[Job]:
+        return db.query(Job).filter(Job.id == job_id).populate_existing().first()
+
+    def claim(self, db: Session, worker_id: str) -> Optional[Job]:
+        """Lease the next runnable job to worker_id, or return None when there is nothing to do."""
+        now = datetime.utcnow()
+        # A lease that expired on the last allowed attempt fails the job rather than running it again
+        db.query(Job).filter(Job.status == RUNNING, Job.locked_until < now, Job.attempts >= Job.max_attempts).update(
+            {Job.status: FAILED, Job.error: "Worker lease expired on the final attempt",
+             Job.locked_until: None, Job.finished_at: now}, synchronize_session=False)
+        claimable = or_(and_(Job.status == QUEUED, Job.available_at <= now),
+                        and_(Job.status == RUNNING, Job.locked_until < now))
+        candidates = db.query(Job.id).filter(claimable).order_by(Job.available_at, Job.id).limit(self.workers + 1).all()
+        for (job_id,) in candidates:
+            # Only one worker's UPDATE can match; the others see rowcount 0 and try the next job
+            claimed = db.query(Job).filter(Job.id == job_id, claimable).update({
+                Job.status: RUNNING,
+                Job.worker_id: worker_id,
+                Job.attempts: Job.attempts + 1,
+                Job.locked_until: now + timedelta(seconds=self.visibility_timeout),
+            }, synchronize_session=False)
+            db.commit()
+            if claimed:
+                return self.get(db, job_id)
+        db.commit()
+        return None
+
+    def _finish(self, db: Session, job: Job, attempt: int, values: Dict[Any, Any]) -> bool:
+        """Apply values if this attempt still holds the lease; False means another worker took over."""
+        updated = db.query(Job).filter(
+            Job.id == job.id, Job.status == RUNNING, Job.worker_id == job.worker_id, Job.attempts == attempt
+        ).update(values, synchronize_session=False)
+        db.commit()
+        return bool(updated)
+
+    def execute(self, db: Session, job: Job) -> None:
+        """Run a claimed job and record its result, a retry, or its failure."""
+        attempt = job.attempts
+
+        def progress(percent: int, message: Optional[str] = None) -> None:
+            # Progress doubles as the lease heartbeat
+            self._finish(db, job, attempt, {
+                Job.progress: max(0, min(int(percent), 100)),
+                Job.progress_message: message,
+                Job.locked_until: datetime.utcnow() + timedelta(seconds=self.visibility_timeout),
+            })
+
+        start = time.perf_counter()
+        try:
+            func = _handlers.get(job.kind)
+            if func is None:
+                raise LookupError(f"No handler registered for job kind {job.kind!r}")
+            result = func(json.loads(job.payload), db, progress)
+        except Exception as e:
+            db.rollback()
+            now = datetime.utcnow()
+            if attempt < job.max_attempts:
+                outcome = "retried"
+                values = {Job.status: QUEUED, Job.error: str(e), Job.progress: 0, Job.progress_message: None,
+                          Job.locked_until: None, Job.worker_id: None,
+                          Job.available_at: now + timedelta(seconds=self.retry_backoff * 2 ** (attempt - 1))}
+            else:
+                outcome = "failed"
+                values = {Job.status: FAILED, Job.error: str(e), Job.locked_until: None, Job.finished_at: now}
+            logger.warning(f"Job {job.id} ({job.kind}) attempt {attempt}/{job.max_attempts} failed: {e}")
+        else:
+            outcome = "succeeded"
+            values = {Job.status: SUCCEEDED, Job.result: json.dumps(result, default=str), Job.error: None,
+                      Job.progress: 100, Job.locked_until: None, Job.finished_at: datetime.utcnow()}
+        job_duration.observe(time.perf_counter() - start, kind=job.kind)
+        if not self._finish(db, job, attempt, values):
+            outcome = "lease_lost"
+            logger.warning(f"Job {job.id} ({job.kind}) lease expired before attempt {attempt} finished; result dropped")
+        jobs_completed.inc(kind=job.kind, outcome=outcome)
+
+    def prune(self, db: Session) -> int:
+        """Delete finished jobs older than the retention period."""
+        cutoff = datetime.utcnow() - timedelta(hours=self.retention)
+        deleted = db.query(Job).filter(Job.status.in_(FINISHED), Job.finished_at < cutoff).delete(synchronize_session=False)
+        db.commit()
+        return deleted
+
+    def run_once(self, worker_id: str) -> bool:
+        """Claim and run one job; False when the queue had nothing runnable."""
+        with self.session_factory() as db:
+            job = self.claim(db, worker_id)
+            if job is None:
+                if time.monotonic() - self._last_prune > 60:
+                    self._last_prune = time.monotonic()
+                    self.prune(db)
+                return False
+            self.execute(db, job)
+            return True
+
+    async def _worker(self, worker_id: str) -> None:
+        while not self._stopping:
+            try:
+                # Handlers are blocking (DB and CPU), so they run off the event loop
+                worked = await asyncio.to_thread(self.run_once, worker_id)
+            except Exception as e:
+                logger.error(f"Job worker {worker_id} error: {e}")
+                worked = False
+            if not worked and not self._stopping:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+
+    def start(self) -> None:
+        """Start the worker tasks on the running loop."""
+        if self._tasks:
+            return
+        self._stopping = False
+        self._wake = asyncio.Event()
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks = [asyncio.create_task(self._worker(f"{prefix}:{i}")) for i in range(self.workers)]
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Let workers finish their current job, then cancel any that don't within timeout."""
+        if not self._tasks:
+            return
+        self._stopping = True
+        self._wake.set()
+        _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        self._tasks = []
+        self._wake = None
+
+    def describe(self, job: Job) -> Dict[str, Any]:
+        """Job status for the API; the result is included once the job has succeeded."""
+        return {
+            "job_id": job.id,
+            "kind": job.kind,
+            "user_id": job.user_id,
+            "status": job.status,
+            "progress": job.progress,
+            "progress_message": job.progress_message,
+            "attempts": job.attempts,
+            "max_attempts": job.max_attempts,
+            "error": job.error,
+            "result": json.loads(job.result) if job.status == SUCCEEDED and job.result else None,
+            "created_at": job.created_at,
+            "finished_at": job.finished_at,
+        }
+
+    def status(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """describe() for a job id in a session of its own, or None if there is no such job."""
+        with self.session_factory() as db:
+            job = self.get(db, job_id)
+            return self.describe(job) if job is not None else None
+
+    async def events(self, job_id: int, interval: float = 1.0, keepalive: float = 15.0) -> AsyncIterator[str]:
+        """Server-sent events for a job: progress on every change, then one final event with the result or error."""
+        last, last_sent = None, time.monotonic()
+        while True:
+            # The query is blocking, so it runs off the event loop like the workers' own DB work
+            state = await asyncio.to_thread(self.status, job_id)
+            if state is None:
+                yield f"event: error\ndata: {json.dumps({'detail': 'Job not found'})}\n\n"
+                return
+            if state["status"] in FINISHED:
+                yield f"event: {state['status']}\ndata: {json.dumps(state, default=str)}\n\n"
+                return
+            current = (state["status"], state["progress"], state["attempts"])
+            if current != last:
+                last, last_sent = current, time.monotonic()
+                yield f"event: progress\ndata: {json.dumps(state, default=str)}\n\n"
+            elif time.monotonic() - last_sent > keepalive:
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(interval)
+
+job_queue = JobQueue(
+    session_factory=SessionLocal,
+    workers=settings.JOBS_WORKERS,
+    visibility_timeout=settings.JOBS_VISIBILITY_TIMEOUT_SECONDS,
+    max_attempts=settings.JOBS_MAX_ATTEMPTS,
+    retry_backoff=settings.JOBS_RETRY_BACKOFF_SECONDS,
+    poll_interval=settings.JOBS_POLL_INTERVAL_SECONDS,
+    retention=settings.JOBS_RETENTION_HOURS,
+)
+
+@handler("meal_plan")
+def build_meal_plan(payload: Dict[str, Any], db: Session, progress: Callable[..., None]) -> Dict[str, Any]:
+    progress(10, "Building your meal plan")
+    return {"meal_plan": meal_plan_cache.build_plan(payload["profile_data"], db)}
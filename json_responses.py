@@ -0,0 +1,27 @@
+from typing import Any, Iterable, Mapping
+
+import orjson
+from fastapi.responses import JSONResponse, Response
+
+# UTC datetimes as "...Z" to match Pydantic's output
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+def rows_response(rows: Iterable[Mapping[str, Any]], status_code: int = 200) -> Response:
+    """
+    Serialize database rows straight to a JSON array response.
+
+    Used by read-heavy list endpoints to skip ORM hydration and per-row
+    response_model construction; the rows must already contain exactly the
+    fields of the endpoint's response model.
+    """
+    return Response(
+        content=orjson.dumps([dict(row) for row in rows], option=ORJSON_OPTIONS),
+        status_code=status_code,
+        media_type="application/json",
+    )
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Optional
+
+from fastapi import HTTPException, Request
+
+from config import settings
+from metrics import counter
+
+logger = logging.getLogger(__name__)
+
+# Status code used by nginx and friends for "client closed request"
+CLIENT_CLOSED_REQUEST = 499
+
+llm_cancellations = counter(
+    "llm_calls_cancelled_total",
+    "Upstream LLM calls cancelled because the client disconnected",
+    ["endpoint"],
+)
+llm_deadline_exceeded = counter(
+    "llm_calls_deadline_exceeded_total",
+    "Upstream LLM calls cancelled because the endpoint deadline passed",
+    ["endpoint"],
+)
+
+llm_slot_timeouts = counter(
+    "llm_slot_wait_timeouts_total",
+    "Requests that gave up waiting for an upstream LLM slot at the endpoint deadline",
+    ["endpoint"],
+)
+
+# Limits concurrent upstream calls per worker; created lazily inside the event loop
+_llm_slots: Optional[asyncio.Semaphore] = None
+
+def get_llm_slots() -> asyncio.Semaphore:
+    """Get the semaphore bounding concurrent upstream LLM calls."""
+    global _llm_slots
+    if _llm_slots is None:
+        _llm_slots = asyncio.Semaphore(settings.OPENAI_MAX_CONCURRENCY)
+    return _llm_slots
+
+async def _wait_for_disconnect(request: Request) -> None:
+    """Return once the client behind the request has gone away."""
+    while not await request.is_disconnected():
+        await asyncio.sleep(settings.DISCONNECT_POLL_INTERVAL_SECONDS)
+
+async def _acquire_slot(request: Request, endpoint: str, deadline: float) -> None:
+    """
+    Wait for an LLM slot, giving up when the client disconnects or the deadline passes.
+
+    Raises 499 on disconnect and 503 when no slot freed up in time; on return
+    the caller holds a slot and must release it.
+    """
+    slots = get_llm_slots()
+    acquire_task = asyncio.ensure_future(slots.acquire())
+    disconnect_task = asyncio.ensure_future(_wait_for_disconnect(request))
+    done = set()
+    try:
+        done, _ = await asyncio.wait(
+            {acquire_task, disconnect_task},
+            timeout=deadline,
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+    finally:
+        disconnect_task.cancel()
+        if acquire_task not in done:
+            acquire_task.cancel()
+            try:
+                await acquire_task
+            except asyncio.CancelledError:
+                pass
+            else:
+                # The slot was granted just as we gave up on it
+                slots.release()
+
+    if acquire_task in done:
+        return
+    if disconnect_task in done:
+        llm_cancellations.inc(endpoint=endpoint)
+        logger.info(f"Client disconnected from {endpoint} while waiting for an LLM slot")
+        raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client closed request")
+    llm_slot_timeouts.inc(endpoint=endpoint)
+    logger.warning(f"No LLM slot for {endpoint} within {deadline}s deadline")
+    raise HTTPException(status_code=503, detail="The AI service is busy. Please try again shortly.")
+
+async def run_llm_call(request: Request, call: Awaitable[Any], endpoint: str, deadline: float) -> Any:
+    """
+    Run an upstream LLM call on behalf of a request.
+
+    The deadline covers both waiting for a concurrency slot and the call
+    itself. Waiting or calling stops if the client disconnects or the
+    deadline passes, and the slot is released either way. Callers should only
+    commit side effects such as quota usage after this returns.
+    """
+    loop = asyncio.get_running_loop()
+    expires_at = loop.time() + deadline
+    try:
+        await _acquire_slot(request, endpoint, deadline)
+    except BaseException:
+        # The coroutine will never be awaited now; close it so it isn't reported as leaked
+        if asyncio.iscoroutine(call):
+            call.close()
+        raise
+
+    try:
+        call_task = asyncio.ensure_future(call)
+        disconnect_task = asyncio.ensure_future(_wait_for_disconnect(request))
+        try:
+            done, _ = await asyncio.wait(
+                {call_task, disconnect_task},
+                timeout=max(0.0, expires_at - loop.time()),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+        except asyncio.CancelledError:
+            call_task.cancel()
+            raise
+        finally:
+            disconnect_task.cancel()
+
+        if call_task in done:
+            return call_task.result()
+
+        call_task.cancel()
+        try:
+            await call_task
+        except (asyncio.CancelledError, Exception):
+            pass
+
+        if disconnect_task in done:
+            llm_cancellations.inc(endpoint=endpoint)
+            logger.info(f"Client disconnected from {endpoint}, cancelled upstream LLM call")
+            raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client closed request")
+
+        llm_deadline_exceeded.inc(endpoint=endpoint)
+        logger.warning(f"Upstream LLM call for {endpoint} exceeded {deadline}s deadline")
+        raise HTTPException(status_code=504, detail="The AI service took too long to respond. Please try again.")
+    finally:
+        get_llm_slots().release()
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from config import settings
+from metrics import counter, gauge, histogram
+
+logger = logging.getLogger(__name__)
+
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+event_loop_lag = gauge(
+    "event_loop_lag_seconds",
+    "Latest delay of the event loop in running a scheduled callback",
+    multiprocess_mode="max",
+)
+event_loop_lag_histogram = histogram(
+    "event_loop_lag_duration_seconds",
+    "Event loop scheduling delay samples",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+event_loop_stalls = counter(
+    "event_loop_stalls_total",
+    "Times the event loop was blocked longer than LOOP_STALL_THRESHOLD_MS, by route",
+    ["route"],
+)
+event_loop_stall_duration = histogram(
+    "event_loop_stall_duration_seconds",
+    "Duration of event loop stalls",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+# Request scope of the task handling each in-flight request, for attributing stalls
+_task_scopes: Dict[asyncio.Task, dict] = {}
+
+class LoopMonitorMiddleware:
+    """Remember which request each task is serving so a stall can be attributed to its route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        task = asyncio.current_task()
+        _task_scopes[task] = scope
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _task_scopes.pop(task, None)
+
+def _blocking_function(frames: List[traceback.FrameSummary]) -> Optional[str]:
+    """Innermost frame in application code, e.g. 'crud.py:212 get_habit_logs'."""
+    for frame in reversed(frames):
+        filename = os.path.abspath(frame.filename)
+        if (filename.startswith(APP_ROOT) and "site-packages" not in filename
+                and os.path.basename(filename) != "loop_monitor.py"):
+            return f"{os.path.relpath(filename, APP_ROOT)}:{frame.lineno} {frame.name}"
+    return frames[-1].name if frames else None
+
+class LoopMonitor:
+    """
+    Event loop heartbeat plus a watchdog thread.
+
+    The heartbeat task records scheduling lag. When it is late by more than
+    the stall threshold, the watchdog captures the loop thread's stack and
+    the route of the running task, and keeps the record in a ring buffer.
+    """
+
+    def __init__(self, interval: float, threshold: float, buffer_size: int):
+        self.interval = interval
+        self.threshold = threshold
+        self.stalls: deque = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._last_beat = time.monotonic()
+        self._current_stall: Optional[Dict[str, Any]] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    def start(self) -> None:
+        """Start the heartbeat on the running loop and the watchdog thread."""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop_event.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stop_event.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._thread.join(timeout=1)
+        self._task = None
+        self._thread = None
+
+    async def _heartbeat(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            event_loop_lag.set(lag)
+            event_loop_lag_histogram.observe(lag)
+            with self._lock:
+                self._last_beat = time.monotonic()
+                stall, self._current_stall = self._current_stall, None
+            if stall is not None:
+                stall["duration_ms"] = round(lag * 1000, 1)
+                event_loop_stall_duration.observe(lag)
+
+    def _watch(self) -> None:
+        while not self._stop_event.wait(min(self.interval, self.threshold / 2)):
+            with self._lock:
+                overdue = time.monotonic() - self._last_beat - self.interval
+                if overdue < self.threshold or self._current_stall is not None:
+                    continue
+                stall = self._current_stall = self._capture(overdue)
+            self.stalls.append(stall)
+
+    def _capture(self, overdue: float) -> Dict[str, Any]:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        frames = traceback.extract_stack(frame) if frame is not None else []
+        task = asyncio.current_task(self._loop)
+        scope = _task_scopes.get(task) if task is not None else None
+        route = None
+        if scope is not None:
+            route = getattr(scope.get("route"), "path", None) or scope.get("path")
+        function = _blocking_function(frames)
+        event_loop_stalls.inc(route=route or "unknown")
+        logger.warning(f"Event loop blocked for {overdue * 1000:.0f}ms+ in {function} (route {route})")
+        return {
+            "detected_at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": None,  # filled in when the loop recovers
+            "detected_after_ms": round(overdue * 1000, 1),
+            "route": route,
+            "method": scope.get("method") if scope else None,
+            "function": function,
+            "stack": traceback.format_list(frames[-settings.LOOP_STALL_STACK_DEPTH:]),
+        }
+
+    def recent_stalls(self) -> List[Dict[str, Any]]:
+        """Recorded stalls, newest first."""
+        return list(reversed(self.stalls))
+
+monitor = LoopMonitor(
+    interval=settings.EVENT_LOOP_LAG_INTERVAL_SECONDS,
+    threshold=settings.LOOP_STALL_THRESHOLD_MS / 1000,
+    buffer_size=settings.LOOP_STALL_BUFFER_SIZE,
+)
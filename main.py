@@ -1,12 +1,13 @@
-from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi import FastAPI, Depends, HTTPException, Request, Header, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import uvicorn
 import logging
-import time
 import json
+from contextlib import asynccontextmanager
 from datetime import datetime
 
 from database import get_db, engine
@@ -15,17 +16,39 @@ from schemas import (UserCreate, UserResponse, UserUpdate, ChatRequest, ChatResp
                     HealthProfileCreate, HealthProfileUpdate, HealthProfileResponse, QuestionnaireCreate, QuestionnaireUpdate, 
                     QuestionnaireResponse, HabitTargetCreate, HabitTargetUpdate, HabitTargetResponse, HabitLogCreate, 
                     HabitLogUpdate, HabitLogResponse, DailyProgressResponse, WeeklyProgressResponse, MonthlyProgressResponse, 
-                    FeedbackResponse)
+                    FeedbackResponse, FoodSearchResult)
 from crud import (create_user, get_user, get_users, update_user, delete_user, check_message_limit, increment_message_count, 
                  get_current_month_year, get_user_health_profile, create_user_health_profile, update_user_health_profile, 
                  delete_user_health_profile, get_health_profile_for_ai, get_user_questionnaire, create_user_questionnaire, 
                  update_user_questionnaire, delete_user_questionnaire, get_user_habit_targets, get_habit_target, 
                  create_habit_target, update_habit_target, delete_habit_target, get_habit_logs, get_habit_log, 
                  create_habit_log, update_habit_log, delete_habit_log, calculate_daily_progress, calculate_weekly_progress, 
-                 calculate_monthly_progress, generate_feedback)
-from openai_service import get_openai_service
+                 calculate_monthly_progress, generate_feedback, get_ai_context, get_user_rows, get_habit_log_rows)
+from openai_service import get_openai_service, UpstreamError
 from onboarding_service import OnboardingChatService
 from ai_profiling_service import AIProfilingService
+from llm_guard import run_llm_call
+from idempotency import idempotency_store
+from coalesce import coalesced
+from json_responses import ORJSONResponse, rows_response
+from query_stats import QueryStatsMiddleware
+import request_logging
+from request_logging import RequestLoggingMiddleware
+import traffic_capture
+import meal_planner
+import food_search
+import migrate_ai_context_version
+import migrate_message_tracking_unique
+from jobs import JobConflict, job_queue
+from traffic_capture import TrafficCaptureMiddleware
+from admin import router as admin_router
+from http_metrics import MetricsMiddleware
+from loop_monitor import LoopMonitorMiddleware, monitor as loop_monitor
+from profiling import ProfilingMiddleware
+import tracing
+from tracing import TracingMiddleware
+import metrics
+from config import settings
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -37,11 +60,45 @@ ai_profiling_service = AIProfilingService()
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
+# Then the changes create_all can't make to existing tables; each is a no-op once applied.
+# Runs once before gunicorn forks (preload_app)
+migrate_message_tracking_unique.upgrade(engine)
+migrate_ai_context_version.upgrade(engine)
+
+# Map the food table, resolve recipes and build the food search index before gunicorn forks
+# (preload_app) so workers share them
+meal_planner.recipes()
+food_search.index()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    request_logging.start()
+    if settings.TRAFFIC_CAPTURE_ENABLED:
+        traffic_capture.start()
+    if settings.LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    flush_thread = None
+    if settings.METRICS_ENABLED and settings.METRICS_MULTIPROC_DIR:
+        flush_thread = metrics.FlushThread(settings.METRICS_FLUSH_INTERVAL_SECONDS)
+        flush_thread.start()
+    if settings.JOBS_ENABLED:
+        job_queue.start()
+    yield
+    await job_queue.stop()
+    await loop_monitor.stop()
+    if flush_thread:
+        flush_thread.stop()
+    request_logging.stop()
+    traffic_capture.stop()
+    if tracing.exporter:
+        tracing.exporter.shutdown()
 
 app = FastAPI(
     title="Nutrition AI MVP",
     description="A FastAPI application with PostgreSQL",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -51,25 +108,53 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-DB-Query-Count", "X-DB-Time-Ms"],
 )
 
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     logger.error(f"Global exception: {exc}", exc_info=True)
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={"detail": "Internal server error"}
     )
 
-# Request logging middleware
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
-    logger.info(f"{request.method} {request.url} - {response.status_code} - {process_time:.3f}s")
-    return response
+# On-demand profiling of single requests; not installed at all unless enabled
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
+# Sampled, scrubbed request capture for replay; not installed unless enabled
+if settings.TRAFFIC_CAPTURE_ENABLED:
+    app.add_middleware(TrafficCaptureMiddleware)
+
+# Structured access log, written by a background listener
+app.add_middleware(RequestLoggingMiddleware)
+
+# Per-request SQL statement counts and N+1 warnings; wraps the access log so
+# the counts can be included in its records
+app.add_middleware(QueryStatsMiddleware)
+
+# Lets the loop watchdog attribute a blocked event loop to the request's route
+if settings.LOOP_MONITOR_ENABLED:
+    app.add_middleware(LoopMonitorMiddleware)
+
+# Server span per request, continuing the frontend's traceparent
+if settings.TRACING_ENABLED:
+    app.add_middleware(TracingMiddleware)
+
+# Request count/latency per route template; outermost so it sees every response
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+app.include_router(admin_router)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    """Prometheus scrape endpoint."""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(metrics.generate_latest(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 async def root():
@@ -86,8 +171,8 @@ async def create_user_endpoint(user: UserCreate, db: Session = Depends(get_db)):
 
 @app.get("/users/", response_model=List[UserResponse])
 async def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    users = get_users(db, skip=skip, limit=limit)
-    return users
+    # Rows are serialized directly; they match UserResponse
+    return rows_response(get_user_rows(db, skip=skip, limit=limit))
 
 @app.get("/users/{user_id}", response_model=UserResponse)
 async def read_user(user_id: int, db: Session = Depends(get_db)):
@@ -112,7 +197,14 @@ async def delete_user_endpoint(user_id: int, db: Session = Depends(get_db)):
 
 # Chat endpoint
 @app.post("/chat")
-async def chat_endpoint(request: dict, db: Session = Depends(get_db)):
+async def chat_endpoint(request: dict, http_request: Request, db: Session = Depends(get_db),
+                        idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    return await idempotency_store.run(
+        "/chat", idempotency_key, request,
+        lambda: _chat_response(request, http_request, db), db=db
+    )
+
+async def _chat_response(request: dict, http_request: Request, db: Session):
     try:
         user_id = request.get("user_id")
         message = request.get("message")
@@ -134,10 +226,12 @@ async def chat_endpoint(request: dict, db: Session = Depends(get_db)):
         # Get OpenAI service
         openai_service = get_openai_service()
         
+        # Prefer the server-side snapshot; fall back to the client's profile for users without one
+        profile_context = get_ai_context(db, user_id) or (json.dumps(health_profile, separators=(",", ":")) if health_profile else None)
+        
         # Create enhanced context for diet plan modifications
         diet_context = f"""
-        Current diet plan: {json.dumps(current_diet_plan, indent=2)}
-        User health profile: {json.dumps(health_profile, indent=2)}
+        Current diet plan: {json.dumps(current_diet_plan, separators=(",", ":"))}
         
         The user can ask for diet modifications like:
         - "Make it paleo"
@@ -159,11 +253,16 @@ async def chat_endpoint(request: dict, db: Session = Depends(get_db)):
         If no diet modifications are needed, just respond normally without the diet_plan_modifications field.
         """
         
-        # Get response from OpenAI with enhanced context
-        response = await openai_service.chat_completion(
-            message=f"{diet_context}\n\nUser message: {message}",
-            conversation_history=[],
-            health_profile=health_profile
+        # Get response from OpenAI with enhanced context; cancelled if the client goes away
+        response = await run_llm_call(
+            http_request,
+            openai_service.chat_completion(
+                message=f"{diet_context}\n\nUser message: {message}",
+                conversation_history=[],
+                profile_context=profile_context
+            ),
+            endpoint="/chat",
+            deadline=settings.CHAT_DEADLINE_SECONDS
         )
         
         # Increment message count after successful API call
@@ -191,6 +290,9 @@ async def chat_endpoint(request: dict, db: Session = Depends(get_db)):
         
     except HTTPException:
         raise
+    except UpstreamError:
+        # Not billed, and raised rather than returned so the idempotency layer doesn't store it
+        raise HTTPException(status_code=503, detail="The AI service is unavailable. Please try again.")
     except ValueError as e:
         raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
@@ -229,36 +331,11 @@ async def create_health_profile(user_id: int, health_profile: HealthProfileCreat
     health_data = health_profile.dict(exclude_unset=True)
     db_health_profile = create_user_health_profile(db, user_id, health_data)
     
-    # Convert JSON strings back to lists for response
-    import json
-    response_data = {
-        "id": db_health_profile.id,
-        "user_id": db_health_profile.user_id,
-        "age": db_health_profile.age,
-        "gender": db_health_profile.gender,
-        "height_cm": db_health_profile.height_cm,
-        "weight_kg": db_health_profile.weight_kg,
-        "activity_level": db_health_profile.activity_level,
-        "created_at": db_health_profile.created_at,
-        "updated_at": db_health_profile.updated_at,
-    }
-    
-    # Parse JSON fields
-    json_fields = ['dietary_restrictions', 'health_conditions', 'fitness_goals', 'allergies', 'medications']
-    for field in json_fields:
-        value = getattr(db_health_profile, field)
-        if value:
-            try:
-                response_data[field] = json.loads(value)
-            except json.JSONDecodeError:
-                response_data[field] = []
-        else:
-            response_data[field] = []
-    
-    return HealthProfileResponse(**response_data)
+    return HealthProfileResponse.model_validate(db_health_profile)
 
 @app.get("/users/{user_id}/health-profile", response_model=HealthProfileResponse)
-async def get_health_profile(user_id: int, db: Session = Depends(get_db)):
+@coalesced("health-profile")
+def get_health_profile(user_id: int, db: Session = Depends(get_db)):
     """Get user's health profile."""
     # Check if user exists
     user = get_user(db, user_id)
@@ -269,33 +346,7 @@ async def get_health_profile(user_id: int, db: Session = Depends(get_db)):
     if not db_health_profile:
         raise HTTPException(status_code=404, detail="Health profile not found")
     
-    # Convert JSON strings back to lists for response
-    import json
-    response_data = {
-        "id": db_health_profile.id,
-        "user_id": db_health_profile.user_id,
-        "age": db_health_profile.age,
-        "gender": db_health_profile.gender,
-        "height_cm": db_health_profile.height_cm,
-        "weight_kg": db_health_profile.weight_kg,
-        "activity_level": db_health_profile.activity_level,
-        "created_at": db_health_profile.created_at,
-        "updated_at": db_health_profile.updated_at,
-    }
-    
-    # Parse JSON fields
-    json_fields = ['dietary_restrictions', 'health_conditions', 'fitness_goals', 'allergies', 'medications']
-    for field in json_fields:
-        value = getattr(db_health_profile, field)
-        if value:
-            try:
-                response_data[field] = json.loads(value)
-            except json.JSONDecodeError:
-                response_data[field] = []
-        else:
-            response_data[field] = []
-    
-    return HealthProfileResponse(**response_data)
+    return HealthProfileResponse.model_validate(db_health_profile)
 
 @app.put("/users/{user_id}/health-profile", response_model=HealthProfileResponse)
 async def update_health_profile(user_id: int, health_profile: HealthProfileUpdate, db: Session = Depends(get_db)):
@@ -312,33 +363,7 @@ async def update_health_profile(user_id: int, health_profile: HealthProfileUpdat
     if not db_health_profile:
         raise HTTPException(status_code=404, detail="Health profile not found")
     
-    # Convert JSON strings back to lists for response
-    import json
-    response_data = {
-        "id": db_health_profile.id,
-        "user_id": db_health_profile.user_id,
-        "age": db_health_profile.age,
-        "gender": db_health_profile.gender,
-        "height_cm": db_health_profile.height_cm,
-        "weight_kg": db_health_profile.weight_kg,
-        "activity_level": db_health_profile.activity_level,
-        "created_at": db_health_profile.created_at,
-        "updated_at": db_health_profile.updated_at,
-    }
-    
-    # Parse JSON fields
-    json_fields = ['dietary_restrictions', 'health_conditions', 'fitness_goals', 'allergies', 'medications']
-    for field in json_fields:
-        value = getattr(db_health_profile, field)
-        if value:
-            try:
-                response_data[field] = json.loads(value)
-            except json.JSONDecodeError:
-                response_data[field] = []
-        else:
-            response_data[field] = []
-    
-    return HealthProfileResponse(**response_data)
+    return HealthProfileResponse.model_validate(db_health_profile)
 
 @app.delete("/users/{user_id}/health-profile")
 async def delete_health_profile(user_id: int, db: Session = Depends(get_db)):
@@ -421,7 +446,7 @@ async def delete_questionnaire(user_id: int, db: Session = Depends(get_db)):
 
 # Habit Target endpoints
 @app.post("/users/{user_id}/habit-targets", response_model=HabitTargetResponse)
-async def create_habit_target(user_id: int, habit_target: HabitTargetCreate, db: Session = Depends(get_db)):
+async def create_habit_target_endpoint(user_id: int, habit_target: HabitTargetCreate, db: Session = Depends(get_db)):
     """Create a new habit target for a user."""
     # Check if user exists
     user = get_user(db, user_id)
@@ -497,8 +522,15 @@ async def delete_habit_target_endpoint(user_id: int, habit_type: str, db: Sessio
 
 # Habit Log endpoints
 @app.post("/users/{user_id}/habit-logs", response_model=HabitLogResponse)
-async def create_habit_log(user_id: int, habit_log: HabitLogCreate, db: Session = Depends(get_db)):
+async def create_habit_log_endpoint(user_id: int, habit_log: HabitLogCreate, db: Session = Depends(get_db),
+                           idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
     """Create a new habit log for a user."""
+    return await idempotency_store.run(
+        f"/users/{user_id}/habit-logs", idempotency_key, jsonable_encoder(habit_log),
+        lambda: _create_habit_log_response(user_id, habit_log, db), db=db
+    )
+
+async def _create_habit_log_response(user_id: int, habit_log: HabitLogCreate, db: Session) -> dict:
     # Check if user exists
     user = get_user(db, user_id)
     if not user:
@@ -513,7 +545,7 @@ async def create_habit_log(user_id: int, habit_log: HabitLogCreate, db: Session
     habit_log_data = habit_log.dict()
     db_habit_log = create_habit_log(db, user_id, habit_log_data)
     
-    return db_habit_log
+    return jsonable_encoder(HabitLogResponse.model_validate(db_habit_log))
 
 @app.get("/users/{user_id}/habit-logs", response_model=List[HabitLogResponse])
 async def get_habit_logs_endpoint(user_id: int, habit_type: str = None, start_date: str = None, end_date: str = None, db: Session = Depends(get_db)):
@@ -540,8 +572,8 @@ async def get_habit_logs_endpoint(user_id: int, habit_type: str = None, start_da
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid end_date format. Use YYYY-MM-DD")
     
-    logs = get_habit_logs(db, user_id, habit_type, start_date_obj, end_date_obj)
-    return logs
+    # Rows are serialized directly; they match HabitLogResponse
+    return rows_response(get_habit_log_rows(db, user_id, habit_type, start_date_obj, end_date_obj))
 
 @app.get("/users/{user_id}/habit-logs/{log_date}/{habit_type}", response_model=HabitLogResponse)
 async def get_habit_log_endpoint(user_id: int, log_date: str, habit_type: str, db: Session = Depends(get_db)):
@@ -611,7 +643,8 @@ async def delete_habit_log_endpoint(user_id: int, log_date: str, habit_type: str
 
 # Progress endpoints
 @app.get("/users/{user_id}/progress/daily/{target_date}/{habit_type}", response_model=DailyProgressResponse)
-async def get_daily_progress(user_id: int, target_date: str, habit_type: str, db: Session = Depends(get_db)):
+@coalesced("progress")
+def get_daily_progress(user_id: int, target_date: str, habit_type: str, db: Session = Depends(get_db)):
     """Get daily progress for a specific habit."""
     # Check if user exists
     user = get_user(db, user_id)
@@ -633,7 +666,8 @@ async def get_daily_progress(user_id: int, target_date: str, habit_type: str, db
     return DailyProgressResponse(**progress)
 
 @app.get("/users/{user_id}/progress/weekly/{week_start}/{habit_type}", response_model=WeeklyProgressResponse)
-async def get_weekly_progress(user_id: int, week_start: str, habit_type: str, db: Session = Depends(get_db)):
+@coalesced("progress")
+def get_weekly_progress(user_id: int, week_start: str, habit_type: str, db: Session = Depends(get_db)):
     """Get weekly progress for a specific habit."""
     # Check if user exists
     user = get_user(db, user_id)
@@ -655,7 +689,8 @@ async def get_weekly_progress(user_id: int, week_start: str, habit_type: str, db
     return WeeklyProgressResponse(**progress)
 
 @app.get("/users/{user_id}/progress/monthly/{year}/{month}/{habit_type}", response_model=MonthlyProgressResponse)
-async def get_monthly_progress(user_id: int, year: int, month: int, habit_type: str, db: Session = Depends(get_db)):
+@coalesced("progress")
+def get_monthly_progress(user_id: int, year: int, month: int, habit_type: str, db: Session = Depends(get_db)):
     """Get monthly progress for a specific habit."""
     # Check if user exists
     user = get_user(db, user_id)
@@ -675,7 +710,8 @@ async def get_monthly_progress(user_id: int, year: int, month: int, habit_type:
 
 # Feedback endpoint
 @app.get("/users/{user_id}/feedback/{habit_type}", response_model=FeedbackResponse)
-async def get_feedback(user_id: int, habit_type: str, days: int = 7, db: Session = Depends(get_db)):
+@coalesced("feedback")
+def get_feedback(user_id: int, habit_type: str, days: int = 7, db: Session = Depends(get_db)):
     """Get feedback for a specific habit based on recent performance."""
     # Check if user exists
     user = get_user(db, user_id)
@@ -803,8 +839,15 @@ async def start_ai_profiling(user_id: int):
         return {"error": "Sorry, I encountered an error starting the profiling process."}
 
 @app.post("/ai-profiling-chat")
-async def ai_profiling_chat(request: dict):
+async def ai_profiling_chat(request: dict, http_request: Request, db: Session = Depends(get_db),
+                            idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
     """Handle AI profiling conversation"""
+    return await idempotency_store.run(
+        "/ai-profiling-chat", idempotency_key, request,
+        lambda: _ai_profiling_chat_response(request, http_request), db=db
+    )
+
+async def _ai_profiling_chat_response(request: dict, http_request: Request):
     try:
         user_id = request.get("user_id")
         message = request.get("message")
@@ -813,24 +856,37 @@ async def ai_profiling_chat(request: dict):
         if not user_id or not message or not session_data:
             raise HTTPException(status_code=400, detail="user_id, message, and session_data are required")
         
-        result = await ai_profiling_service.process_user_response(session_data, message)
+        result = await run_llm_call(
+            http_request,
+            ai_profiling_service.process_user_response(session_data, message),
+            endpoint="/ai-profiling-chat",
+            deadline=settings.AI_PROFILING_DEADLINE_SECONDS
+        )
         return result
         
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error in AI profiling chat: {e}")
-        return {"error": "Sorry, I encountered an error. Please try again."}
+        # Raised rather than returned so the idempotency layer doesn't store it and a retry can succeed
+        raise HTTPException(status_code=503, detail="Sorry, I encountered an error. Please try again.")
+
+@app.get("/foods/search", response_model=List[FoodSearchResult])
+async def search_foods(q: str = Query(..., min_length=1, max_length=100), limit: int = Query(10, ge=1, le=food_search.MAX_RESULTS)):
+    """Autocomplete foods by name or synonym, tolerating typos."""
+    # In-memory index, microseconds per query; results already match FoodSearchResult
+    return rows_response(food_search.search(q, limit))
 
 @app.post("/build-meal-plan/{user_id}")
-async def build_meal_plan(user_id: int, request: dict):
+async def build_meal_plan(user_id: int, request: dict, db: Session = Depends(get_db)):
     """Build personalized meal plan from completed profile"""
     try:
         profile_data = request.get("profile_data")
-        if not profile_data:
+        if not profile_data or not isinstance(profile_data, dict):
             raise HTTPException(status_code=400, detail="profile_data is required")
         
-        meal_plan = ai_profiling_service.build_meal_plan(profile_data)
+        # Local planner, a few milliseconds of CPU (less on a plan cache hit), so it runs inline
+        meal_plan = ai_profiling_service.build_meal_plan(profile_data, db)
         
         return {
             "meal_plan": meal_plan,
@@ -843,5 +899,35 @@ async def build_meal_plan(user_id: int, request: dict):
         logger.error(f"Error building meal plan: {e}")
         return {"error": "Sorry, I encountered an error building your meal plan."}
 
+@app.post("/users/{user_id}/meal-plan-jobs", status_code=202)
+async def enqueue_meal_plan_job(user_id: int, request: dict, db: Session = Depends(get_db)):
+    """Queue a meal plan build; poll /jobs/{job_id} or stream /jobs/{job_id}/events for the result"""
+    profile_data = request.get("profile_data")
+    if not profile_data or not isinstance(profile_data, dict):
+        raise HTTPException(status_code=400, detail="profile_data is required")
+    # One active job per user: resubmitting returns it (with the new profile if it hasn't started)
+    try:
+        job, deduplicated = job_queue.enqueue(db, "meal_plan", user_id, {"profile_data": profile_data})
+    except JobConflict as e:
+        raise HTTPException(status_code=409, detail=f"Meal plan job {e.job.id} is already running for this user; "
+                                                    "resubmit once it has finished")
+    return {**job_queue.describe(job), "deduplicated": deduplicated}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: int, db: Session = Depends(get_db)):
+    """Job status, progress and, once it has succeeded, its result"""
+    job = job_queue.get(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_queue.describe(job)
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: int, db: Session = Depends(get_db)):
+    """Server-sent progress events for a job, ending with a succeeded or failed event"""
+    if job_queue.get(db, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(job_queue.events(job_id), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import meal_planner
+import nutrient_db
+from config import settings
+from metrics import counter
+from models import MealPlanCacheEntry
+
+logger = logging.getLogger(__name__)
+
+# Bump when the plan format or planner scoring changes so stored plans are not reused
+PLAN_VERSION = 1
+
+meal_plan_cache_requests = counter(
+    "meal_plan_cache_requests_total",
+    "Meal plan lookups by result (memory/db hit, or miss)",
+    ["result"],
+)
+meal_plan_cache_seconds_saved = counter(
+    "meal_plan_cache_seconds_saved_total",
+    "Planner time avoided by serving cached meal plans",
+)
+
+@lru_cache(maxsize=1)
+def data_version() -> str:
+    """Fingerprint of the recipe and food data plans are built from."""
+    with open(meal_planner.RECIPES_FILE, "rb") as f:
+        recipes_sha = hashlib.sha256(f.read()).hexdigest()
+    return f"{recipes_sha}:{nutrient_db.load().header['source_sha256']}"
+
+def signature(canonical: Dict[str, Any]) -> str:
+    """Cache key for a canonical profile; changes whenever the bundled data or PLAN_VERSION does."""
+    payload = {"version": PLAN_VERSION, "data": data_version(), "profile": canonical}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+class MealPlanCache:
+    """
+    Meal plans keyed by canonical profile signature.
+
+    Profiles that canonicalize the same share one plan, built once for the
+    canonical profile. Plans live in an in-memory LRU, optionally backed by
+    the meal_plan_cache table so they survive restarts and are shared
+    between workers. Each caller gets the shared plan rescaled to their own
+    calorie target. Stored plans older than retention_days are pruned, which
+    also clears out plans from earlier data or PLAN_VERSION that no
+    signature can reach any more.
+    """
+
+    def __init__(self, max_entries: int, calorie_bucket: int, use_db: bool = False, retention_days: float = 30):
+        self.max_entries = max_entries
+        self.calorie_bucket = calorie_bucket
+        self.use_db = use_db
+        self.retention_days = retention_days
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+
+    def clear(self) -> None:
+        """Drop all plans held in memory."""
+        with self._lock:
+            self._entries.clear()
+
+    def _get_memory(self, key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _put_memory(self, key: str, plan: Dict[str, Any], build_seconds: float) -> None:
+        with self._lock:
+            self._entries[key] = (plan, build_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _get_db(self, db: Session, key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        entry = db.query(MealPlanCacheEntry).filter(MealPlanCacheEntry.signature == key).first()
+        if not entry:
+            return None
+        return json.loads(entry.plan), entry.build_seconds
+
+    def _put_db(self, db: Session, key: str, plan: Dict[str, Any], build_seconds: float) -> None:
+        # In a session of its own, so the caller's transaction is neither committed nor rolled back here
+        with Session(db.get_bind()) as writer:
+            try:
+                writer.add(MealPlanCacheEntry(signature=key, plan=json.dumps(plan), build_seconds=build_seconds))
+                writer.commit()
+            except IntegrityError:
+                # Another worker stored the same signature first; its plan is identical
+                writer.rollback()
+                logger.debug(f"Meal plan {key[:12]} was already stored")
+            if time.monotonic() - self._last_prune > 3600:
+                self._last_prune = time.monotonic()
+                self.prune(writer)
+
+    def prune(self, db: Session) -> int:
+        """Delete stored plans older than the retention period."""
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        deleted = db.query(MealPlanCacheEntry).filter(MealPlanCacheEntry.created_at < cutoff).delete(synchronize_session=False)
+        db.commit()
+        return deleted
+
+    def get_plan(self, profile: Dict[str, Any], db: Optional[Session] = None) -> Dict[str, Any]:
+        """The profile's meal plan, from the cache when a profile with the same signature was planned before."""
+        canonical = meal_planner.canonical_profile(profile, self.calorie_bucket)
+        key = signature(canonical)
+
+        stored = self._get_memory(key)
+        result = "memory"
+        if stored is None and self.use_db and db is not None:
+            stored = self._get_db(db, key)
+            result = "db"
+            if stored is not None:
+                self._put_memory(key, *stored)
+
+        if stored is None:
+            start = time.perf_counter()
+            plan = meal_planner.build_plan(canonical)
+            build_seconds = time.perf_counter() - start
+            self._put_memory(key, plan, build_seconds)
+            if self.use_db and db is not None:
+                self._put_db(db, key, plan, build_seconds)
+            meal_plan_cache_requests.inc(result="miss")
+        else:
+            plan, build_seconds = stored
+            meal_plan_cache_requests.inc(result=result)
+            meal_plan_cache_seconds_saved.inc(build_seconds)
+        return meal_planner.personalize(plan, profile)
+
+meal_plan_cache = MealPlanCache(
+    max_entries=settings.MEAL_PLAN_CACHE_MAX_ENTRIES,
+    calorie_bucket=settings.MEAL_PLAN_CALORIE_BUCKET,
+    use_db=settings.MEAL_PLAN_CACHE_DB_ENABLED,
+    retention_days=settings.MEAL_PLAN_CACHE_DB_RETENTION_DAYS,
+)
+
+def build_plan(profile: Dict[str, Any], db: Optional[Session] = None) -> Dict[str, Any]:
+    """Meal plan for a profile, through the cache unless MEAL_PLAN_CACHE_ENABLED is off."""
+    if not settings.MEAL_PLAN_CACHE_ENABLED:
+        return meal_planner.build_plan(profile)
+    return meal_plan_cache.get_plan(profile, db)
+
+def clear() -> None:
+    meal_plan_cache.clear()
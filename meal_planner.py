@@ -0,0 +1,357 @@
+import csv
+import json
+import logging
+import os
+import re
+import time
+import zlib
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+import nutrient_db
+from metrics import histogram
+from tracing import traced
+
+logger = logging.getLogger(__name__)
+
+RECIPES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "recipes.csv")
+
+meal_plan_build_duration = histogram(
+    "meal_plan_build_duration_seconds",
+    "Time to build a 7-day meal plan with the local planner",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+)
+
+DAYS = 7
+SLOTS = ("breakfast", "lunch", "snack", "dinner")
+# Relative size of each meal before meals_pattern adjusts it
+SLOT_WEIGHTS = {"breakfast": 1.0, "lunch": 1.3, "snack": 0.5, "dinner": 1.5}
+SIZE_WORDS = {"small": 0.7, "light": 0.7, "big": 1.4, "large": 1.4, "main": 1.4}
+
+# Share of calories from protein, carbs and fat
+MACRO_SPLITS = {
+    "fat_loss": (0.30, 0.35, 0.35),
+    "maintenance": (0.25, 0.45, 0.30),
+    "muscle_gain": (0.30, 0.45, 0.25),
+}
+DEFAULT_CALORIES = {"fat_loss": 1800, "maintenance": 2200, "muscle_gain": 2700}
+
+# Seafood meals allowed per week for each seafood_frequency
+SEAFOOD_PER_WEEK = {"none": 0, "weekly": 1, "2-3x_wk": 3, "daily": DAYS}
+
+# Free-text allergies/intolerances mapped to the nutrient database allergens they rule out
+ALLERGEN_PATTERNS = {
+    "dairy": r"\b(dairy|lactose|milk|cheese)\b",
+    "gluten": r"\b(gluten|wheat|coeliac|celiac)\b",
+    "egg": r"\beggs?\b",
+    "nuts": r"\b(tree ?nuts?|nuts?)\b",
+    "peanut": r"\bpeanuts?\b",
+    "soy": r"\bso(y|ya)\b",
+    "fish": r"\b(fish|seafood)\b",
+    "shellfish": r"\b(shellfish|prawns?|shrimp|crustaceans?|seafood)\b",
+    "sesame": r"\bsesame\b",
+}
+
+# Words around the food in an exclusion such as "no pork", "mushroom allergy" or "gluten-free"
+EXCLUSION_WORDS = re.compile(
+    r"-free\b|\b(no|non|free|without|avoids?|avoiding|allerg(y|ies|ic)|intoleran(ce|t)|sensitivity|to|of)\b"
+)
+
+# Serving sizes are rounded to quarters within these bounds
+MIN_SERVINGS, MAX_SERVINGS = 0.5, 2.5
+# Score weights: squared relative error of calories and each macro, bonus per matched preference,
+# and penalty per earlier use of a recipe in the week
+CALORIE_WEIGHT, MACRO_WEIGHTS = 2.0, np.array([1.5, 1.0, 1.0])
+PREFERENCE_BONUS = 0.3
+REPEAT_PENALTY = 0.6
+
+class RecipeTable:
+    """
+    The bundled recipe table as column arrays, one entry per recipe.
+
+    Ingredients are resolved against the nutrient database, and a recipe's
+    diet and allergen masks are combined from its foods', so exclusions
+    follow the food table rather than hand-kept tags.
+    """
+
+    def __init__(self, rows: List[Dict[str, str]], foods: nutrient_db.NutrientDB):
+        self.ids = np.array([int(row["id"]) for row in rows])
+        self.names = [row["name"] for row in rows]
+        self.slots = np.array([SLOTS.index(row["slot"]) for row in rows])
+        # Per serving: protein, carbs, fat in grams
+        self.macros = np.array([[float(row["protein_g"]), float(row["carbs_g"]), float(row["fat_g"])] for row in rows])
+        self.calories = self.macros @ np.array([4.0, 4.0, 9.0])
+        self.protein = np.array([row["protein"] for row in rows])
+        self.carb = np.array([row["carb"] for row in rows])
+        self.fat = np.array([row["fat"] for row in rows])
+        self.ingredients = [row["ingredients"].split(";") for row in rows]
+
+        self.foods = foods
+        self.food_names = [foods.name(food) for food in range(len(foods))]
+        # contains[recipe, food] is True when the food is one of the recipe's ingredients
+        self.contains = np.zeros((len(rows), len(foods)), dtype=bool)
+        for i, ingredients in enumerate(self.ingredients):
+            for ingredient in ingredients:
+                food = foods.find(ingredient)
+                if food is None:
+                    raise ValueError(f"Recipe {self.names[i]!r} uses {ingredient!r}, which is not in the nutrient database")
+                self.contains[i, food] = True
+        self.diet_mask = np.bitwise_and.reduce(np.where(self.contains, foods.diet_mask, nutrient_db.DIET_BITS["vegan"]), axis=1)
+        self.allergen_mask = np.bitwise_or.reduce(np.where(self.contains, foods.allergen_mask, 0), axis=1)
+        self.seafood = self.contains[:, foods.category_rows("seafood")].any(axis=1)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def fits_diet(self, diet: str) -> np.ndarray:
+        bits = nutrient_db.DIET_BITS[diet]
+        return (self.diet_mask & bits) == bits
+
+    def food_rows(self, term: str) -> np.ndarray:
+        """Foods a free-text term refers to: a category, or foods named or also known as it."""
+        category = term.replace(" ", "_")
+        if category in self.foods.categories:
+            return self.foods.category_rows(category)
+        pattern = re.compile(rf"\b{re.escape(_singular(term))}(e?s)?\b")
+        rows = [food for food, name in enumerate(self.food_names) if pattern.search(name)]
+        exact = self.foods.find(term)
+        if exact is not None:
+            rows.append(exact)
+        return np.array(sorted(set(rows)), dtype=int)
+
+    def containing(self, foods: np.ndarray) -> np.ndarray:
+        """Mask of recipes using any of the given foods."""
+        return self.contains[:, foods].any(axis=1) if len(foods) else np.zeros(len(self), dtype=bool)
+
+@lru_cache(maxsize=1)
+def recipes() -> RecipeTable:
+    with open(RECIPES_FILE, newline="") as f:
+        return RecipeTable(list(csv.DictReader(f)), nutrient_db.load())
+
+def _terms(value: Any) -> List[str]:
+    """Lower-cased terms from a list or a comma-separated string."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [str(term).strip().lower() for term in value if str(term).strip()]
+
+def _excluded_food(term: str) -> str:
+    """The food named in an exclusion term, e.g. "pork" from "no pork"."""
+    return " ".join(EXCLUSION_WORDS.sub(" ", term).split())
+
+def _singular(term: str) -> str:
+    return term[:-1] if len(term) > 3 and term.endswith("s") and not term.endswith("ss") else term
+
+def meal_slots(meals_pattern: Optional[str]) -> Dict[str, float]:
+    """Meals eaten each day and their relative sizes, from e.g. "small breakfast, big lunch, snack, dinner"."""
+    slots = {}
+    for part in re.split(r",|\band\b|\+|/", (meals_pattern or "").lower()):
+        for slot in SLOTS:
+            if re.search(rf"\b{slot}s?\b", part):
+                if re.search(r"\b(no|skip|skips|skipped|without)\b", part):
+                    slots[slot] = 0.0
+                else:
+                    size = next((factor for word, factor in SIZE_WORDS.items() if re.search(rf"\b{word}\b", part)), 1.0)
+                    slots[slot] = SLOT_WEIGHTS[slot] * size
+    if not any(slots.values()):
+        # Only skips (e.g. "no snacks"): the usual day without them
+        return {slot: weight for slot, weight in SLOT_WEIGHTS.items() if slot not in slots} or dict(SLOT_WEIGHTS)
+    if "dinner" not in slots and "lunch" not in slots:
+        # A pattern that only mentions breakfast or snacks still gets main meals
+        slots.update(lunch=SLOT_WEIGHTS["lunch"], dinner=SLOT_WEIGHTS["dinner"])
+    return {slot: slots[slot] for slot in SLOTS if slots.get(slot)}
+
+def targets(profile: Dict[str, Any]) -> Dict[str, float]:
+    """Daily calorie and macro targets in grams for a profile."""
+    goal = profile.get("goal") if profile.get("goal") in MACRO_SPLITS else "maintenance"
+    try:
+        calories = float(profile.get("target_calories") or DEFAULT_CALORIES[goal])
+    except (TypeError, ValueError):
+        calories = DEFAULT_CALORIES[goal]
+    calories = min(max(calories, 1200), 5000)
+    protein, carbs, fat = MACRO_SPLITS[goal]
+    return {"calories": round(calories), "protein_g": round(calories * protein / 4),
+            "carbs_g": round(calories * carbs / 4), "fat_g": round(calories * fat / 9)}
+
+def allowed_recipes(table: RecipeTable, profile: Dict[str, Any]) -> np.ndarray:
+    """Boolean mask of recipes compatible with the profile's diet style, exclusions and dislikes."""
+    diet_style = profile.get("diet_style")
+    allowed = np.ones(len(table), dtype=bool)
+    if diet_style in ("vegan", "vegetarian"):
+        allowed &= table.fits_diet(diet_style)
+    if profile.get("organ_meats") is not True:
+        allowed &= ~table.containing(table.foods.category_rows("organ_meats"))
+
+    excluded_allergens = {"fish", "shellfish"} if profile.get("seafood_frequency") == "none" else set()
+    for term in _terms(profile.get("constraints")) + _terms(profile.get("dislikes")):
+        matched = {allergen for allergen, pattern in ALLERGEN_PATTERNS.items() if re.search(pattern, term)}
+        excluded_allergens |= matched
+        if not matched:
+            food = _excluded_food(term)
+            rows = table.food_rows(food) if food else np.array([], dtype=int)
+            if not len(rows):
+                logger.warning(f"Exclusion {term!r} matches no food in the nutrient database and is ignored")
+            allowed &= ~table.containing(rows)
+    if excluded_allergens:
+        allowed &= (table.allergen_mask & table.foods.allergen_bits(excluded_allergens)) == 0
+    return allowed
+
+def preference_scores(table: RecipeTable, profile: Dict[str, Any]) -> np.ndarray:
+    """Number of the profile's stated preferences each recipe matches."""
+    scores = np.zeros(len(table))
+    for term in _terms(profile.get("protein_preferences")):
+        scores += (table.protein == term) | table.containing(table.food_rows(term))
+    scores += np.isin(table.carb, _terms(profile.get("carb_choices")))
+    scores += np.isin(table.fat, _terms(profile.get("fat_choices")))
+    veg = sum((table.containing(table.food_rows(term)) for term in _terms(profile.get("veg_likes"))), np.zeros(len(table)))
+    scores += np.minimum(veg, 2)
+    plant = table.fits_diet("vegan")
+    if profile.get("diet_style") == "plant_focused":
+        scores += plant
+    elif profile.get("diet_style") == "animal_focused":
+        scores += ~plant
+    return scores
+
+def canonical_profile(profile: Dict[str, Any], calorie_step: int = 100) -> Dict[str, Any]:
+    """
+    The parts of a profile the planner acts on, in one canonical form.
+
+    Calories are rounded to calorie_step, allergy wording collapses to the
+    allergens it rules out, and terms that match no recipe or food are
+    dropped, so profiles that would get the same plan (give or take portion
+    sizes) canonicalize identically.
+    """
+    table = recipes()
+
+    def matches_food(term: str) -> bool:
+        return len(table.food_rows(term)) > 0
+
+    exclusions = set()
+    for term in _terms(profile.get("constraints")) + _terms(profile.get("dislikes")):
+        matched = {allergen for allergen, pattern in ALLERGEN_PATTERNS.items() if re.search(pattern, term)}
+        food = _excluded_food(term)
+        exclusions |= matched or ({food} if food and matches_food(food) else set())
+    sizes = {size: word for word, size in SIZE_WORDS.items() if word in ("small", "big")}
+    # Rounded, since e.g. 1.5 * 1.4 / 1.5 is not exactly 1.4
+    meals = [f"{sizes.get(round(weight / SLOT_WEIGHTS[slot], 6), '')} {slot}".strip()
+             for slot, weight in meal_slots(profile.get("meals_pattern")).items()]
+    goal = profile.get("goal") if profile.get("goal") in MACRO_SPLITS else "maintenance"
+    return {
+        "goal": goal,
+        "target_calories": int(round(targets(profile)["calories"] / calorie_step) * calorie_step),
+        "diet_style": profile.get("diet_style") if profile.get("diet_style") in ("vegan", "vegetarian", "plant_focused", "animal_focused") else None,
+        "protein_preferences": sorted({term for term in _terms(profile.get("protein_preferences"))
+                                       if term in table.protein or matches_food(term)}),
+        "carb_choices": sorted(set(_terms(profile.get("carb_choices"))) & set(table.carb)),
+        "fat_choices": sorted(set(_terms(profile.get("fat_choices"))) & set(table.fat)),
+        "veg_likes": sorted({term for term in _terms(profile.get("veg_likes")) if matches_food(term)}),
+        "constraints": sorted(exclusions),
+        "dislikes": [],
+        "meals_pattern": ", ".join(meals),
+        "seafood_frequency": profile.get("seafood_frequency") if profile.get("seafood_frequency") in SEAFOOD_PER_WEEK else None,
+        "organ_meats": profile.get("organ_meats") is True,
+    }
+
+def personalize(plan: Dict[str, Any], profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Scale a plan built for another calorie target (e.g. a canonical profile's) to this profile's exact targets."""
+    daily = targets(profile)
+    factor = daily["calories"] / plan["targets"]["calories"]
+    if factor == 1:
+        return {**plan, "targets": daily}
+    days = []
+    for day in plan["days"]:
+        meals = [{**meal, "servings": round(meal["servings"] * factor, 2), "calories": round(meal["calories"] * factor),
+                  **{key: round(meal[key] * factor, 1) for key in ("protein_g", "carbs_g", "fat_g")}}
+                 for meal in day["meals"]]
+        days.append({**day, "meals": meals, "totals": day_totals(meals)})
+    return {**plan, "targets": daily, "days": days}
+
+def _seed(profile: Dict[str, Any]) -> int:
+    keys = ("goal", "target_calories", "diet_style", "carb_choices", "fat_choices", "protein_preferences",
+            "veg_likes", "constraints", "dislikes", "meals_pattern", "seafood_frequency", "organ_meats")
+    return zlib.crc32(json.dumps({key: profile.get(key) for key in keys}, sort_keys=True, default=str).encode())
+
+def day_totals(meals: List[Dict[str, Any]]) -> Dict[str, float]:
+    return {key: round(sum(meal[key] for meal in meals), 1) for key in ("calories", "protein_g", "carbs_g", "fat_g")}
+
+@traced("meal_planner.build_plan")
+def build_plan(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build a deterministic 7-day meal plan for a save_profile profile.
+
+    Each meal's candidates are scored in one vectorized pass: servings are
+    scaled (in quarters) to the meal's calorie share, then the squared
+    relative error against the calorie and macro targets is offset by the
+    preferences a recipe matches and penalized by how often it has already
+    been used that week. The same profile always gets the same plan.
+    """
+    start = time.perf_counter()
+    table = recipes()
+    daily = targets(profile)
+    slots = meal_slots(profile.get("meals_pattern"))
+    allowed = allowed_recipes(table, profile)
+    preferences = preference_scores(table, profile)
+    # Tiny per-profile noise so equally good recipes don't always resolve the same way
+    noise = np.random.default_rng(_seed(profile)).uniform(0, 0.05, len(table))
+    seafood = table.seafood
+    seafood_left = SEAFOOD_PER_WEEK.get(profile.get("seafood_frequency"), DAYS)
+
+    # Drop meals nothing can fill and share their calories among the rest
+    slots = {slot: weight for slot, weight in slots.items() if (allowed & (table.slots == SLOTS.index(slot))).any()}
+    total_weight = sum(slots.values())
+    daily_macros = np.array([daily["protein_g"], daily["carbs_g"], daily["fat_g"]], dtype=float)
+
+    # Per meal slot: candidates, their servings and their fit, which are the same every day
+    candidates = {}
+    for slot, weight in slots.items():
+        share = weight / total_weight
+        index = np.flatnonzero(allowed & (table.slots == SLOTS.index(slot)))
+        servings = np.clip(np.round(daily["calories"] * share / table.calories[index] * 4) / 4, MIN_SERVINGS, MAX_SERVINGS)
+        calorie_error = (table.calories[index] * servings / (daily["calories"] * share) - 1) ** 2
+        macro_error = ((table.macros[index] * servings[:, None] / (daily_macros * share) - 1) ** 2) @ MACRO_WEIGHTS
+        fit = CALORIE_WEIGHT * calorie_error + macro_error - PREFERENCE_BONUS * preferences[index] + noise[index]
+        candidates[slot] = (index, servings, fit)
+
+    uses = np.zeros(len(table))
+    days = []
+    for day in range(DAYS):
+        meals = []
+        for slot, (index, servings, fit) in candidates.items():
+            score = fit + REPEAT_PENALTY * uses[index]
+            if seafood_left <= 0:
+                score = np.where(seafood[index], np.inf, score)
+            if not np.isfinite(score).any():
+                continue
+            best = int(np.argmin(score))
+            recipe, portion = index[best], float(servings[best])
+            uses[recipe] += 1
+            seafood_left -= int(seafood[recipe])
+            protein, carbs, fat = table.macros[recipe] * portion
+            meals.append({
+                "slot": slot,
+                "recipe_id": int(table.ids[recipe]),
+                "name": table.names[recipe],
+                "servings": portion,
+                "calories": round(float(table.calories[recipe] * portion)),
+                "protein_g": round(float(protein), 1),
+                "carbs_g": round(float(carbs), 1),
+                "fat_g": round(float(fat), 1),
+                "ingredients": table.ingredients[recipe],
+            })
+        days.append({"day": day + 1, "meals": meals, "totals": day_totals(meals)})
+
+    plan = {
+        "generator": "local",
+        "targets": daily,
+        "meals_per_day": list(slots),
+        "days": days,
+        "excluded_recipes": int(len(table) - allowed.sum()),
+    }
+    unfilled = [slot for slot in meal_slots(profile.get("meals_pattern")) if slot not in slots]
+    if unfilled:
+        plan["unfilled_meals"] = unfilled
+    meal_plan_build_duration.observe(time.perf_counter() - start)
+    return plan
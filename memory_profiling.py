@@ -0,0 +1,124 @@
+import os
+import resource
+import threading
+import tracemalloc
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from config import settings
+from metrics import gauge
+
+# Frames from these files are bookkeeping, not application allocations
+_IGNORED = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def rss_bytes() -> int:
+    """Current resident set size of this process."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        # Peak rather than current RSS, in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def _per_worker(read):
+    return lambda: {(os.getpid(),): read()}
+
+gauge("process_resident_memory_bytes", "Resident memory of each worker process", ["pid"],
+      callback=_per_worker(rss_bytes))
+gauge("python_traced_memory_bytes", "Memory currently traced by tracemalloc in each worker (0 when not tracing)", ["pid"],
+      callback=_per_worker(lambda: tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0))
+
+_snapshots: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_lock = threading.Lock()
+
+def status() -> Dict[str, Any]:
+    current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+    return {
+        "pid": os.getpid(),
+        "tracing": tracemalloc.is_tracing(),
+        "traceback_frames": tracemalloc.get_traceback_limit(),
+        "traced_bytes": current,
+        "traced_peak_bytes": peak,
+        "rss_bytes": rss_bytes(),
+        "snapshots": list_snapshots(),
+    }
+
+def start(frames: int = 1) -> None:
+    """Start tracing allocations; more frames give deeper tracebacks at a higher cost."""
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+    tracemalloc.start(frames)
+
+def stop() -> None:
+    """Stop tracing and drop stored snapshots, which belong to the finished trace."""
+    tracemalloc.stop()
+    with _lock:
+        _snapshots.clear()
+
+def take_snapshot(name: str) -> Dict[str, Any]:
+    """Take and store a named snapshot, evicting the oldest beyond MEMORY_SNAPSHOT_LIMIT."""
+    if not tracemalloc.is_tracing():
+        raise RuntimeError("tracemalloc is not running")
+    snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+    entry = {
+        "snapshot": snapshot,
+        "taken_at": datetime.now(timezone.utc).isoformat(),
+        "traced_bytes": sum(stat.size for stat in snapshot.statistics("filename")),
+        "rss_bytes": rss_bytes(),
+    }
+    with _lock:
+        _snapshots.pop(name, None)
+        _snapshots[name] = entry
+        while len(_snapshots) > settings.MEMORY_SNAPSHOT_LIMIT:
+            _snapshots.popitem(last=False)
+    return _describe(name, entry)
+
+def _describe(name: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+    return {"name": name, **{key: value for key, value in entry.items() if key != "snapshot"}}
+
+def list_snapshots() -> List[Dict[str, Any]]:
+    with _lock:
+        return [_describe(name, entry) for name, entry in _snapshots.items()]
+
+def _get(name: str):
+    with _lock:
+        entry = _snapshots.get(name)
+    if entry is None:
+        raise KeyError(name)
+    return entry["snapshot"]
+
+def _location(stat: tracemalloc.StatisticDiff, group_by: str) -> Any:
+    if group_by == "filename":
+        return stat.traceback[0].filename
+    if group_by == "traceback":
+        return [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]
+    return f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}"
+
+def diff(base: str, target: Optional[str] = None, group_by: str = "lineno", top: int = 20) -> List[Dict[str, Any]]:
+    """
+    Largest allocation changes from snapshot `base` to `target`.
+
+    Without a target the comparison is against a fresh snapshot. group_by is
+    "lineno", "filename" or "traceback".
+    """
+    base_snapshot = _get(base)
+    target_snapshot = _get(target) if target else tracemalloc.take_snapshot().filter_traces(_IGNORED)
+    stats = target_snapshot.compare_to(base_snapshot, group_by)
+    return [
+        {
+            "location": _location(stat, group_by),
+            "size_diff_bytes": stat.size_diff,
+            "size_bytes": stat.size,
+            "count_diff": stat.count_diff,
+            "count": stat.count,
+        }
+        for stat in stats[:top]
+    ]
@@ -0,0 +1,312 @@
+import glob
+import json
+import logging
+import math
+import os
+import threading
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+class Counter:
+    """Monotonically increasing counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(label, "")) for label in self.labelnames)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        """Increment the counter for the given label values."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        """Get the current value for the given label values."""
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> Dict[Tuple[str, ...], float]:
+        """Get a copy of all label combinations and their values."""
+        with self._lock:
+            return dict(self._values)
+
+class Gauge(Counter):
+    """
+    Value that can go up and down.
+
+    A callback gauge reads its value when metrics are collected instead; the
+    callback returns a number, or a dict of label-value tuples to numbers.
+    multiprocess_mode says how values from several workers combine: "sum"
+    or "max".
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 callback: Optional[Callable[[], Any]] = None, multiprocess_mode: str = "sum"):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+        self.multiprocess_mode = multiprocess_mode
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self) -> Dict[Tuple[str, ...], float]:
+        if self.callback is None:
+            return super().samples()
+        try:
+            value = self.callback()
+        except Exception as e:
+            logger.debug(f"Gauge callback {self.name} failed: {e}")
+            return {}
+        if isinstance(value, dict):
+            return {tuple(str(part) for part in key): float(v) for key, v in value.items()}
+        return {(): float(value)}
+
+class Histogram:
+    """Cumulative histogram of observed values with optional labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last is +Inf), sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(label, "")) for label in self.labelnames)
+
+    def observe(self, value: float, **labels) -> None:
+        """Record one observation for the given label values."""
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def get(self, **labels) -> Dict[str, float]:
+        """Get the observation count and sum for the given label values."""
+        entry = self._values.get(self._key(labels))
+        return {"count": entry[2], "sum": entry[1]} if entry else {"count": 0, "sum": 0.0}
+
+    def samples(self) -> Dict[Tuple[str, ...], dict]:
+        with self._lock:
+            return {key: {"buckets": list(entry[0]), "sum": entry[1], "count": entry[2]} for key, entry in self._values.items()}
+
+# Process-wide registry of metrics by name
+_registry: Dict[str, Any] = {}
+_registry_lock = threading.Lock()
+
+def _get_or_create(name: str, factory: Callable[[], Any]):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = factory()
+            _registry[name] = metric
+        return metric
+
+def counter(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+    """Get or create a counter registered under the given name."""
+    return _get_or_create(name, lambda: Counter(name, documentation, labelnames))
+
+def gauge(name: str, documentation: str, labelnames: Iterable[str] = (),
+          callback: Optional[Callable[[], Any]] = None, multiprocess_mode: str = "sum") -> Gauge:
+    """Get or create a gauge registered under the given name."""
+    return _get_or_create(name, lambda: Gauge(name, documentation, labelnames, callback, multiprocess_mode))
+
+def histogram(name: str, documentation: str, labelnames: Iterable[str] = (),
+              buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+    """Get or create a histogram registered under the given name."""
+    return _get_or_create(name, lambda: Histogram(name, documentation, labelnames, buckets))
+
+# Collection and multiprocess merging
+def snapshot() -> Dict[str, dict]:
+    """Serializable copy of every registered metric in this process."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    families = {}
+    for metric in metrics:
+        families[metric.name] = {
+            "type": metric.kind,
+            "documentation": metric.documentation,
+            "labelnames": list(metric.labelnames),
+            "buckets": list(getattr(metric, "buckets", ())),
+            "mode": getattr(metric, "multiprocess_mode", "sum"),
+            "samples": [[list(key), value] for key, value in metric.samples().items()],
+        }
+    return families
+
+def _merge_value(kind: str, mode: str, current: Any, value: Any) -> Any:
+    if current is None:
+        return value
+    if kind == "histogram":
+        return {
+            "buckets": [a + b for a, b in zip(current["buckets"], value["buckets"])],
+            "sum": current["sum"] + value["sum"],
+            "count": current["count"] + value["count"],
+        }
+    if kind == "gauge" and mode == "max":
+        return max(current, value)
+    return current + value
+
+def merge(snapshots: Iterable[Dict[str, dict]]) -> Dict[str, dict]:
+    """Combine per-process snapshots: counters and histograms add up, gauges follow their mode."""
+    merged: Dict[str, dict] = {}
+    values: Dict[str, Dict[Tuple[str, ...], Any]] = {}
+    for families in snapshots:
+        for name, family in families.items():
+            if name not in merged:
+                merged[name] = {key: family[key] for key in ("type", "documentation", "labelnames", "buckets", "mode")}
+                values[name] = {}
+            for labels, value in family["samples"]:
+                key = tuple(labels)
+                values[name][key] = _merge_value(family["type"], family["mode"], values[name].get(key), value)
+    for name, family in merged.items():
+        family["samples"] = [[list(key), value] for key, value in values[name].items()]
+    return merged
+
+def _multiprocess_dir() -> Optional[str]:
+    return settings.METRICS_MULTIPROC_DIR or None
+
+def _write_json(path: str, data: dict) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def _read_json(path: str) -> Optional[dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def flush() -> None:
+    """Write this worker's snapshot to the multiprocess directory, if configured."""
+    directory = _multiprocess_dir()
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        _write_json(os.path.join(directory, f"worker_{os.getpid()}.json"), snapshot())
+
+def collect() -> Dict[str, dict]:
+    """All metrics to expose: this process alone, or merged across gunicorn workers."""
+    directory = _multiprocess_dir()
+    if not directory:
+        return snapshot()
+    flush()
+    snapshots = [_read_json(path) for path in sorted(glob.glob(os.path.join(directory, "*.json")))]
+    return merge(s for s in snapshots if s)
+
+def mark_process_dead(pid: int) -> None:
+    """
+    Fold an exited worker's counters and histograms into the archive file.
+
+    Called from gunicorn's child_exit hook in the master, so archive writes
+    never race. Gauges of dead workers are dropped.
+    """
+    directory = _multiprocess_dir()
+    if not directory:
+        return
+    path = os.path.join(directory, f"worker_{pid}.json")
+    worker = _read_json(path)
+    if worker is not None:
+        worker = {name: family for name, family in worker.items() if family["type"] != "gauge"}
+        archive_path = os.path.join(directory, "archive.json")
+        _write_json(archive_path, merge([_read_json(archive_path) or {}, worker]))
+    if os.path.exists(path):
+        os.remove(path)
+
+def reset_multiprocess_dir() -> None:
+    """Remove snapshots left by a previous run; call once in the gunicorn master before forking."""
+    directory = _multiprocess_dir()
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, "*.json")):
+            os.remove(path)
+
+class FlushThread(threading.Thread):
+    """Periodically flush this worker's snapshot so scrapes served by other workers see it."""
+
+    def __init__(self, interval: float):
+        super().__init__(name="metrics-flush", daemon=True)
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            try:
+                flush()
+            except OSError as e:
+                logger.warning(f"Metrics flush failed: {e}")
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        try:
+            flush()
+        except OSError:
+            pass
+
+# Prometheus text exposition
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+def generate_latest(families: Optional[Dict[str, dict]] = None) -> str:
+    """Render metrics in the Prometheus text format (version 0.0.4)."""
+    if families is None:
+        families = collect()
+    lines: List[str] = []
+    for name in sorted(families):
+        family = families[name]
+        labelnames = family["labelnames"]
+        lines.append(f"# HELP {name} {family['documentation']}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        for labels, value in sorted(family["samples"], key=lambda sample: sample[0]):
+            if family["type"] == "histogram":
+                cumulative = 0
+                for bound, count in zip(list(family["buckets"]) + [math.inf], value["buckets"]):
+                    cumulative += count
+                    le = f'le="{_format_number(bound)}"'
+                    lines.append(f"{name}_bucket{_format_labels(labelnames, labels, le)} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labelnames, labels)} {_format_number(value['sum'])}")
+                lines.append(f"{name}_count{_format_labels(labelnames, labels)} {value['count']}")
+            else:
+                lines.append(f"{name}{_format_labels(labelnames, labels)} {_format_number(value)}")
+    return "\n".join(lines) + "\n"
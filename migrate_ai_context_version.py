@@ -0,0 +1,36 @@
+"""Add the source_version column to ai_context_snapshots.
+
+The app runs this at startup (main.py); it can also be run by hand before
+deploying:
+
+    python migrate_ai_context_version.py
+
+Safe to re-run. Existing snapshots start at version 0; each profile,
+questionnaire or target write bumps it, and a rebuild only stores its
+content if the version is unchanged since it started rendering.
+"""
+from sqlalchemy import inspect, text
+
+from database import engine
+from models import Base
+
+def add_source_version(conn) -> bool:
+    """Add the column if it is missing; return whether it was added."""
+    columns = {column["name"] for column in inspect(conn).get_columns("ai_context_snapshots")}
+    if "source_version" in columns:
+        return False
+    conn.execute(text("ALTER TABLE ai_context_snapshots ADD COLUMN source_version INTEGER NOT NULL DEFAULT 0"))
+    return True
+
+def upgrade(engine) -> bool:
+    with engine.begin() as conn:
+        return add_source_version(conn)
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    if upgrade(engine):
+        print("Added ai_context_snapshots.source_version")
+    print("AI context version migration complete")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Migrate user_health_profiles list fields from JSON-encoded Text to native JSON columns.
+
+Run once per database after deploying the JSON column change:
+
+    python migrate_health_profile_json.py
+
+Safe to re-run. Single JSON values are wrapped in a list, and legacy plain
+text such as "peanuts, shellfish" is split on commas, semicolons and newlines
+into a list of its items, so no stored data is dropped.
+On PostgreSQL the columns are converted to JSONB and the GIN indexes are created;
+on SQLite the columns already hold JSON text, so only the values are normalized.
+"""
+import json
+import re
+
+from sqlalchemy import inspect, text
+
+from database import engine
+from models import Base, UserHealthProfile, HEALTH_PROFILE_LIST_FIELDS
+
+def _normalize(value):
+    """Return the JSON text for a stored value, or None for empty values."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, list):
+        return json.dumps(value)
+    try:
+        parsed = json.loads(value)
+    except (TypeError, ValueError):
+        # Legacy free text, e.g. "peanuts" or "peanuts, shellfish"
+        return json.dumps([item.strip() for item in re.split(r"[,;\n]", str(value)) if item.strip()])
+    return json.dumps(parsed if isinstance(parsed, list) else [parsed])
+
+def normalize_values(conn) -> int:
+    """Rewrite stored values so every non-null field is a JSON array; return rows changed."""
+    columns = ", ".join(HEALTH_PROFILE_LIST_FIELDS)
+    changed = 0
+    for row in conn.execute(text(f"SELECT id, {columns} FROM user_health_profiles")).mappings():
+        updates = {}
+        for field in HEALTH_PROFILE_LIST_FIELDS:
+            normalized = _normalize(row[field])
+            if normalized != row[field]:
+                updates[field] = normalized
+        if updates:
+            assignments = ", ".join(f"{field} = :{field}" for field in updates)
+            conn.execute(text(f"UPDATE user_health_profiles SET {assignments} WHERE id = :id"), {**updates, "id": row["id"]})
+            changed += 1
+    return changed
+
+def convert_postgres_columns(conn) -> None:
+    """Change Text columns to JSONB and create the GIN indexes."""
+    column_types = {column["name"]: str(column["type"]).upper() for column in inspect(conn).get_columns("user_health_profiles")}
+    for field in HEALTH_PROFILE_LIST_FIELDS:
+        if column_types.get(field) != "JSONB":
+            conn.execute(text(
+                f"ALTER TABLE user_health_profiles ALTER COLUMN {field} TYPE JSONB USING {field}::jsonb"
+            ))
+            print(f"Converted {field} to JSONB")
+    for index in UserHealthProfile.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            column_types = {c["name"]: str(c["type"]).upper() for c in inspect(conn).get_columns("user_health_profiles")}
+            if any(column_types.get(field) != "JSONB" for field in HEALTH_PROFILE_LIST_FIELDS):
+                print(f"Normalized {normalize_values(conn)} health profiles")
+            convert_postgres_columns(conn)
+        else:
+            print(f"Normalized {normalize_values(conn)} health profiles")
+    print("Health profile JSON migration complete")
+
+if __name__ == "__main__":
+    main()
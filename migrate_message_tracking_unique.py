@@ -0,0 +1,50 @@
+"""Add the unique (user_id, month_year) index to message_tracking.
+
+The app runs this at startup (main.py) since the message counter upsert
+needs the index; it can also be run by hand before deploying:
+
+    python migrate_message_tracking_unique.py
+
+Safe to re-run. Duplicate rows for the same user and month, left by concurrent
+first messages before the index existed, are merged into the oldest row with
+their counts summed, then the index is created.
+"""
+from sqlalchemy import inspect, text
+
+from database import engine
+from models import Base, MessageTracking
+
+def merge_duplicates(conn) -> int:
+    """Fold duplicate (user_id, month_year) rows into one; return rows removed."""
+    duplicates = conn.execute(text(
+        "SELECT user_id, month_year, MIN(id) AS keep_id, SUM(message_count) AS total "
+        "FROM message_tracking GROUP BY user_id, month_year HAVING COUNT(*) > 1"
+    )).mappings().all()
+    removed = 0
+    for row in duplicates:
+        conn.execute(text("UPDATE message_tracking SET message_count = :total WHERE id = :keep_id"),
+                     {"total": row["total"], "keep_id": row["keep_id"]})
+        removed += conn.execute(text(
+            "DELETE FROM message_tracking WHERE user_id = :user_id AND month_year = :month_year AND id <> :keep_id"
+        ), dict(row)).rowcount
+    return removed
+
+def upgrade(engine) -> int:
+    """Merge duplicates and create the index if it is missing; return duplicate rows removed."""
+    with engine.begin() as conn:
+        existing = {index["name"] for index in inspect(conn).get_indexes("message_tracking")}
+        missing = [index for index in MessageTracking.__table__.indexes if index.name not in existing]
+        if not missing:
+            return 0
+        removed = merge_duplicates(conn)
+        for index in missing:
+            index.create(conn, checkfirst=True)
+        return removed
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    print(f"Merged {upgrade(engine)} duplicate message counters")
+    print("Message tracking unique index migration complete")
+
+if __name__ == "__main__":
+    main()
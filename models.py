@@ -1,8 +1,15 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Float, Date
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Float, Date, JSON, Index, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from database import Base
 
+# JSON on SQLite, JSONB on PostgreSQL so list fields can be GIN-indexed
+JSONList = JSON().with_variant(JSONB(), "postgresql")
+
+# Health profile list fields, stored as JSON arrays of strings
+HEALTH_PROFILE_LIST_FIELDS = ['dietary_restrictions', 'health_conditions', 'fitness_goals', 'allergies', 'medications']
+
 class User(Base):
     __tablename__ = "users"
     
@@ -38,6 +45,11 @@ class MessageTracking(Base):
     # Relationship to user
     user = relationship("User", back_populates="message_tracking")
     
+    # One counter per user and month; increment_message_count upserts against it
+    __table_args__ = (
+        Index("uq_message_tracking_user_month", "user_id", "month_year", unique=True),
+    )
+    
     def __repr__(self):
         return f"<MessageTracking(user_id={self.user_id}, month_year='{self.month_year}', count={self.message_count})>"
 
@@ -51,17 +63,24 @@ class UserHealthProfile(Base):
     height_cm = Column(Integer, nullable=True)
     weight_kg = Column(Integer, nullable=True)
     activity_level = Column(String, nullable=True)  # "sedentary", "lightly_active", "moderately_active", "very_active", "extremely_active"
-    dietary_restrictions = Column(Text, nullable=True)  # JSON string of restrictions
-    health_conditions = Column(Text, nullable=True)  # JSON string of conditions
-    fitness_goals = Column(Text, nullable=True)  # JSON string of goals
-    allergies = Column(Text, nullable=True)  # JSON string of allergies
-    medications = Column(Text, nullable=True)  # JSON string of medications
+    dietary_restrictions = Column(JSONList, nullable=True)  # List of restrictions
+    health_conditions = Column(JSONList, nullable=True)  # List of conditions
+    fitness_goals = Column(JSONList, nullable=True)  # List of goals
+    allergies = Column(JSONList, nullable=True)  # List of allergies
+    medications = Column(JSONList, nullable=True)  # List of medications
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # Relationship to user
     user = relationship("User", back_populates="health_profile")
     
+    # GIN indexes for containment queries (e.g. allergies @> '["peanuts"]'), PostgreSQL only
+    __table_args__ = tuple(
+        Index(f"ix_user_health_profiles_{field}_gin", field, postgresql_using="gin",
+              postgresql_ops={field: "jsonb_path_ops"}).ddl_if(dialect="postgresql")
+        for field in ['dietary_restrictions', 'health_conditions', 'allergies']
+    )
+    
     def __repr__(self):
         return f"<UserHealthProfile(user_id={self.user_id}, age={self.age}, gender='{self.gender}')>"
 
@@ -126,3 +145,74 @@ class DailyHabitLog(Base):
     def __repr__(self):
         return f"<DailyHabitLog(user_id={self.user_id}, date={self.log_date}, habit='{self.habit_type}', value={self.logged_value})>"
 
+
+class IdempotencyRecord(Base):
+    __tablename__ = "idempotency_records"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String, unique=True, index=True, nullable=False)  # "<scope>:<Idempotency-Key header>"
+    fingerprint = Column(String, nullable=False)  # SHA-256 of the request payload
+    response_body = Column(Text, nullable=False)  # JSON-encoded response
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f"<IdempotencyRecord(key='{self.key}', expires_at={self.expires_at})>"
+
+class AIContextSnapshot(Base):
+    __tablename__ = "ai_context_snapshots"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, unique=True)
+    format_version = Column(Integer, nullable=False)  # Rendering format; older rows are rebuilt
+    content = Column(Text, nullable=False)  # Pre-rendered prompt fragment
+    source_version = Column(Integer, nullable=False, default=0, server_default="0")  # Bumped by each write to the user's profile
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    
+    def __repr__(self):
+        return f"<AIContextSnapshot(user_id={self.user_id}, format_version={self.format_version})>"
+
+class MealPlanCacheEntry(Base):
+    __tablename__ = "meal_plan_cache"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    signature = Column(String(64), unique=True, index=True, nullable=False)  # SHA-256 of the canonical profile
+    plan = Column(Text, nullable=False)  # JSON-encoded plan for the canonical profile
+    build_seconds = Column(Float, nullable=False)  # Time the planner took, credited on every hit
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    def __repr__(self):
+        return f"<MealPlanCacheEntry(signature='{self.signature[:12]}')>"
+
+class Job(Base):
+    __tablename__ = "jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(32), nullable=False)  # Handler name, e.g. "meal_plan"
+    user_id = Column(Integer, nullable=False, index=True)  # Active jobs are deduplicated per user and kind
+    status = Column(String(16), nullable=False, default="queued")  # queued, running, succeeded, failed
+    payload = Column(Text, nullable=False)  # JSON-encoded handler input
+    fingerprint = Column(String(64), nullable=False)  # SHA-256 of the payload
+    result = Column(Text, nullable=True)  # JSON-encoded handler output
+    error = Column(Text, nullable=True)  # Last failure, kept while a retry is pending
+    progress = Column(Integer, nullable=False, default=0)  # Percent, reported by the handler
+    progress_message = Column(String, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    available_at = Column(DateTime, nullable=False)  # Queued jobs wait until then (retry backoff)
+    locked_until = Column(DateTime, nullable=True)  # Lease of the running worker; claimable again once it passes
+    worker_id = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_jobs_status_available_at", "status", "available_at"),
+        # At most one active job per user and kind, enforced across workers
+        Index("uq_jobs_active_user_kind", "user_id", "kind", unique=True,
+              postgresql_where=text("status IN ('queued', 'running')"),
+              sqlite_where=text("status IN ('queued', 'running')")),
+    )
+    
+    def __repr__(self):
+        return f"<Job(id={self.id}, kind='{self.kind}', status='{self.status}')>"
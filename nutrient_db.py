@@ -0,0 +1,237 @@
+"""
+Bundled food composition table (data/foods.csv, nutrients per 100 g).
+
+The CSV is compiled into one binary file of column arrays (data/foods.bin),
+built at image build time with `python nutrient_db.py`, or on first load if
+it is missing or older than the CSV. The file is memory-mapped read-only, so
+with preload_app every gunicorn worker shares the same pages instead of
+holding its own copy. Rows are stored grouped by category, which makes a
+category a contiguous slice. Lookups by id use a sorted id index, and diet
+and allergen filters are bitmask tests over whole columns.
+"""
+import csv
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+SOURCE_FILE = os.path.join(DATA_DIR, "foods.csv")
+BINARY_FILE = os.path.join(DATA_DIR, "foods.bin")
+
+MAGIC = b"NUTRDB01"
+NUTRIENTS = ("kcal", "protein_g", "carbs_g", "fat_g", "fibre_g")
+# A food compatible with a diet is compatible with every looser one
+DIETS = ("pescatarian", "vegetarian", "vegan")
+DIET_BITS = {"omnivore": 0, "pescatarian": 0b001, "vegetarian": 0b011, "vegan": 0b111}
+ALLERGENS = ("gluten", "dairy", "egg", "nuts", "peanut", "soy", "fish", "shellfish", "sesame")
+
+def _mask(names: Iterable[str], universe) -> int:
+    mask = 0
+    for name in names:
+        if name not in universe:
+            raise ValueError(f"Unknown allergen {name!r}")
+        mask |= 1 << universe.index(name)
+    return mask
+
+def _strings(values: List[str]):
+    """UTF-8 blob and offsets (n + 1) for a list of strings."""
+    encoded = [value.encode() for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+    offsets[1:] = np.cumsum([len(value) for value in encoded])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+def compile_csv(source: str = SOURCE_FILE) -> bytes:
+    """Compile the foods CSV into the binary column format."""
+    with open(source, "rb") as f:
+        raw = f.read()
+    rows = list(csv.DictReader(raw.decode().splitlines()))
+    categories = sorted({row["category"] for row in rows})
+    rows.sort(key=lambda row: (categories.index(row["category"]), int(row["id"])))
+
+    ids = np.array([int(row["id"]) for row in rows], dtype=np.int32)
+    if len(np.unique(ids)) != len(ids):
+        raise ValueError(f"Duplicate food ids in {source}")
+    category_codes = np.array([categories.index(row["category"]) for row in rows], dtype=np.uint8)
+    names, name_offsets = _strings([row["name"].strip().lower() for row in rows])
+    synonyms, synonym_offsets = _strings([row["synonyms"].strip().lower() for row in rows])
+    columns = {
+        "id": ids,
+        "category": category_codes,
+        **{nutrient: np.array([float(row[nutrient]) for row in rows], dtype=np.float32) for nutrient in NUTRIENTS},
+        "diet_mask": np.array([DIET_BITS[row["diet"]] for row in rows], dtype=np.uint8),
+        "allergen_mask": np.array([_mask(filter(None, row["allergens"].split(";")), ALLERGENS) for row in rows],
+                                  dtype=np.uint16),
+        # Row numbers ordered by id, for binary search
+        "id_order": np.argsort(ids, kind="stable").astype(np.int32),
+        "category_offsets": np.searchsorted(category_codes, np.arange(len(categories) + 1)).astype(np.int32),
+        "name_offsets": name_offsets,
+        "names": names,
+        "synonym_offsets": synonym_offsets,
+        "synonyms": synonyms,
+    }
+
+    header = {"rows": len(rows), "source_sha256": hashlib.sha256(raw).hexdigest(),
+              "categories": categories, "allergens": list(ALLERGENS), "columns": {}}
+    # Column offsets are relative to the data section, which starts 8-byte aligned
+    offset, blobs = 0, []
+    for name, array in columns.items():
+        header["columns"][name] = {"dtype": array.dtype.str, "count": int(array.size), "offset": offset}
+        blob = array.tobytes()
+        blobs.append(blob + b"\0" * (-len(blob) % 8))
+        offset += len(blobs[-1])
+    encoded = json.dumps(header).encode()
+    encoded += b" " * (-(len(MAGIC) + 4 + len(encoded)) % 8)
+    return MAGIC + struct.pack("<I", len(encoded)) + encoded + b"".join(blobs)
+
+def build(source: str = SOURCE_FILE, target: str = BINARY_FILE) -> str:
+    """Compile the CSV and write the binary file atomically."""
+    data = compile_csv(source)
+    tmp = f"{target}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, target)
+    return target
+
+def _read_header(buffer) -> Dict[str, Any]:
+    if bytes(buffer[:len(MAGIC)]) != MAGIC:
+        raise ValueError("Not a nutrient database file")
+    (length,) = struct.unpack_from("<I", buffer, len(MAGIC))
+    start = len(MAGIC) + 4
+    header = json.loads(bytes(buffer[start:start + length]))
+    header["data_offset"] = start + length
+    return header
+
+class NutrientDB:
+    """Read-only view over the compiled column arrays."""
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        self.header = _read_header(buffer)
+        self.categories: List[str] = self.header["categories"]
+        base = self.header["data_offset"]
+        for name, spec in self.header["columns"].items():
+            array = np.frombuffer(buffer, dtype=np.dtype(spec["dtype"]), count=spec["count"], offset=base + spec["offset"])
+            setattr(self, name if name not in ("names", "synonyms") else f"_{name}", array)
+        self._sorted_ids = self.id[self.id_order]
+        self._by_name: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return self.header["rows"]
+
+    def row(self, food_id: int) -> Optional[int]:
+        """Row number of a food id, or None."""
+        i = int(np.searchsorted(self._sorted_ids, food_id))
+        if i < len(self) and self._sorted_ids[i] == food_id:
+            return int(self.id_order[i])
+        return None
+
+    def _string(self, blob, offsets, row: int) -> str:
+        return bytes(blob[offsets[row]:offsets[row + 1]]).decode()
+
+    def name(self, row: int) -> str:
+        return self._string(self._names, self.name_offsets, row)
+
+    def synonyms(self, row: int) -> List[str]:
+        value = self._string(self._synonyms, self.synonym_offsets, row)
+        return value.split(";") if value else []
+
+    def category_rows(self, category: str) -> np.ndarray:
+        """Rows of one category (a contiguous range), empty for an unknown category."""
+        if category not in self.categories:
+            return np.arange(0)
+        code = self.categories.index(category)
+        return np.arange(self.category_offsets[code], self.category_offsets[code + 1])
+
+    def find(self, name: str) -> Optional[int]:
+        """Row of a food by exact name or synonym (case-insensitive), or None."""
+        if self._by_name is None:
+            by_name = {}
+            # Names win over synonyms, and earlier ids over later ones for shared synonyms
+            for row in self.id_order:
+                for synonym in self.synonyms(int(row)):
+                    by_name.setdefault(synonym, int(row))
+            by_name.update({self.name(row): row for row in range(len(self))})
+            self._by_name = by_name
+        return self._by_name.get(name.strip().lower())
+
+    def allergen_bits(self, allergens: Iterable[str]) -> int:
+        """Bitmask of allergen names, as stored in the allergen_mask column."""
+        return _mask(allergens, tuple(self.header["allergens"]))
+
+    def select(self, diet: Optional[str] = None, exclude_allergens: Iterable[str] = (),
+               category: Optional[str] = None) -> np.ndarray:
+        """Rows compatible with a diet, free of the given allergens and optionally in one category."""
+        allowed = np.ones(len(self), dtype=bool)
+        if diet and diet != "omnivore":
+            allowed &= (self.diet_mask & DIET_BITS[diet]) == DIET_BITS[diet]
+        excluded = self.allergen_bits(exclude_allergens)
+        if excluded:
+            allowed &= (self.allergen_mask & excluded) == 0
+        if category is not None:
+            in_category = np.zeros(len(self), dtype=bool)
+            in_category[self.category_rows(category)] = True
+            allowed &= in_category
+        return np.flatnonzero(allowed)
+
+    def food(self, row: int) -> Dict[str, Any]:
+        """One food as a dict."""
+        return {
+            "id": int(self.id[row]),
+            "name": self.name(row),
+            "category": self.categories[self.category[row]],
+            **{nutrient: round(float(getattr(self, nutrient)[row]), 1) for nutrient in NUTRIENTS},
+            "diets": [diet for i, diet in enumerate(DIETS) if self.diet_mask[row] & (1 << i)],
+            "allergens": [name for i, name in enumerate(self.header["allergens"]) if self.allergen_mask[row] & (1 << i)],
+            "synonyms": self.synonyms(row),
+        }
+
+    def get(self, food_id: int) -> Optional[Dict[str, Any]]:
+        row = self.row(food_id)
+        return None if row is None else self.food(row)
+
+def open_file(path: str) -> NutrientDB:
+    with open(path, "rb") as f:
+        return NutrientDB(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+def _is_current(path: str, source: str) -> bool:
+    if not os.path.exists(path):
+        return False
+    try:
+        with open(path, "rb") as f:
+            header = _read_header(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        with open(source, "rb") as f:
+            return header["source_sha256"] == hashlib.sha256(f.read()).hexdigest()
+    except (ValueError, OSError):
+        return False
+
+@lru_cache(maxsize=1)
+def load(path: str = BINARY_FILE, source: str = SOURCE_FILE) -> NutrientDB:
+    """
+    The nutrient database, memory-mapped from `path`.
+
+    The file is (re)built from `source` when missing or stale; if it cannot
+    be written the compiled bytes are used from memory instead.
+    """
+    if not _is_current(path, source):
+        try:
+            build(source, path)
+            logger.info(f"Built nutrient database {path}")
+        except OSError as e:
+            logger.warning(f"Could not write {path} ({e}); keeping the nutrient database in memory")
+            return NutrientDB(compile_csv(source))
+    return open_file(path)
+
+if __name__ == "__main__":
+    target = build(*sys.argv[1:3]) if len(sys.argv) > 1 else build()
+    db = open_file(target)
+    print(f"Wrote {len(db)} foods in {len(db.categories)} categories to {target} ({os.path.getsize(target)} bytes)")
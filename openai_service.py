@@ -5,9 +5,33 @@ from openai import AsyncOpenAI
 from config import settings
 from typing import List, Dict, Any, Optional
 import json
+import time
+from metrics import counter, histogram
+from tracing import current_span, traced
 
 logger = logging.getLogger(__name__)
 
+openai_request_duration = histogram(
+    "openai_request_duration_seconds",
+    "OpenAI chat completion latency by operation and outcome",
+    ["operation", "outcome"],
+    buckets=(0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0),
+)
+openai_tokens = counter(
+    "openai_tokens_total",
+    "OpenAI tokens used by operation and kind (prompt/completion)",
+    ["operation", "kind"],
+)
+
+def _record_usage(operation: str, response: Any) -> None:
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        openai_tokens.inc(usage.prompt_tokens or 0, operation=operation, kind="prompt")
+        openai_tokens.inc(usage.completion_tokens or 0, operation=operation, kind="completion")
+        span = current_span()
+        span.set_attribute("gen_ai.usage.input_tokens", usage.prompt_tokens)
+        span.set_attribute("gen_ai.usage.output_tokens", usage.completion_tokens)
+
 # Super Prompt - Complete AI-driven profiling
 SYSTEM_MSG = """You are a health, nutrition, and psychology expert coach inside a diet optimization app. Your role is to guide the user through a friendly, conversational intake process to build their personal health profile.
 
@@ -140,6 +164,9 @@ TOOLS = [
     }
 ]
 
+class UpstreamError(Exception):
+    """The OpenAI API call failed, after the client's own retries."""
+
 class OpenAIService:
     def __init__(self):
         self.api_key = settings.OPENAI_API_KEY
@@ -148,17 +175,21 @@ class OpenAIService:
             self.client = None
         else:
             try:
-                self.client = AsyncOpenAI(api_key=self.api_key)
+                self.client = AsyncOpenAI(api_key=self.api_key, base_url=settings.OPENAI_BASE_URL or None,
+                                          timeout=settings.OPENAI_TIMEOUT_SECONDS)
                 logger.info("OpenAI client initialized successfully")
             except Exception as e:
                 logger.warning(f"OpenAI client initialization failed: {e} - using fallback responses")
                 self.client = None
 
+    @traced("openai.respond", kind="client")
     async def respond(self, messages: List[Dict[str, str]], tools: Optional[List[Dict]] = None, response_format: Optional[Dict] = None, stream: bool = False) -> Any:
         """Main method for OpenAI API calls with tool calling support"""
         if not self.client:
             return self._get_fallback_response()
         
+        start = time.perf_counter()
+        outcome = "error"
         try:
             params = {
                 "model": "gpt-4o-mini",  # Using latest model
@@ -172,6 +203,7 @@ class OpenAIService:
                 params["response_format"] = response_format
             if stream:
                 params["stream"] = True
+                params["stream_options"] = {"include_usage": True}
 
             if stream:
                 # Handle streaming responses
@@ -179,29 +211,47 @@ class OpenAIService:
                 chunks = []
                 async for event in stream:
                     if event.choices:
-                        delta = event.choices[0].delta.get("content", "")
+                        delta = event.choices[0].delta.content
                         if delta:
                             chunks.append(delta)
+                    if event.usage:
+                        # Sent as a final chunk without choices
+                        _record_usage("respond", event)
+                outcome = "ok"
                 return "".join(chunks)
             else:
                 response = await self.client.chat.completions.create(**params)
+                _record_usage("respond", response)
+                outcome = "ok"
                 return response
                 
         except Exception as e:
             logger.error(f"OpenAI API error: {e}")
-            return self._get_fallback_response()
+            # Raised, not answered with an apology, so callers don't store, bill or replay a failure as a reply
+            raise UpstreamError(str(e)) from e
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        finally:
+            openai_request_duration.observe(time.perf_counter() - start, operation="respond", outcome=outcome)
 
-    async def chat_completion(self, message: str, conversation_history: List = None, health_profile: dict = None) -> str:
-        """Legacy method for backward compatibility"""
+    @traced("openai.chat_completion", kind="client")
+    async def chat_completion(self, message: str, conversation_history: List = None, health_profile: dict = None,
+                              profile_context: str = None) -> str:
+        """Legacy method for backward compatibility; prefer a pre-rendered profile_context over health_profile"""
         if not self.client:
             return "I'm currently in demo mode. Please configure your OpenAI API key to enable AI responses."
         
+        start = time.perf_counter()
+        outcome = "error"
         try:
             messages = []
             
             # Add system message
             system_message = "You are a helpful nutrition and health AI assistant. Provide personalized advice based on the user's health profile and conversation history."
-            if health_profile:
+            if profile_context:
+                system_message += f"\n\nUser's health profile:\n{profile_context}"
+            elif health_profile:
                 system_message += f"\n\nUser's health profile: {health_profile}"
             
             messages.append({"role": "system", "content": system_message})
@@ -221,12 +271,19 @@ class OpenAIService:
                 max_tokens=500,
                 temperature=0.7
             )
+            _record_usage("chat_completion", response)
+            outcome = "ok"
             
             return response.choices[0].message.content
             
         except Exception as e:
             logger.error(f"OpenAI API error: {e}")
-            return "I'm sorry, I encountered an error processing your request. Please try again."
+            raise UpstreamError(str(e)) from e
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        finally:
+            openai_request_duration.observe(time.perf_counter() - start, operation="chat_completion", outcome=outcome)
 
     def _get_fallback_response(self) -> str:
         """Fallback response when API is not available"""
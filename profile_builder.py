@@ -1,6 +1,7 @@
 from typing import Dict, List, Optional
 import re
 from datetime import datetime
+from tracing import traced
 
 class UserProfileBuilder:
     def __init__(self):
@@ -69,6 +70,7 @@ class UserProfileBuilder:
             "feedback_frequency": None,  # daily/weekly/monthly
         }
     
+    @traced("profile_builder.build_profile")
     def build_profile(self, onboarding_responses: Dict) -> Dict:
         """Build comprehensive user profile from onboarding responses"""
         profile = self.profile_template.copy()
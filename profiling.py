@@ -0,0 +1,197 @@
+import cProfile
+import glob
+import hashlib
+import hmac
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from config import settings
+from metrics import counter
+
+try:
+    import pyinstrument
+except ImportError:  # optional dependency; cProfile is used without it
+    pyinstrument = None
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile-request"
+
+profiled_requests = counter(
+    "profiled_requests_total",
+    "Requests considered for on-demand profiling by outcome",
+    ["outcome"],
+)
+
+def sign(method: str, path: str, timestamp: Optional[int] = None, secret: Optional[str] = None) -> str:
+    """Build an X-Profile-Request header value for a request, valid for PROFILING_SIGNATURE_MAX_AGE_SECONDS."""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    secret = settings.PROFILING_SECRET if secret is None else secret
+    digest = hmac.new(secret.encode(), f"{timestamp}:{method.upper()}:{path}".encode(), hashlib.sha256).hexdigest()
+    return f"{timestamp}:{digest}"
+
+def verify(header_value: str, method: str, path: str) -> bool:
+    """Check an X-Profile-Request signature and its age."""
+    if not settings.PROFILING_SECRET:
+        return False
+    timestamp, _, _ = header_value.partition(":")
+    if not timestamp.isdigit() or abs(time.time() - int(timestamp)) > settings.PROFILING_SIGNATURE_MAX_AGE_SECONDS:
+        return False
+    return hmac.compare_digest(header_value, sign(method, path, int(timestamp)))
+
+class ProfilerState:
+    """Admin arming, rate limiting and the one-profile-at-a-time guard for a worker."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._armed_prefix: Optional[str] = None
+        self._armed_remaining = 0
+        self._recent: deque = deque()
+        self._active = False
+
+    def arm(self, path_prefix: str, count: int) -> None:
+        with self._lock:
+            self._armed_prefix = path_prefix
+            self._armed_remaining = count
+
+    def disarm(self) -> None:
+        self.arm("", 0)
+
+    def armed(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"path_prefix": self._armed_prefix, "remaining": self._armed_remaining}
+
+    def _armed_for(self, path: str) -> bool:
+        return self._armed_remaining > 0 and path.startswith(self._armed_prefix or "")
+
+    def is_armed(self, path: str) -> bool:
+        """Whether an armed profile is waiting for this path."""
+        with self._lock:
+            return self._armed_for(path)
+
+    def acquire(self, armed_path: Optional[str] = None) -> Optional[str]:
+        """
+        Reserve the profiler, or return why the request can't be profiled.
+
+        For an armed request pass its path: one armed profile is used up only
+        once the profiler is reserved, so a refused request leaves it armed.
+        """
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and now - self._recent[0] > 60:
+                self._recent.popleft()
+            if len(self._recent) >= settings.PROFILING_RATE_LIMIT_PER_MINUTE:
+                return "rate_limited"
+            if self._active:
+                return "busy"
+            if armed_path is not None:
+                if not self._armed_for(armed_path):
+                    return "disarmed"
+                self._armed_remaining -= 1
+            self._recent.append(now)
+            self._active = True
+            return None
+
+    def release(self) -> None:
+        with self._lock:
+            self._active = False
+
+state = ProfilerState()
+
+def _slug(path: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "-", path).strip("-")[:60] or "root"
+
+def _prune(directory: str) -> None:
+    paths = sorted(glob.glob(os.path.join(directory, "*")), key=os.path.getmtime)
+    for path in paths[:max(0, len(paths) - settings.PROFILING_MAX_FILES)]:
+        os.remove(path)
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Stored profiles, newest first."""
+    paths = sorted(glob.glob(os.path.join(settings.PROFILING_DIR, "*")), key=os.path.getmtime, reverse=True)
+    return [{"name": os.path.basename(path), "bytes": os.path.getsize(path), "created": os.path.getmtime(path)} for path in paths]
+
+def profile_path(name: str) -> Optional[str]:
+    """Path of a stored profile by name, refusing anything outside the profile directory."""
+    if os.path.basename(name) != name:
+        return None
+    path = os.path.join(settings.PROFILING_DIR, name)
+    return path if os.path.isfile(path) else None
+
+class ProfilingMiddleware:
+    """
+    Profile individual requests on demand.
+
+    A request is profiled when it carries a valid signed X-Profile-Request
+    header, or when an admin has armed profiling for its path. With
+    pyinstrument installed the output is an HTML flame view. Otherwise it is
+    a cProfile .pstats file, which sees only this thread: sync endpoints run
+    in the threadpool, and concurrent requests on the loop are mixed in.
+    Only added to the app when PROFILING_ENABLED is set, so it costs nothing
+    otherwise.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _requested(self, scope) -> Optional[str]:
+        """How the request asked to be profiled: "signed", "armed", or None."""
+        for name, value in scope.get("headers", []):
+            if name == PROFILE_HEADER:
+                if verify(value.decode("latin-1"), scope["method"], scope["path"]):
+                    return "signed"
+                profiled_requests.inc(outcome="bad_signature")
+                return None
+        return "armed" if state.is_armed(scope["path"]) else None
+
+    async def __call__(self, scope, receive, send):
+        requested = self._requested(scope) if scope["type"] == "http" else None
+        if requested is None:
+            await self.app(scope, receive, send)
+            return
+
+        refusal = state.acquire(scope["path"] if requested == "armed" else None)
+        if refusal:
+            profiled_requests.inc(outcome=refusal)
+            await self.app(scope, receive, send)
+            return
+
+        os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+        base = f"{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() // 1000 % 1000000:06d}-{os.getpid()}-{scope['method']}-{_slug(scope['path'])}"
+        name = base + (".html" if pyinstrument else ".pstats")
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"x-profile-id", name.encode())]}
+            await send(message)
+
+        try:
+            if pyinstrument:
+                profiler = pyinstrument.Profiler(async_mode="enabled")
+                profiler.start()
+            else:
+                profiler = cProfile.Profile()
+                profiler.enable()
+            try:
+                await self.app(scope, receive, send_with_profile_id)
+            finally:
+                if pyinstrument:
+                    profiler.stop()
+                else:
+                    profiler.disable()
+            path = os.path.join(settings.PROFILING_DIR, name)
+            if pyinstrument:
+                with open(path, "w") as f:
+                    f.write(profiler.output_html())
+            else:
+                profiler.dump_stats(path)
+            _prune(settings.PROFILING_DIR)
+            profiled_requests.inc(outcome="profiled")
+            logger.info(f"Profiled {scope['method']} {scope['path']} -> {path}")
+        finally:
+            state.release()
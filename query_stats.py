@@ -0,0 +1,141 @@
+import logging
+import re
+import time
+from collections import Counter as ShapeCounter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import settings
+from metrics import counter
+
+logger = logging.getLogger(__name__)
+
+n_plus_one_requests = counter(
+    "db_n_plus_one_requests_total",
+    "Requests that repeated one statement shape more than N_PLUS_ONE_THRESHOLD times, by route",
+    ["route"],
+)
+
+_WHITESPACE = re.compile(r"\s+")
+# Runs of bind placeholders, e.g. IN (?, ?, ?) or VALUES (%(a)s, %(b)s)
+_PLACEHOLDER_LIST = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s|%s|:\w+)\s*,)*\s*(?:\?|%\(\w+\)s|%s|:\w+)\s*\)")
+
+def statement_shape(statement: str) -> str:
+    """Normalize a SQL statement so executions that differ only in parameters compare equal."""
+    return _PLACEHOLDER_LIST.sub("(...)", _WHITESPACE.sub(" ", statement).strip())
+
+class QueryStats:
+    """SQL statements executed during one request (or one tracked block)."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes: ShapeCounter = ShapeCounter()
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.duration += duration
+        self.shapes[statement_shape(statement)] += 1
+
+    @property
+    def duration_ms(self) -> float:
+        return self.duration * 1000
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Statement shapes executed more than `threshold` times, most frequent first."""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n > threshold]
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+def current_stats() -> Optional[QueryStats]:
+    """Stats for the request being handled, if any."""
+    return _current.get()
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None and context is not None:
+        context._query_stats_start = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    start = getattr(context, "_query_stats_start", None)
+    if stats is not None and start is not None:
+        stats.record(statement, time.perf_counter() - start)
+
+@contextmanager
+def track_queries(engine: Optional[Engine] = None) -> Iterator[QueryStats]:
+    """
+    Collect query stats for the enclosed block.
+
+    Statements are attributed through a context variable, so only work done
+    in this context (including threadpool calls made from it) is counted.
+    Pass an engine to instead count every statement it executes from any
+    thread, e.g. around TestClient calls in tests.
+    """
+    stats = QueryStats()
+    if engine is None:
+        token = _current.set(stats)
+        try:
+            yield stats
+        finally:
+            _current.reset(token)
+        return
+
+    starts = {}
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        starts[id(cursor)] = time.perf_counter()
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        stats.record(statement, time.perf_counter() - starts.pop(id(cursor), time.perf_counter()))
+
+    event.listen(engine, "before_cursor_execute", before)
+    event.listen(engine, "after_cursor_execute", after)
+    try:
+        yield stats
+    finally:
+        event.remove(engine, "before_cursor_execute", before)
+        event.remove(engine, "after_cursor_execute", after)
+
+class QueryStatsMiddleware:
+    """
+    Count SQL statements and database time per HTTP request.
+
+    Adds X-DB-Query-Count and X-DB-Time-Ms response headers and logs a
+    warning when one statement shape repeats more than the N+1 threshold.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.QUERY_STATS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current.set(stats)
+
+        async def send_with_stats(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-query-count", str(stats.count).encode()))
+                headers.append((b"x-db-time-ms", f"{stats.duration_ms:.1f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            _current.reset(token)
+            repeated = stats.repeated(settings.N_PLUS_ONE_THRESHOLD)
+            if repeated:
+                route = getattr(scope.get("route"), "path", scope["path"])
+                n_plus_one_requests.inc(route=route)
+                shape, times = repeated[0]
+                logger.warning(f"Possible N+1 on {scope['method']} {route}: {times}x {shape[:200]}")
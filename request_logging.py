@@ -0,0 +1,121 @@
+import logging
+import queue
+import random
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Iterable, Optional
+
+import orjson
+
+from config import settings
+from metrics import counter
+from query_stats import current_stats
+
+access_logger = logging.getLogger("access")
+access_logger.propagate = False
+access_logger.setLevel(logging.INFO)
+
+dropped_records = counter(
+    "access_log_dropped_total",
+    "Access log records dropped because the log queue was full",
+)
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line from the record's `fields` dict."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = getattr(record, "fields", None) or {"message": record.getMessage()}
+        return orjson.dumps({"ts": round(record.created, 3), **fields}).decode()
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hand records to the listener thread untouched.
+
+    The stock QueueHandler formats the message on the calling thread; access
+    records carry their data in `fields` and are formatted by the listener.
+    When the queue is full the record is dropped rather than blocking.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped_records.inc()
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+
+def start(handlers: Optional[Iterable[logging.Handler]] = None) -> None:
+    """Start the background listener that writes access records; call at application startup."""
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+    if handlers is None:
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(JSONFormatter())
+        handlers = [stream_handler]
+    log_queue = queue.Queue(maxsize=settings.ACCESS_LOG_QUEUE_SIZE)
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    access_logger.addHandler(_queue_handler)
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+def stop() -> None:
+    """Flush queued records and stop the listener; call at application shutdown."""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    access_logger.removeHandler(_queue_handler)
+    _listener.stop()
+    _listener = None
+    _queue_handler = None
+
+def should_log(status: int, duration_ms: float) -> bool:
+    """Always log errors and slow requests; sample successful ones."""
+    if status >= 300 or duration_ms >= settings.ACCESS_LOG_SLOW_MS:
+        return True
+    rate = settings.ACCESS_LOG_SAMPLE_RATE
+    return rate >= 1 or random.random() < rate
+
+class RequestLoggingMiddleware:
+    """Time each request and emit a structured access record through the log queue."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _listener is None:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            if should_log(status, duration_ms):
+                route = scope.get("route")
+                fields = {
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route": getattr(route, "path", None),
+                    "status": status,
+                    "duration_ms": round(duration_ms, 2),
+                }
+                stats = current_stats()
+                if stats is not None:
+                    fields["db_queries"] = stats.count
+                    fields["db_ms"] = round(stats.duration_ms, 2)
+                access_logger.info("request", extra={"fields": fields})
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, field_validator
 from typing import Optional, List
 from datetime import datetime, date
 
@@ -100,6 +100,11 @@ class HealthProfileResponse(BaseModel):
     created_at: datetime
     updated_at: Optional[datetime] = None
     
+    @field_validator('dietary_restrictions', 'health_conditions', 'fitness_goals', 'allergies', 'medications', mode='before')
+    @classmethod
+    def empty_list_for_null(cls, value):
+        return [] if value is None else value
+    
     class Config:
         from_attributes = True
 
@@ -232,3 +237,15 @@ class FeedbackResponse(BaseModel):
     encouragement: str
     completion_percentage: float
     streak_days: int
+
+class FoodSearchResult(BaseModel):
+    id: int
+    name: str
+    category: str
+    # Per 100 g
+    kcal: float
+    protein_g: float
+    carbs_g: float
+    fat_g: float
+    matched: str  # the name or synonym that matched
+    score: float
@@ -0,0 +1,184 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import settings
+from query_stats import statement_shape
+
+logger = logging.getLogger(__name__)
+
+# Separate logger so slow-query records only go to the rotating file
+slow_logger = logging.getLogger("slow_queries")
+slow_logger.propagate = False
+_handler: Optional[RotatingFileHandler] = None
+
+# Per-worker aggregate by statement shape, summarized by /admin/slow-queries
+_aggregate: Dict[str, Dict[str, Any]] = {}
+_lock = threading.Lock()
+_explaining = threading.local()
+
+def _ensure_handler() -> None:
+    global _handler
+    if _handler is not None and _handler.baseFilename == os.path.abspath(settings.SLOW_QUERY_LOG_FILE):
+        return
+    with _lock:
+        if _handler is not None:
+            slow_logger.removeHandler(_handler)
+            _handler.close()
+        directory = os.path.dirname(settings.SLOW_QUERY_LOG_FILE)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        _handler = RotatingFileHandler(settings.SLOW_QUERY_LOG_FILE, maxBytes=settings.SLOW_QUERY_LOG_MAX_BYTES,
+                                       backupCount=settings.SLOW_QUERY_LOG_BACKUP_COUNT)
+        _handler.setFormatter(logging.Formatter("%(message)s"))
+        slow_logger.addHandler(_handler)
+        slow_logger.setLevel(logging.INFO)
+
+def redact(parameters: Any) -> Any:
+    """Replace string and binary bind values (emails, names, hashes, free text) with type placeholders."""
+    if isinstance(parameters, dict):
+        return {key: redact(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact(value) for value in parameters]
+    if isinstance(parameters, str):
+        return f"<str:{len(parameters)}>"
+    if isinstance(parameters, (bytes, bytearray, memoryview)):
+        return f"<bytes:{len(parameters)}>"
+    if parameters is None or isinstance(parameters, (int, float, bool)):
+        return parameters
+    return f"<{type(parameters).__name__}>"
+
+def calling_function() -> str:
+    """The crud (or other application) function that issued the current statement."""
+    frame = sys._getframe(2)
+    fallback = None
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.endswith("crud.py"):
+            return f"crud.{frame.f_code.co_name}"
+        if fallback is None and "site-packages" not in filename and not filename.endswith(("slow_query_log.py", "query_stats.py")):
+            fallback = f"{os.path.splitext(os.path.basename(filename))[0]}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return fallback or "unknown"
+
+def explain(conn, statement: str, parameters: Any) -> Optional[str]:
+    """
+    Capture the query plan for a SELECT on the same connection.
+
+    Runs on a raw DBAPI cursor so it fires no engine events; the thread-local
+    guard is a second line of defence against recursing into the logger. On
+    PostgreSQL it runs inside a savepoint, because a failed statement would
+    otherwise abort the request's open transaction.
+    """
+    if getattr(_explaining, "active", False) or not statement.lstrip().upper().startswith("SELECT"):
+        return None
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    elif dialect == "postgresql":
+        prefix = "EXPLAIN "
+    else:
+        return None
+    _explaining.active = True
+    try:
+        driver_connection = conn.connection.driver_connection
+        savepoint = dialect == "postgresql" and not getattr(driver_connection, "autocommit", False)
+        cursor = driver_connection.cursor()
+        try:
+            if savepoint:
+                cursor.execute("SAVEPOINT slow_query_explain")
+            try:
+                cursor.execute(prefix + statement, parameters)
+                rows = cursor.fetchall()
+            except Exception:
+                if savepoint:
+                    cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+                raise
+            finally:
+                if savepoint:
+                    cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+        finally:
+            cursor.close()
+    except Exception as e:
+        logger.debug(f"EXPLAIN failed: {e}")
+        return None
+    finally:
+        _explaining.active = False
+    if dialect == "sqlite":
+        # (id, parent, notused, detail)
+        return "\n".join(str(row[-1]) for row in rows)
+    return "\n".join(str(row[0]) for row in rows)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if settings.SLOW_QUERY_LOG_ENABLED and context is not None:
+        context._slow_query_start = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_slow_query_start", None)
+    if start is None:
+        return
+    duration_ms = (time.perf_counter() - start) * 1000
+    if duration_ms < settings.SLOW_QUERY_THRESHOLD_MS or getattr(_explaining, "active", False):
+        return
+
+    shape = statement_shape(statement)
+    function = calling_function()
+    plan = explain(conn, statement, parameters) if settings.SLOW_QUERY_EXPLAIN and not executemany else None
+    record(shape, duration_ms, function, plan, parameters)
+
+def record(shape: str, duration_ms: float, function: str, plan: Optional[str], parameters: Any) -> None:
+    """Write one slow statement to the log file and the in-memory aggregate."""
+    with _lock:
+        entry = _aggregate.setdefault(shape, {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "functions": set(), "plan": None})
+        entry["count"] += 1
+        entry["total_ms"] += duration_ms
+        entry["max_ms"] = max(entry["max_ms"], duration_ms)
+        entry["functions"].add(function)
+        if plan is not None:
+            entry["plan"] = plan
+
+    try:
+        _ensure_handler()
+        slow_logger.info(json.dumps({
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(duration_ms, 2),
+            "function": function,
+            "statement": shape,
+            "parameters": redact(parameters),
+            "plan": plan,
+        }, default=str))
+    except OSError as e:
+        logger.warning(f"Could not write slow query log: {e}")
+
+def summary(top: int = 10) -> List[Dict[str, Any]]:
+    """Slow statement shapes seen by this worker, by total time, largest first."""
+    with _lock:
+        entries = sorted(_aggregate.items(), key=lambda item: item[1]["total_ms"], reverse=True)[:top]
+        return [
+            {
+                "statement": shape,
+                "count": entry["count"],
+                "total_ms": round(entry["total_ms"], 2),
+                "mean_ms": round(entry["total_ms"] / entry["count"], 2),
+                "max_ms": round(entry["max_ms"], 2),
+                "functions": sorted(entry["functions"]),
+                "plan": entry["plan"],
+            }
+            for shape, entry in entries
+        ]
+
+def reset() -> None:
+    """Forget the aggregated slow statements."""
+    with _lock:
+        _aggregate.clear()
@@ -1,13 +1,32 @@
+import os
+import socket
+import sys
+import threading
+import time
+
 import pytest
+import uvicorn
+from contextlib import contextmanager
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from database import Base, get_db
 from main import app
+from models import User
+from idempotency import idempotency_store
+from query_stats import track_queries
+from config import settings
+import coalesce
+import cache
+import meal_plan_cache
+import openai_service
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+from openai_emulator import Emulator  # noqa: E402
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 @pytest.fixture
 def db():
@@ -18,6 +37,10 @@ def db():
     finally:
         db.close()
     Base.metadata.drop_all(bind=engine)
+    idempotency_store.clear()
+    coalesce.clear()
+    cache.clear()
+    meal_plan_cache.clear()
 
 @pytest.fixture
 def client(db):
@@ -30,3 +53,47 @@ def client(db):
     app.dependency_overrides[get_db] = override_get_db
     yield TestClient(app)
     app.dependency_overrides.clear()
+
+@pytest.fixture
+def make_user(db):
+    """Factory committing a user called `name` (name@example.com) and returning it."""
+    def make(name: str = "user") -> User:
+        user = User(email=f"{name}@example.com", username=name, hashed_password="not-a-real-hash")
+        db.add(user)
+        db.commit()
+        return user
+    return make
+
+@pytest.fixture
+def user(make_user):
+    return make_user()
+
+@pytest.fixture
+def query_budget():
+    """Context manager asserting that a block issues at most `max_queries` SQL statements."""
+    @contextmanager
+    def budget(max_queries: int):
+        with track_queries(engine) as stats:
+            yield stats
+        shapes = "\n".join(f"  {n}x {shape}" for shape, n in stats.shapes.items())
+        assert stats.count <= max_queries, f"{stats.count} queries, budget is {max_queries}:\n{shapes}"
+    return budget
+
+@pytest.fixture
+def emulator(monkeypatch):
+    """Serve an instant emulator on a free port and point the OpenAI client at it."""
+    emulator_app = Emulator(latency="fixed:0", token_ms=0, tool_call_after=2, retry_after_ms=1, seed=1)
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(emulator_app, host="127.0.0.1", port=port, lifespan="off", log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "sk-emulator")
+    monkeypatch.setattr(settings, "OPENAI_BASE_URL", f"http://127.0.0.1:{port}/v1")
+    monkeypatch.setattr(openai_service, "openai_service", None)
+    yield emulator_app
+    server.should_exit = True
+    thread.join(timeout=5)
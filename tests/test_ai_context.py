@@ -0,0 +1,66 @@
+from fastapi.testclient import TestClient
+
+import crud
+from crud import get_ai_context, rebuild_ai_context_snapshot, AI_CONTEXT_FORMAT_VERSION
+from models import AIContextSnapshot, UserHealthProfile
+from tests.conftest import TestingSessionLocal
+
+def test_snapshot_is_built_once_and_rebuilt_after_profile_change(client: TestClient, db, make_user):
+    """Test that the AI context is stored, reused and regenerated when the profile changes"""
+    user = make_user("context")
+    user_id = user.id
+    client.post(f"/users/{user_id}/health-profile", json={"age": 34, "gender": "female", "allergies": ["peanuts"]})
+
+    context = get_ai_context(db, user_id)
+    assert "34y, female" in context
+    assert "Allergies: peanuts" in context
+    snapshot = db.query(AIContextSnapshot).filter(AIContextSnapshot.user_id == user_id).one()
+    assert snapshot.format_version == AI_CONTEXT_FORMAT_VERSION
+    assert get_ai_context(db, user_id) == context
+
+    client.put(f"/users/{user_id}/health-profile", json={"allergies": ["shellfish"]})
+    assert "Allergies: shellfish" in get_ai_context(db, user_id)
+
+def test_unknown_user_has_empty_context(db):
+    """Test that no snapshot is stored for users that do not exist"""
+    assert get_ai_context(db, 12345) == ""
+    assert db.query(AIContextSnapshot).count() == 0
+
+def test_rebuild_overwrites_a_snapshot_written_concurrently(db, make_user):
+    """Test that a rebuild racing another request's insert updates that row instead of failing"""
+    user = make_user("race")
+    with TestingSessionLocal() as other:
+        other.add(AIContextSnapshot(user_id=user.id, format_version=AI_CONTEXT_FORMAT_VERSION - 1, content="stale"))
+        other.commit()
+
+    content = rebuild_ai_context_snapshot(db, user.id)
+    snapshot = db.query(AIContextSnapshot).filter(AIContextSnapshot.user_id == user.id).one()
+    assert (snapshot.content, snapshot.format_version) == (content, AI_CONTEXT_FORMAT_VERSION)
+
+def test_rebuild_racing_a_profile_write_does_not_store_old_content(db, monkeypatch, make_user):
+    """Test that a snapshot rendered before a concurrent write is not stored over the write's stale mark"""
+    user = make_user("stale")
+    crud.create_user_health_profile(db, user.id, {"age": 34, "allergies": ["peanuts"]})
+    render = crud.render_ai_context
+
+    def render_then_write(*args):
+        content = render(*args)
+        with TestingSessionLocal() as other:
+            crud.update_user_health_profile(other, user.id, {"allergies": ["shellfish"]})
+        return content
+
+    monkeypatch.setattr(crud, "render_ai_context", render_then_write)
+    assert "Allergies: peanuts" in rebuild_ai_context_snapshot(db, user.id)
+    monkeypatch.setattr(crud, "render_ai_context", render)
+    snapshot = db.query(AIContextSnapshot).filter(AIContextSnapshot.user_id == user.id).one()
+    assert snapshot.format_version == crud.AI_CONTEXT_STALE
+    assert "Allergies: shellfish" in get_ai_context(db, user.id)
+
+def test_rebuild_reads_the_database_not_the_entity_cache(db, make_user):
+    """Test that a rebuild on a worker with a stale cached profile renders the stored row"""
+    user = make_user("cached")
+    crud.create_user_health_profile(db, user.id, {"age": 34})
+    assert crud.get_user_health_profile(db, user.id).age == 34
+    db.query(UserHealthProfile).filter(UserHealthProfile.user_id == user.id).update({UserHealthProfile.age: 35})
+    db.commit()
+    assert "35y" in rebuild_ai_context_snapshot(db, user.id)
@@ -33,3 +33,14 @@ def test_get_users(client: TestClient):
     response = client.get("/users/")
     assert response.status_code == 200
     assert isinstance(response.json(), list)
+
+def test_get_habit_logs_fast_path_matches_schema(client: TestClient, db, make_user):
+    """Test that the row-serialized habit log list matches HabitLogResponse"""
+    from schemas import HabitLogResponse
+    user = make_user("logs")
+    for day in ("2024-01-14", "2024-01-15"):
+        client.post(f"/users/{user.id}/habit-logs", json={"log_date": day, "habit_type": "water", "logged_value": 1500, "unit": "ml"})
+    response = client.get(f"/users/{user.id}/habit-logs")
+    assert response.status_code == 200
+    logs = [HabitLogResponse(**log) for log in response.json()]
+    assert [log.log_date.isoformat() for log in logs] == ["2024-01-15", "2024-01-14"]
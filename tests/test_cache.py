@@ -0,0 +1,71 @@
+from fastapi.testclient import TestClient
+import orjson
+
+import cache
+from config import settings
+from crud import get_user, get_habit_target, update_habit_target
+from models import User, HabitTarget
+
+def test_get_user_is_served_from_cache(db, make_user):
+    """Test that repeated lookups hit the cache instead of the database"""
+    user = make_user("cache")
+    user_id = user.id
+    db.expunge_all()
+
+    hits = cache.cache_requests.get(entity="user", result="hit")
+    assert get_user(db, user_id).username == "cache"
+    db.expunge_all()
+    cached_user = get_user(db, user_id=user_id)
+    assert cached_user.username == "cache"
+    assert cached_user in db
+    assert cache.cache_requests.get(entity="user", result="hit") == hits + 1
+
+def test_missing_rows_are_cached_and_invalidated_on_create(client: TestClient, db, make_user):
+    """Test that a cached miss does not hide a row created afterwards"""
+    user = make_user("miss")
+    assert client.get(f"/users/{user.id}/habit-targets/water").status_code == 404
+    client.post(f"/users/{user.id}/habit-targets", json={"habit_type": "water", "target_value": 2000, "target_unit": "ml"})
+    assert client.get(f"/users/{user.id}/habit-targets/water").json()["target_value"] == 2000
+
+def test_update_invalidates_cached_target(db, make_user):
+    """Test that updates are visible on the next cached read"""
+    user = make_user("target")
+    user_id = user.id
+    db.add(HabitTarget(user_id=user_id, habit_type="water", target_value=2000, target_unit="ml"))
+    db.commit()
+
+    assert get_habit_target(db, user_id, "water").target_value == 2000
+    update_habit_target(db, user_id, "water", {"target_value": 2500})
+    db.expunge_all()
+    assert get_habit_target(db, user_id, "water").target_value == 2500
+
+def test_memory_backend_evicts_least_recently_used():
+    """Test that the in-process backend stays within its size bound"""
+    backend = cache.MemoryBackend(max_entries=2)
+    backend.set("a", 1, ttl=60)
+    backend.set("b", 2, ttl=60)
+    backend.get("a")
+    backend.set("c", 3, ttl=60)
+    assert backend.get("a") == 1
+    assert backend.get("b") is None
+    assert backend.get("c") == 3
+
+def test_cached_rows_are_json_without_credentials(db, make_user):
+    """Test that cached rows leave out the password hash and survive a JSON round trip"""
+    user = make_user("json")
+    row = cache._row_to_dict(user)
+    assert "hashed_password" not in row
+    db.expunge_all()
+
+    cached_user = cache._hydrate(db, User, orjson.loads(orjson.dumps(row)))
+    assert cached_user.created_at == user.created_at
+    assert cached_user.hashed_password == "not-a-real-hash"
+
+def test_memory_backend_ttls_are_capped(monkeypatch):
+    """Test that per-worker entries expire quickly since other workers never see their invalidations"""
+    monkeypatch.setattr(settings, "CACHE_MEMORY_MAX_TTL_SECONDS", 2.0)
+    monkeypatch.setattr(cache, "backend", cache.MemoryBackend(max_entries=10))
+    assert cache.entity_ttl("health_profile") == 2.0
+
+    monkeypatch.setattr(cache, "backend", object())
+    assert cache.entity_ttl("health_profile") == cache.ENTITY_TTLS["health_profile"]
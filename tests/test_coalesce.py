@@ -0,0 +1,75 @@
+import asyncio
+from datetime import date
+from fastapi.testclient import TestClient
+
+import coalesce
+
+def test_concurrent_identical_calls_share_one_computation():
+    """Test that identical in-flight calls await the leader's result"""
+    calls = []
+
+    @coalesce.coalesced("test-shared", ttl=0)
+    async def compute(user_id: int, db=None):
+        calls.append(user_id)
+        await asyncio.sleep(0.01)
+        return {"user_id": user_id}
+
+    async def run_all():
+        return await asyncio.gather(*[compute(user_id=1, db=object()) for _ in range(10)], compute(user_id=2))
+
+    results = asyncio.run(run_all())
+    assert sorted(calls) == [1, 2]
+    assert results[:10] == [{"user_id": 1}] * 10
+
+def test_cancelled_leader_does_not_cancel_followers():
+    """Test that a leader's client disconnect hands the computation to a follower instead of failing it"""
+    calls = []
+
+    @coalesce.coalesced("test-cancel", ttl=0)
+    async def compute(user_id: int):
+        calls.append(user_id)
+        await asyncio.sleep(0.05)
+        return {"user_id": user_id}
+
+    async def run_all():
+        leader = asyncio.create_task(compute(user_id=1))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(compute(user_id=1)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        results = await asyncio.gather(*followers)
+        return leader, results
+
+    leader, results = asyncio.run(run_all())
+    assert leader.cancelled()
+    assert results == [{"user_id": 1}] * 3
+    assert len(calls) == 2
+
+def test_invalidate_drops_cached_result():
+    """Test that a write invalidation forces the next call to recompute"""
+    calls = []
+
+    @coalesce.coalesced("test-ttl", ttl=60)
+    def compute(user_id: int):
+        calls.append(user_id)
+        return len(calls)
+
+    assert asyncio.run(compute(user_id=1)) == 1
+    assert asyncio.run(compute(user_id=1)) == 1
+    coalesce.invalidate(1, ["test-ttl"])
+    assert asyncio.run(compute(user_id=1)) == 2
+
+def test_feedback_reflects_new_logs(client: TestClient, db, make_user):
+    """Test that creating a habit log invalidates the cached feedback"""
+    user = make_user("coalesce")
+    client.post(f"/users/{user.id}/habit-targets", json={"habit_type": "water", "target_value": 2000, "target_unit": "ml"})
+
+    before = client.get(f"/users/{user.id}/feedback/water")
+    assert before.status_code == 200
+    assert before.json()["completion_percentage"] == 0
+
+    log = {"log_date": date.today().isoformat(), "habit_type": "water", "logged_value": 14000, "unit": "ml"}
+    assert client.post(f"/users/{user.id}/habit-logs", json=log).status_code == 200
+
+    after = client.get(f"/users/{user.id}/feedback/water")
+    assert after.json()["completion_percentage"] == 100
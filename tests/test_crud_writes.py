@@ -0,0 +1,115 @@
+from datetime import date
+
+from sqlalchemy import text
+
+import crud
+from jobs import job_queue
+import migrate_message_tracking_unique
+from models import AIContextSnapshot, DailyHabitLog, Job, MessageTracking, User
+from schemas import UserCreate, UserUpdate
+from tests.conftest import engine
+
+def test_create_and_update_user_use_one_statement(db, query_budget, monkeypatch):
+    """User writes return server defaults without a refresh SELECT."""
+    monkeypatch.setattr(crud, "get_password_hash", lambda password: "hashed:" + password)
+
+    with query_budget(1) as stats:
+        user = crud.create_user(db, UserCreate(email="new@example.com", username="newuser", password="secret123"))
+        assert user.id is not None and user.created_at is not None
+    assert stats.count == 1
+    shape = next(iter(stats.shapes))
+    assert shape.startswith("INSERT") and "RETURNING" in shape
+
+    with query_budget(1) as stats:
+        updated = crud.update_user(db, user.id, UserUpdate(full_name="New Name"))
+        assert updated.full_name == "New Name"
+        assert updated.updated_at is not None
+    assert stats.count == 1
+    shape = next(iter(stats.shapes))
+    assert shape.startswith("UPDATE") and "RETURNING" in shape
+
+def test_habit_log_writes_use_one_statement(db, query_budget, make_user):
+    """Habit log create/update/delete are a single statement each."""
+    user_id = make_user("writes").id
+    today = date.today()
+
+    with query_budget(1) as stats:
+        log = crud.create_habit_log(db, user_id, {"log_date": today, "habit_type": "water", "logged_value": 500, "unit": "ml"})
+        assert log.created_at is not None
+    assert stats.count == 1
+
+    with query_budget(1) as stats:
+        log = crud.update_habit_log(db, user_id, today, "water", {"logged_value": 750, "notes": None})
+        assert log.logged_value == 750
+        assert log.unit == "ml"
+    assert stats.count == 1
+
+    with query_budget(2) as stats:
+        assert crud.delete_habit_log(db, user_id, today, "water") is True
+        assert crud.delete_habit_log(db, user_id, today, "water") is False
+    assert stats.count == 2
+
+def test_update_missing_row_returns_none(db, query_budget, make_user):
+    """Updating a row that does not exist reports None without extra queries."""
+    user_id = make_user("writes").id
+
+    with query_budget(1) as stats:
+        assert crud.update_habit_target(db, user_id, "water", {"target_value": 1}) is None
+    assert stats.count == 1
+
+def test_habit_target_writes_also_clear_ai_context(db, query_budget, make_user):
+    """Target writes add only the AI snapshot delete to the single write statement."""
+    user_id = make_user("writes").id
+
+    with query_budget(2) as stats:
+        target = crud.create_habit_target(db, user_id, {"habit_type": "water", "target_value": 2000, "target_unit": "ml"})
+        assert target.is_active is True
+    assert stats.count == 2
+
+    with query_budget(2) as stats:
+        target = crud.update_habit_target(db, user_id, "water", {"target_value": 2500})
+        assert target.target_value == 2500
+    assert stats.count == 2
+
+def test_increment_message_count_is_atomic_update(db, query_budget, make_user):
+    """The message counter is incremented in SQL and created on first use."""
+    user_id = make_user("writes").id
+
+    with query_budget(1) as stats:
+        assert crud.increment_message_count(db, user_id, "2025-01").message_count == 1
+    assert stats.count == 1
+    assert "ON CONFLICT" in next(iter(stats.shapes))
+
+    with query_budget(1) as stats:
+        assert crud.increment_message_count(db, user_id, "2025-01").message_count == 2
+    assert stats.count == 1
+    assert db.query(MessageTracking).filter(MessageTracking.user_id == user_id).count() == 1
+    assert crud.check_message_limit(db, user_id, limit=50, month_year="2025-01") == (True, 2, 48)
+
+def test_delete_user_removes_child_rows_first(db, make_user):
+    """Deleting a user clears the rows that reference it, so the users foreign keys allow it."""
+    user_id = make_user("writes").id
+    crud.increment_message_count(db, user_id, "2025-01")
+    crud.create_habit_log(db, user_id, {"log_date": date.today(), "habit_type": "water", "logged_value": 500, "unit": "ml"})
+    db.add(AIContextSnapshot(user_id=user_id, format_version=1, content="{}"))
+    db.commit()
+    job_queue.enqueue(db, "meal_plan", user_id, {"profile_data": {"constraints": ["peanuts"]}})
+
+    assert crud.delete_user(db, user_id) is True
+    assert db.query(User).count() == 0
+    for model in (MessageTracking, DailyHabitLog, AIContextSnapshot, Job):
+        assert db.query(model).count() == 0
+    assert crud.delete_user(db, user_id) is False
+
+def test_startup_upgrade_adds_the_message_counter_index(db, make_user):
+    """A database from before the unique index gets it, duplicates merged, so the upsert works."""
+    user_id = make_user("writes").id
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX uq_message_tracking_user_month"))
+        for count in (2, 3):
+            conn.execute(text("INSERT INTO message_tracking (user_id, month_year, message_count) VALUES (:user_id, '2025-01', :count)"),
+                         {"user_id": user_id, "count": count})
+
+    assert migrate_message_tracking_unique.upgrade(engine) == 1
+    assert migrate_message_tracking_unique.upgrade(engine) == 0
+    assert crud.increment_message_count(db, user_id, "2025-01").message_count == 6
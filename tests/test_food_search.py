@@ -0,0 +1,43 @@
+import food_search
+
+def names(results):
+    return [result["name"] for result in results]
+
+def test_prefix_matches_names_and_later_words():
+    """A prefix finds foods whose name, or a later word of it, starts with it."""
+    assert {"chicken breast", "chicken thigh", "chickpeas"} <= set(names(food_search.search("chick")))
+    results = food_search.search("greek yog")
+    assert names(results)[0] == "greek yoghurt"
+    assert names(food_search.search("tofu"))[0] == "firm tofu"
+
+def test_synonyms_are_searchable():
+    """A synonym finds its food and reports which term matched."""
+    [prawns] = [result for result in food_search.search("shrimp") if result["name"] == "prawns"]
+    assert prawns["matched"] == "shrimp"
+    assert "zucchini" in names(food_search.search("courgette"))
+
+def test_typos_are_tolerated():
+    """Misspellings fall back to trigram similarity."""
+    assert names(food_search.search("brocoli"))[0] == "broccoli"
+    assert names(food_search.search("salmn"))[0] == "salmon"
+    assert names(food_search.search("swet potato"))[0] == "sweet potato"
+
+def test_ranking_and_limits():
+    """Exact matches rank first, each food appears once and the limit is respected."""
+    results = food_search.search("Chicken-Breast")
+    assert results[0]["name"] == "chicken breast" and results[0]["score"] == food_search.EXACT
+    assert len(names(results)) == len(set(names(results)))
+    assert len(food_search.search("b", limit=3)) == 3
+    assert food_search.search("   ") == []
+    assert food_search.search("xyzq") == []
+
+def test_search_endpoint(client):
+    """GET /foods/search returns ranked foods with their nutrients per 100 g."""
+    response = client.get("/foods/search", params={"q": "brocoli", "limit": 5})
+    assert response.status_code == 200
+    top = response.json()[0]
+    assert top["name"] == "broccoli"
+    assert {"id", "category", "kcal", "protein_g", "carbs_g", "fat_g", "matched", "score"} <= set(top)
+
+    assert client.get("/foods/search", params={"q": ""}).status_code == 422
+    assert client.get("/foods/search", params={"q": "rice", "limit": 500}).status_code == 422
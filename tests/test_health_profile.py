@@ -0,0 +1,28 @@
+from fastapi.testclient import TestClient
+
+from crud import get_users_with_allergy
+from models import UserHealthProfile
+
+def test_health_profile_lists_round_trip(client: TestClient, db, make_user):
+    """Test that list fields are stored as JSON and returned as lists"""
+    user_id = make_user("lists").id
+    response = client.post(f"/users/{user_id}/health-profile", json={"age": 40, "allergies": ["peanuts", "soy"]})
+    assert response.status_code == 200
+    assert response.json()["allergies"] == ["peanuts", "soy"]
+    assert response.json()["medications"] == []
+
+    stored = db.query(UserHealthProfile).filter(UserHealthProfile.user_id == user_id).one()
+    assert stored.allergies == ["peanuts", "soy"]
+
+    response = client.put(f"/users/{user_id}/health-profile", json={"medications": ["metformin"]})
+    assert response.json()["medications"] == ["metformin"]
+    assert client.get(f"/users/{user_id}/health-profile").json()["allergies"] == ["peanuts", "soy"]
+
+def test_get_users_with_allergy(db, make_user):
+    """Test querying users by an allergy in the JSON list"""
+    peanut_id = make_user("peanut").id
+    other_id = make_user("other").id
+    db.add(UserHealthProfile(user_id=peanut_id, allergies=["peanuts"]))
+    db.add(UserHealthProfile(user_id=other_id, allergies=["shellfish"]))
+    db.commit()
+    assert [user.id for user in get_users_with_allergy(db, "peanuts")] == [peanut_id]
@@ -0,0 +1,89 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from idempotency import IdempotencyStore
+from models import DailyHabitLog, MessageTracking
+from openai_emulator import REPLY
+
+def test_duplicate_habit_log_post_is_replayed(client: TestClient, db, user):
+    """Test that a retried habit-log POST returns the original response instead of a 400"""
+    payload = {"log_date": "2024-01-15", "habit_type": "water", "logged_value": 1500, "unit": "ml"}
+    headers = {"Idempotency-Key": "log-1"}
+    first = client.post(f"/users/{user.id}/habit-logs", json=payload, headers=headers)
+    second = client.post(f"/users/{user.id}/habit-logs", json=payload, headers=headers)
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert second.json() == first.json()
+    assert db.query(DailyHabitLog).count() == 1
+
+def test_reused_key_with_different_body_is_rejected(client: TestClient, user):
+    """Test that reusing a key for a different request returns 422"""
+    headers = {"Idempotency-Key": "log-2"}
+    payload = {"log_date": "2024-01-15", "habit_type": "water", "logged_value": 1500, "unit": "ml"}
+    assert client.post(f"/users/{user.id}/habit-logs", json=payload, headers=headers).status_code == 200
+    payload["logged_value"] = 2000
+    assert client.post(f"/users/{user.id}/habit-logs", json=payload, headers=headers).status_code == 422
+
+def test_concurrent_duplicates_share_one_execution():
+    """Test that duplicates arriving while the first is in flight wait on the same result"""
+    store = IdempotencyStore(ttl_seconds=60, max_entries=10)
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"response": "hello"}
+
+    async def run_all():
+        return await asyncio.gather(*[store.run("/chat", "key", {"message": "hi"}, work) for _ in range(5)])
+
+    results = asyncio.run(run_all())
+    assert len(calls) == 1
+    assert all(result == {"response": "hello"} for result in results)
+
+def test_failed_requests_are_not_stored():
+    """Test that a failure releases the key so the client can retry"""
+    store = IdempotencyStore(ttl_seconds=60, max_entries=10)
+
+    async def fail():
+        raise HTTPException(status_code=500, detail="boom")
+
+    async def succeed():
+        return {"ok": True}
+
+    with pytest.raises(HTTPException):
+        asyncio.run(store.run("/chat", "key", {}, fail))
+    assert asyncio.run(store.run("/chat", "key", {}, succeed)) == {"ok": True}
+
+def test_ai_profiling_chat_failure_is_retryable(client: TestClient, emulator, monkeypatch):
+    """Test that an upstream failure is a 503, not a stored apology, and a retry with the same key runs again"""
+    import main
+    import openai_service
+    monkeypatch.setattr(main.ai_profiling_service, "openai_service", openai_service.get_openai_service())
+
+    payload = {"user_id": 1, "message": "hi", "session_data": {"user_id": 1, "conversation_history": []}}
+    headers = {"Idempotency-Key": "profiling-1"}
+    with client:  # one event loop for both requests, which share the OpenAI client's connections
+        emulator.server_error_rate = 1.0
+        assert client.post("/ai-profiling-chat", json=payload, headers=headers).status_code == 503
+        emulator.server_error_rate = 0.0
+        response = client.post("/ai-profiling-chat", json=payload, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["response"] == REPLY
+
+def test_chat_failure_is_not_billed_or_stored(client: TestClient, db, emulator):
+    """Test that a failed /chat call is a 503 that doesn't count against the message limit"""
+    headers = {"Idempotency-Key": "chat-1"}
+    payload = {"user_id": 1, "message": "What should I eat?"}
+    with client:
+        emulator.server_error_rate = 1.0
+        assert client.post("/chat", json=payload, headers=headers).status_code == 503
+        assert db.query(MessageTracking).count() == 0
+
+        emulator.server_error_rate = 0.0
+        response = client.post("/chat", json=payload, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["response"] == REPLY
+    assert db.query(MessageTracking).one().message_count == 1
@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import jobs
+from jobs import JobQueue
+from models import Job
+from tests.conftest import TestingSessionLocal
+from tests.test_meal_planner import PROFILE
+
+attempts_seen = []
+
+@jobs.handler("test_flaky")
+def flaky(payload, db, progress):
+    attempts_seen.append(payload)
+    if len(attempts_seen) < payload["fail_times"] + 1:
+        raise RuntimeError("transient failure")
+    progress(50, "halfway")
+    return {"ok": True}
+
+@pytest.fixture
+def queue(db):
+    attempts_seen.clear()
+    return JobQueue(TestingSessionLocal, workers=2, visibility_timeout=60, max_attempts=2,
+                    retry_backoff=0, poll_interval=0.01, retention=24)
+
+def test_enqueue_deduplicates_by_user(queue, db):
+    """A user's active job is reused, and a queued one takes the newer payload."""
+    job, deduplicated = queue.enqueue(db, "meal_plan", 1, {"profile_data": PROFILE})
+    assert not deduplicated
+    assert queue.enqueue(db, "meal_plan", 1, {"profile_data": PROFILE})[0].id == job.id
+
+    updated, deduplicated = queue.enqueue(db, "meal_plan", 1, {"profile_data": {**PROFILE, "goal": "muscle_gain"}})
+    assert deduplicated and updated.id == job.id
+    assert '"muscle_gain"' in updated.payload
+    assert queue.enqueue(db, "meal_plan", 2, {"profile_data": PROFILE})[0].id != job.id
+
+    # Once it has started, a different payload has to wait for it
+    assert queue.claim(db, "worker-a").id == job.id
+    with pytest.raises(jobs.JobConflict):
+        queue.enqueue(db, "meal_plan", 1, {"profile_data": PROFILE})
+    db.query(Job).filter(Job.id == job.id).update({Job.status: "succeeded"})
+    db.commit()
+    assert queue.enqueue(db, "meal_plan", 1, {"profile_data": PROFILE})[0].id != job.id
+
+def test_concurrent_enqueue_is_deduplicated_by_the_index(queue, db, monkeypatch):
+    """A request that misses another's just-queued job hits the unique index and returns that job."""
+    job, _ = queue.enqueue(db, "meal_plan", 1, {"profile_data": PROFILE})
+    lookups = iter([None])
+    original = queue._active
+    monkeypatch.setattr(queue, "_active", lambda *args: next(lookups, None) or original(*args))
+    racer, deduplicated = queue.enqueue(db, "meal_plan", 1, {"profile_data": PROFILE})
+    assert deduplicated and racer.id == job.id
+    assert db.query(Job).count() == 1
+
+def test_failed_attempts_are_retried_then_fail(queue, db):
+    """A failing handler is retried up to max_attempts; the last error is kept."""
+    job, _ = queue.enqueue(db, "test_flaky", 1, {"fail_times": 1})
+    assert queue.run_once("worker-a")
+    job = queue.get(db, job.id)
+    assert (job.status, job.attempts, job.error) == ("queued", 1, "transient failure")
+    assert queue.run_once("worker-a")
+    job = queue.get(db, job.id)
+    assert (job.status, job.progress, job.error) == ("succeeded", 100, None)
+    assert queue.describe(job)["result"] == {"ok": True}
+
+    job, _ = queue.enqueue(db, "test_flaky", 2, {"fail_times": 5})
+    attempts_seen.clear()
+    while queue.run_once("worker-a"):
+        pass
+    job = queue.get(db, job.id)
+    assert (job.status, job.attempts) == ("failed", 2)
+    assert len(attempts_seen) == 2
+
+def test_expired_lease_is_claimed_by_another_worker(queue, db):
+    """A job whose worker stopped renewing its lease is rerun, and the stale worker's result is dropped."""
+    job, _ = queue.enqueue(db, "test_flaky", 1, {"fail_times": 0})
+    stale_db = TestingSessionLocal()
+    stale = queue.claim(stale_db, "worker-a")
+    assert queue.claim(db, "worker-b") is None
+
+    db.query(Job).filter(Job.id == job.id).update({Job.locked_until: datetime.utcnow() - timedelta(seconds=1)})
+    db.commit()
+    fresh = queue.claim(db, "worker-b")
+    assert (fresh.id, fresh.worker_id, fresh.attempts) == (job.id, "worker-b", 2)
+
+    queue.execute(stale_db, stale)
+    stale_db.close()
+    assert queue.get(db, job.id).status == "running"
+    queue.execute(db, fresh)
+    assert queue.get(db, job.id).status == "succeeded"
+
+    # On the final attempt an expired lease fails the job instead
+    job, _ = queue.enqueue(db, "test_flaky", 2, {"fail_times": 0})
+    db.query(Job).filter(Job.id == job.id).update({Job.status: "running", Job.attempts: 2,
+                                                    Job.locked_until: datetime.utcnow() - timedelta(seconds=1)})
+    db.commit()
+    assert queue.claim(db, "worker-b") is None
+    assert queue.get(db, job.id).status == "failed"
+
+def test_meal_plan_job_endpoints(client, monkeypatch):
+    """Enqueue returns 202 with a job id; polling and the event stream return the finished plan."""
+    monkeypatch.setattr(jobs.job_queue, "session_factory", TestingSessionLocal)
+    response = client.post("/users/1/meal-plan-jobs", json={"profile_data": PROFILE})
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    assert response.json()["status"] == "queued"
+    assert client.post("/users/1/meal-plan-jobs", json={"profile_data": PROFILE}).json()["deduplicated"]
+    assert client.post("/users/1/meal-plan-jobs", json={}).status_code == 400
+
+    with TestingSessionLocal() as worker_db:
+        job = jobs.job_queue.claim(worker_db, "worker-a")
+        changed = client.post("/users/1/meal-plan-jobs", json={"profile_data": {**PROFILE, "goal": "muscle_gain"}})
+        assert changed.status_code == 409
+        jobs.job_queue.execute(worker_db, job)
+    body = client.get(f"/jobs/{job_id}").json()
+    assert body["status"] == "succeeded"
+    assert len(body["result"]["meal_plan"]["days"]) == 7
+
+    events = client.get(f"/jobs/{job_id}/events")
+    assert events.headers["content-type"].startswith("text/event-stream")
+    assert events.text.startswith("event: succeeded\ndata: ")
+    assert client.get("/jobs/999").status_code == 404
@@ -0,0 +1,80 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+
+import llm_guard
+from llm_guard import run_llm_call, llm_cancellations, llm_deadline_exceeded, llm_slot_timeouts
+
+class FakeRequest:
+    """Stand-in for a Starlette request whose client disconnects after a delay"""
+    def __init__(self, disconnect_after: float = None):
+        self.disconnect_after = disconnect_after
+        self.started = None
+
+    async def is_disconnected(self) -> bool:
+        loop = asyncio.get_running_loop()
+        if self.started is None:
+            self.started = loop.time()
+        return self.disconnect_after is not None and loop.time() - self.started >= self.disconnect_after
+
+async def slow_call(state: dict, delay: float):
+    try:
+        await asyncio.sleep(delay)
+        return "done"
+    except asyncio.CancelledError:
+        state["cancelled"] = True
+        raise
+
+def test_run_llm_call_returns_result():
+    """Test that a completed call returns its result"""
+    result = asyncio.run(run_llm_call(FakeRequest(), slow_call({}, 0.01), endpoint="/test", deadline=1))
+    assert result == "done"
+
+def test_run_llm_call_cancels_on_disconnect():
+    """Test that the upstream call is cancelled when the client disconnects"""
+    state = {}
+    before = llm_cancellations.get(endpoint="/test")
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(run_llm_call(FakeRequest(disconnect_after=0), slow_call(state, 5), endpoint="/test", deadline=5))
+    assert exc_info.value.status_code == 499
+    assert state["cancelled"]
+    assert llm_cancellations.get(endpoint="/test") == before + 1
+
+def test_run_llm_call_enforces_deadline():
+    """Test that the upstream call is cancelled when the deadline passes"""
+    state = {}
+    before = llm_deadline_exceeded.get(endpoint="/test")
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(run_llm_call(FakeRequest(), slow_call(state, 5), endpoint="/test", deadline=0.05))
+    assert exc_info.value.status_code == 504
+    assert state["cancelled"]
+    assert llm_deadline_exceeded.get(endpoint="/test") == before + 1
+
+def test_run_llm_call_gives_up_waiting_for_a_slot():
+    """Test that a request queued behind busy slots gets a 503 at its deadline instead of waiting forever"""
+    async def scenario():
+        slots = llm_guard.get_llm_slots()
+        held = 0
+        while not slots.locked():
+            await slots.acquire()
+            held += 1
+        try:
+            state = {}
+            with pytest.raises(HTTPException) as exc_info:
+                await run_llm_call(FakeRequest(), slow_call(state, 0), endpoint="/test", deadline=0.05)
+            assert exc_info.value.status_code == 503
+            assert not state
+            with pytest.raises(HTTPException) as exc_info:
+                await run_llm_call(FakeRequest(disconnect_after=0), slow_call(state, 0), endpoint="/test", deadline=5)
+            assert exc_info.value.status_code == 499
+        finally:
+            for _ in range(held):
+                slots.release()
+        # Nothing leaked: every slot is free again
+        assert await run_llm_call(FakeRequest(), slow_call({}, 0), endpoint="/test", deadline=1) == "done"
+
+    llm_guard._llm_slots = None
+    before = llm_slot_timeouts.get(endpoint="/test")
+    asyncio.run(scenario())
+    llm_guard._llm_slots = None
+    assert llm_slot_timeouts.get(endpoint="/test") == before + 1
@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+from config import settings
+import loop_monitor
+from loop_monitor import LoopMonitor
+
+def blocking_call(seconds):
+    time.sleep(seconds)
+
+def test_stall_is_attributed_to_route_and_function():
+    """A blocking call on the loop is recorded with the request's route and the blocking function."""
+    monitor = LoopMonitor(interval=0.02, threshold=0.1, buffer_size=5)
+
+    class Route:
+        path = "/users/{user_id}/feedback/{habit_type}"
+
+    async def scenario():
+        monitor.start()
+        await asyncio.sleep(0.05)
+        loop_monitor._task_scopes[asyncio.current_task()] = {"method": "GET", "path": "/users/1/feedback/water", "route": Route()}
+        try:
+            blocking_call(0.4)
+            await asyncio.sleep(0.05)
+        finally:
+            loop_monitor._task_scopes.pop(asyncio.current_task(), None)
+            await monitor.stop()
+
+    asyncio.run(scenario())
+
+    [stall] = monitor.recent_stalls()
+    assert stall["route"] == "/users/{user_id}/feedback/{habit_type}"
+    assert stall["method"] == "GET"
+    assert "blocking_call" in stall["function"]
+    assert stall["duration_ms"] >= 300
+    assert any("time.sleep" in line for line in stall["stack"])
+
+def test_admin_loop_stalls_endpoint(client, monkeypatch):
+    """Recorded stalls are listed by the admin endpoint."""
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(loop_monitor.monitor, "stalls", loop_monitor.deque([{"route": "/x", "function": "f"}], maxlen=5))
+    response = client.get("/admin/loop-stalls", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert response.json()["stalls"] == [{"route": "/x", "function": "f"}]
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+
+import meal_plan_cache
+import meal_planner
+from meal_plan_cache import MealPlanCache, meal_plan_cache_requests, meal_plan_cache_seconds_saved
+from models import MealPlanCacheEntry, User
+from tests.test_meal_planner import PROFILE
+
+def test_equivalent_profiles_share_a_signature():
+    """Calories within a bucket, term order, case and allergy wording don't change the signature."""
+    reworded = {**PROFILE, "target_calories": 1880, "dislikes": ["Mushrooms", "unknown food"],
+                "carb_choices": ["sweet_potato", "rice", "rice"], "meals_pattern": "Small breakfast + big lunch, snack and dinner"}
+    canonical = meal_planner.canonical_profile(PROFILE)
+    assert meal_planner.canonical_profile(reworded) == canonical
+    assert meal_planner.canonical_profile(canonical) == canonical
+    assert meal_planner.canonical_profile({**PROFILE, "constraints": ["tree nut allergy"]})["constraints"] == ["mushrooms", "nuts"]
+
+    key = meal_plan_cache.signature(canonical)
+    assert key != meal_plan_cache.signature(meal_planner.canonical_profile({**PROFILE, "target_calories": 2000}))
+    assert key != meal_plan_cache.signature(meal_planner.canonical_profile({**PROFILE, "diet_style": "vegetarian"}))
+
+def test_cached_plan_is_rescaled_to_the_exact_target():
+    """A hit reuses the bucket's plan but portions follow the caller's own calorie target."""
+    cache = MealPlanCache(max_entries=10, calorie_bucket=100)
+    misses = meal_plan_cache_requests.get(result="miss")
+    hits = meal_plan_cache_requests.get(result="memory")
+    saved = meal_plan_cache_seconds_saved.get()
+
+    first = cache.get_plan(PROFILE)
+    second = cache.get_plan({**PROFILE, "target_calories": 1940})
+    assert meal_plan_cache_requests.get(result="miss") == misses + 1
+    assert meal_plan_cache_requests.get(result="memory") == hits + 1
+    assert meal_plan_cache_seconds_saved.get() > saved
+
+    assert first == meal_planner.build_plan(meal_planner.canonical_profile(PROFILE))
+    assert second["targets"] == meal_planner.targets({**PROFILE, "target_calories": 1940})
+    assert [meal["recipe_id"] for meal in second["days"][0]["meals"]] == [meal["recipe_id"] for meal in first["days"][0]["meals"]]
+    for day in second["days"]:
+        assert abs(day["totals"]["calories"] - 1940) <= 194
+    # The shared plan itself is untouched
+    assert cache.get_plan(PROFILE) == first
+
+def test_lru_evicts_oldest_plan():
+    """The in-memory tier holds at most max_entries plans."""
+    cache = MealPlanCache(max_entries=1, calorie_bucket=100)
+    cache.get_plan(PROFILE)
+    cache.get_plan({**PROFILE, "goal": "muscle_gain"})
+    misses = meal_plan_cache_requests.get(result="miss")
+    cache.get_plan(PROFILE)
+    assert meal_plan_cache_requests.get(result="miss") == misses + 1
+
+def test_db_tier_survives_a_cold_memory_cache(db):
+    """Plans are written to meal_plan_cache and served from it after the in-memory tier is lost."""
+    cache = MealPlanCache(max_entries=10, calorie_bucket=100, use_db=True)
+    plan = cache.get_plan(PROFILE, db)
+    assert db.query(MealPlanCacheEntry).count() == 1
+
+    cache.clear()
+    db_hits = meal_plan_cache_requests.get(result="db")
+    assert cache.get_plan(PROFILE, db) == plan
+    assert meal_plan_cache_requests.get(result="db") == db_hits + 1
+    assert db.query(MealPlanCacheEntry).count() == 1
+
+def test_cached_plan_keeps_the_meal_size_split():
+    """Sized meals survive canonicalization, so a cache hit splits calories across meals like a fresh plan."""
+    def slot_shares(plan):
+        calories = {}
+        for day in plan["days"]:
+            for meal in day["meals"]:
+                calories[meal["slot"]] = calories.get(meal["slot"], 0) + meal["calories"]
+        total = sum(calories.values())
+        return {slot: value / total for slot, value in calories.items()}
+
+    for pattern in ("big breakfast, lunch, small dinner", "small lunch, big dinner"):
+        profile = {**PROFILE, "target_calories": 1850, "meals_pattern": pattern}
+        canonical = meal_planner.canonical_profile(profile)
+        assert meal_planner.meal_slots(canonical["meals_pattern"]) == meal_planner.meal_slots(pattern)
+
+        cached = slot_shares(meal_planner.personalize(meal_planner.build_plan(canonical), profile))
+        fresh = slot_shares(meal_planner.build_plan(profile))
+        assert cached.keys() == fresh.keys()
+        for slot in fresh:
+            assert abs(cached[slot] - fresh[slot]) < 0.05, (pattern, slot, cached, fresh)
+
+def test_db_tier_leaves_the_callers_transaction_alone(db):
+    """Storing a plan neither commits nor rolls back what the caller's session has pending."""
+    cache = MealPlanCache(max_entries=10, calorie_bucket=100, use_db=True)
+    pending = User(email="pending@example.com", username="pending", hashed_password="not-a-real-hash")
+    db.add(pending)
+    cache.get_plan(PROFILE, db)
+    assert pending in db.new
+    db.rollback()
+    assert db.query(User).count() == 0
+    assert db.query(MealPlanCacheEntry).count() == 1
+
+def test_old_stored_plans_are_pruned(db):
+    """Plans past the retention period, including ones from an older data version, are deleted."""
+    cache = MealPlanCache(max_entries=10, calorie_bucket=100, use_db=True, retention_days=30)
+    db.add(MealPlanCacheEntry(signature="old", plan="{}", build_seconds=0.01,
+                              created_at=datetime.utcnow() - timedelta(days=31)))
+    db.commit()
+    cache.get_plan(PROFILE, db)
+    assert [entry.signature for entry in db.query(MealPlanCacheEntry)] == [meal_plan_cache.signature(meal_planner.canonical_profile(PROFILE))]
@@ -0,0 +1,98 @@
+import meal_planner
+
+PROFILE = {
+    "goal": "fat_loss",
+    "target_calories": 1900,
+    "diet_style": "whole_food_mix",
+    "exercise_intensity": "mixed",
+    "protein_preferences": ["chicken", "eggs", "fish"],
+    "carb_choices": ["rice", "sweet_potato"],
+    "fat_choices": ["olive_oil", "avocado"],
+    "seafood_frequency": "weekly",
+    "meals_pattern": "small breakfast, big lunch, snack, dinner",
+    "constraints": [],
+    "dislikes": ["mushrooms"],
+}
+
+def recipe_ids(plan):
+    return [meal["recipe_id"] for day in plan["days"] for meal in day["meals"]]
+
+def test_plan_covers_the_week_and_hits_calorie_targets():
+    """Every day has each meal in the pattern and lands within 10% of the calorie target."""
+    plan = meal_planner.build_plan(PROFILE)
+    assert plan["targets"]["calories"] == 1900
+    assert plan["meals_per_day"] == ["breakfast", "lunch", "snack", "dinner"]
+    assert len(plan["days"]) == 7
+    for day in plan["days"]:
+        assert [meal["slot"] for meal in day["meals"]] == plan["meals_per_day"]
+        assert abs(day["totals"]["calories"] - 1900) <= 190
+    # Repeats are penalized, so a week uses plenty of different recipes
+    assert len(set(recipe_ids(plan))) >= 18
+
+def test_plan_is_deterministic():
+    """The same profile always gets the same plan."""
+    assert meal_planner.build_plan(PROFILE) == meal_planner.build_plan(dict(PROFILE))
+
+def test_diet_style_allergies_and_dislikes_are_excluded():
+    """A vegan with a nut allergy who dislikes tofu and chickpeas gets none of those foods."""
+    profile = {**PROFILE, "diet_style": "vegan", "constraints": ["tree nut allergy"], "dislikes": ["tofu", "chickpeas"]}
+    plan = meal_planner.build_plan(profile)
+    table = meal_planner.recipes()
+    foods = table.foods
+    for recipe_id in recipe_ids(plan):
+        i = list(table.ids).index(recipe_id)
+        ingredients = [foods.food(food) for food in table.contains[i].nonzero()[0]]
+        assert all("vegan" in food["diets"] and "nuts" not in food["allergens"] for food in ingredients)
+        assert not any(food["name"] in ("firm tofu", "chickpeas") for food in ingredients)
+
+def test_dislikes_match_food_categories_and_synonyms():
+    """A disliked category or synonym rules out every recipe using a matching food."""
+    table = meal_planner.recipes()
+    shrimp = meal_planner.allowed_recipes(table, {"dislikes": ["shrimp"]})
+    assert not (shrimp & table.containing(table.food_rows("prawns"))).any()
+    red_meat = meal_planner.allowed_recipes(table, {"dislikes": ["red meat"]})
+    assert not (red_meat & table.containing(table.foods.category_rows("red_meat"))).any()
+    assert red_meat.sum() < len(table)
+
+def test_seafood_frequency_caps_seafood_meals():
+    """Weekly seafood means at most one seafood meal, and none means none."""
+    table = meal_planner.recipes()
+    seafood_ids = set(table.ids[table.seafood])
+    weekly = meal_planner.build_plan({**PROFILE, "protein_preferences": ["salmon", "tuna"]})
+    assert sum(recipe_id in seafood_ids for recipe_id in recipe_ids(weekly)) <= 1
+    none = meal_planner.build_plan({**PROFILE, "seafood_frequency": "none"})
+    assert not seafood_ids & set(recipe_ids(none))
+
+def test_meals_pattern_parsing():
+    """Skipped meals are dropped and size words scale a meal's share."""
+    slots = meal_planner.meal_slots("skip breakfast, big lunch and dinner")
+    assert list(slots) == ["lunch", "dinner"]
+    assert slots["lunch"] == meal_planner.SLOT_WEIGHTS["lunch"] * 1.4
+    assert list(meal_planner.meal_slots(None)) == list(meal_planner.SLOTS)
+
+def test_meals_pattern_with_only_skips_keeps_the_other_meals():
+    """"no snacks" means the usual day without a snack, not the defaults."""
+    assert list(meal_planner.meal_slots("no snacks")) == ["breakfast", "lunch", "dinner"]
+    assert list(meal_planner.meal_slots("I skip breakfast")) == ["lunch", "snack", "dinner"]
+    plan = meal_planner.build_plan({**PROFILE, "meals_pattern": "no snacks"})
+    assert plan["meals_per_day"] == ["breakfast", "lunch", "dinner"]
+
+def test_build_meal_plan_endpoint(client):
+    """The endpoint returns the local plan and rejects a request without a profile."""
+    response = client.post("/build-meal-plan/1", json={"profile_data": PROFILE})
+    assert response.status_code == 200
+    assert response.json()["meal_plan"]["generator"] == "local"
+    assert len(response.json()["meal_plan"]["days"]) == 7
+
+    assert client.post("/build-meal-plan/1", json={}).status_code == 400
+
+def test_worded_exclusions_remove_the_food():
+    """"no pork" and "mushroom allergy" exclude the food they name, as a bare "pork" does."""
+    table = meal_planner.recipes()
+    pork = table.containing(table.food_rows("pork"))
+    assert pork.any()
+    for constraints in (["no pork"], ["pork-free"], ["pork"]):
+        assert not (meal_planner.allowed_recipes(table, {"constraints": constraints}) & pork).any()
+    mushrooms = table.containing(table.food_rows("mushroom"))
+    assert not (meal_planner.allowed_recipes(table, {"constraints": ["mushroom allergy"]}) & mushrooms).any()
+    assert meal_planner.canonical_profile({**PROFILE, "constraints": ["no pork"]})["constraints"] == ["mushrooms", "pork"]
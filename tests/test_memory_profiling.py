@@ -0,0 +1,47 @@
+import pytest
+
+import memory_profiling
+from config import settings
+
+ADMIN = {"X-Admin-Token": "secret"}
+
+@pytest.fixture
+def admin(monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+    yield
+    memory_profiling.stop()
+
+_retained = []
+
+def grow():
+    _retained.extend(bytearray(1024) for _ in range(2000))
+
+def test_snapshot_diff_points_at_allocating_line(client, admin):
+    """A diff between snapshots shows where memory grew, grouped by file and line."""
+    assert client.post("/admin/memory/tracemalloc/start", headers=ADMIN).json()["tracing"] is True
+    assert client.post("/admin/memory/snapshots/before", headers=ADMIN).status_code == 200
+    grow()
+    assert client.post("/admin/memory/snapshots/after", headers=ADMIN).status_code == 200
+
+    response = client.get("/admin/memory/diff?base=before&target=after&top=5", headers=ADMIN)
+    assert response.status_code == 200
+    top = response.json()["stats"][0]
+    assert top["location"].endswith(f"test_memory_profiling.py:{grow.__code__.co_firstlineno + 1}")
+    assert top["size_diff_bytes"] > 2000 * 1024
+    _retained.clear()
+
+def test_snapshots_are_bounded_and_require_tracing(client, admin, monkeypatch):
+    """Snapshots need tracemalloc running and only the newest MEMORY_SNAPSHOT_LIMIT are kept."""
+    assert client.post("/admin/memory/snapshots/x", headers=ADMIN).status_code == 409
+    monkeypatch.setattr(settings, "MEMORY_SNAPSHOT_LIMIT", 2)
+    client.post("/admin/memory/tracemalloc/start", headers=ADMIN)
+    for name in ["a", "b", "c"]:
+        client.post(f"/admin/memory/snapshots/{name}", headers=ADMIN)
+    status = client.get("/admin/memory", headers=ADMIN).json()
+    assert [snapshot["name"] for snapshot in status["snapshots"]] == ["b", "c"]
+    assert status["rss_bytes"] > 0
+    assert client.get("/admin/memory/diff?base=a", headers=ADMIN).status_code == 404
+
+def test_memory_gauges_are_per_worker(client):
+    """RSS is exported with a pid label so workers can be told apart."""
+    assert 'process_resident_memory_bytes{pid="' in client.get("/metrics").text
@@ -0,0 +1,62 @@
+import json
+import os
+
+import metrics
+from config import settings
+
+def test_histogram_exposition():
+    """Histograms render cumulative buckets, sum and count."""
+    hist = metrics.Histogram("test_latency_seconds", "Test latency", ["route"], buckets=(0.1, 1.0))
+    hist.observe(0.05, route="/a")
+    hist.observe(0.1, route="/a")
+    hist.observe(3, route="/a")
+    family = {"test_latency_seconds": {
+        "type": "histogram", "documentation": "Test latency", "labelnames": ["route"], "buckets": [0.1, 1.0],
+        "mode": "sum", "samples": [[list(key), value] for key, value in hist.samples().items()],
+    }}
+    text = metrics.generate_latest(family)
+    assert '# TYPE test_latency_seconds histogram' in text
+    assert 'test_latency_seconds_bucket{route="/a",le="0.1"} 2' in text
+    assert 'test_latency_seconds_bucket{route="/a",le="1.0"} 2' in text
+    assert 'test_latency_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 'test_latency_seconds_count{route="/a"} 3' in text
+
+def test_metrics_endpoint_uses_route_templates(client, db, make_user):
+    """Request metrics are labelled by route template, not raw URL."""
+    user = make_user("metrics")
+    client.get(f"/users/{user.id}/habit-logs")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_requests_total{method="GET",route="/users/{user_id}/habit-logs",status="200"}' in response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/users/{user_id}/habit-logs"}' in response.text
+    assert "http_requests_in_flight" in response.text
+    assert "db_pool_checkedout" in response.text
+
+def test_multiprocess_snapshots_are_merged(tmp_path, monkeypatch):
+    """Scrapes add up every worker's counters, and dead workers keep counters but lose gauges."""
+    monkeypatch.setattr(settings, "METRICS_MULTIPROC_DIR", str(tmp_path))
+    requests_counter = metrics.counter("test_worker_requests_total", "Test requests", ["route"])
+    in_flight = metrics.gauge("test_worker_in_flight", "Test in-flight requests")
+    requests_counter.inc(2, route="/a")
+    in_flight.set(1)
+
+    other_worker = {
+        "test_worker_requests_total": {"type": "counter", "documentation": "Test requests", "labelnames": ["route"],
+                                       "buckets": [], "mode": "sum", "samples": [[["/a"], 3]]},
+        "test_worker_in_flight": {"type": "gauge", "documentation": "Test in-flight requests", "labelnames": [],
+                                  "buckets": [], "mode": "sum", "samples": [[[], 4]]},
+    }
+    with open(tmp_path / "worker_999999.json", "w") as f:
+        json.dump(other_worker, f)
+
+    merged = metrics.collect()
+    assert merged["test_worker_requests_total"]["samples"] == [[["/a"], 5]]
+    assert merged["test_worker_in_flight"]["samples"] == [[[], 5]]
+
+    metrics.mark_process_dead(999999)
+    assert not os.path.exists(tmp_path / "worker_999999.json")
+    merged = metrics.collect()
+    assert merged["test_worker_requests_total"]["samples"] == [[["/a"], 5]]
+    assert merged["test_worker_in_flight"]["samples"] == [[[], 1]]
@@ -0,0 +1,71 @@
+import mmap
+import shutil
+
+import numpy as np
+import pytest
+
+import nutrient_db
+
+@pytest.fixture
+def foods(tmp_path):
+    """A nutrient database built from the bundled CSV into a temporary file."""
+    source = tmp_path / "foods.csv"
+    shutil.copy(nutrient_db.SOURCE_FILE, source)
+    nutrient_db.build(str(source), str(tmp_path / "foods.bin"))
+    return nutrient_db.open_file(str(tmp_path / "foods.bin"))
+
+def test_columns_are_memory_mapped(foods):
+    """Every column is a view over the read-only mapping, not a copy."""
+    assert isinstance(foods._buffer, mmap.mmap)
+    for column in ("id", "kcal", "protein_g", "diet_mask", "allergen_mask"):
+        array = getattr(foods, column)
+        assert not array.flags.owndata and not array.flags.writeable
+
+def test_lookup_by_id(foods):
+    """A food is found by id with its nutrients, diets, allergens and synonyms."""
+    tofu = foods.get(55)
+    assert tofu["name"] == "firm tofu"
+    assert tofu["category"] == "soy"
+    assert tofu["protein_g"] == 17.3
+    assert tofu["diets"] == ["pescatarian", "vegetarian", "vegan"]
+    assert tofu["allergens"] == ["soy"]
+    assert "tofu" in tofu["synonyms"]
+    assert foods.get(99999) is None
+
+def test_categories_are_contiguous(foods):
+    """Each category's rows form one slice covering exactly its foods."""
+    seen = []
+    for category in foods.categories:
+        rows = foods.category_rows(category)
+        assert all(foods.food(row)["category"] == category for row in rows)
+        seen.extend(rows)
+    assert sorted(seen) == list(range(len(foods)))
+    assert len(foods.category_rows("no_such_category")) == 0
+
+def test_select_by_diet_and_allergens(foods):
+    """select() combines the diet and allergen bitmasks with an optional category."""
+    rows = foods.select("vegan", ["nuts", "sesame"], "nuts_seeds")
+    names = {foods.name(row) for row in rows}
+    assert {"chia seeds", "pumpkin seeds"} <= names
+    assert not names & {"almonds", "cashews", "tahini", "sesame seeds"}
+    vegetarian = foods.select("vegetarian")
+    assert all("vegetarian" in foods.food(row)["diets"] for row in vegetarian)
+    assert len(foods.select()) == len(foods)
+
+def test_find_by_name_or_synonym(foods):
+    """Names and synonyms resolve case-insensitively."""
+    assert foods.name(foods.find("Shrimp")) == "prawns"
+    assert foods.name(foods.find("prawns")) == "prawns"
+    assert foods.find("unobtainium") is None
+
+def test_load_rebuilds_a_stale_file(tmp_path):
+    """A binary older than its CSV is rebuilt on load."""
+    source, target = tmp_path / "foods.csv", tmp_path / "foods.bin"
+    shutil.copy(nutrient_db.SOURCE_FILE, source)
+    nutrient_db.build(str(source), str(target))
+    with open(source, "a") as f:
+        f.write("999,test food,fruit,10,1,2,0,0,vegan,,\n")
+
+    db = nutrient_db.load.__wrapped__(str(target), str(source))
+    assert db.get(999)["name"] == "test food"
+    assert np.array_equal(db.id[db.id_order], np.sort(db.id))
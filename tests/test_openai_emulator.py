@@ -0,0 +1,60 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from openai_emulator import Latency, PROFILE, REPLY
+from ai_profiling_service import AIProfilingService
+import openai_service
+
+def test_latency_distributions():
+    """Latency specs parse and sample non-negative seconds."""
+    import random
+    rng = random.Random(0)
+    assert Latency("fixed:250").sample(rng) == 0.25
+    assert 0.1 <= Latency("uniform:100:200").sample(rng) <= 0.2
+    assert Latency("lognormal:400:0.5").sample(rng) > 0
+    with pytest.raises(ValueError):
+        Latency("gamma:1:2")
+
+def test_completion_and_streaming_through_the_client(emulator):
+    """The real client gets replies and usage, streamed or not."""
+    service = openai_service.get_openai_service()
+    messages = [{"role": "user", "content": "Hello there"}]
+
+    async def scenario():
+        response = await service.respond(messages)
+        assert response.choices[0].message.content == REPLY
+        assert response.usage.completion_tokens > 0
+        before = openai_service.openai_tokens.get(operation="respond", kind="completion")
+        assert await service.respond(messages, stream=True) == REPLY
+        assert openai_service.openai_tokens.get(operation="respond", kind="completion") > before
+
+    asyncio.run(scenario())
+    assert emulator.stats["streamed"] == 1
+
+def test_save_profile_tool_call_completes_profiling(emulator):
+    """After enough assistant replies the emulator calls save_profile."""
+    service = AIProfilingService()
+    session = {"user_id": 1, "conversation_history": [], "collected_data": {}, "is_complete": False, "profile_data": None}
+
+    async def conversation():
+        result = None
+        for answer in ["Instagram", "My wedding", "I'm 165cm and 72kg"]:
+            result = await service.process_user_response(session, answer)
+        return result
+
+    result = asyncio.run(conversation())
+    assert result["is_complete"] is True
+    assert result["session_data"]["profile_data"] == PROFILE
+
+def test_rate_limits_are_retried_by_the_client(emulator):
+    """Injected 429s go through the client's retries before the call fails."""
+    emulator.rate_limit_rate = 1.0
+    service = openai_service.get_openai_service()
+    with pytest.raises(openai_service.UpstreamError):
+        asyncio.run(service.respond([{"role": "user", "content": "Hi"}]))
+    assert emulator.stats["rate_limited"] == service.client.max_retries + 1
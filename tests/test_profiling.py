@@ -0,0 +1,71 @@
+import os
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import profiling
+from config import settings
+
+@pytest.fixture
+def profiled_client(tmp_path, monkeypatch):
+    """A small app wrapped in the profiling middleware, writing to a temporary directory."""
+    monkeypatch.setattr(settings, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(settings, "PROFILING_SECRET", "profile-secret")
+    monkeypatch.setattr(settings, "PROFILING_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "PROFILING_MAX_FILES", 2)
+    monkeypatch.setattr(settings, "PROFILING_RATE_LIMIT_PER_MINUTE", 3)
+    monkeypatch.setattr(profiling, "state", profiling.ProfilerState())
+
+    app = FastAPI()
+
+    @app.get("/slow/{item}")
+    async def slow(item: str):
+        return {"total": sum(i * i for i in range(10000))}
+
+    app.add_middleware(profiling.ProfilingMiddleware)
+    return TestClient(app)
+
+def test_signed_request_is_profiled(profiled_client, tmp_path):
+    """A valid signature produces a stored profile named in the response."""
+    response = profiled_client.get("/slow/a", headers={"X-Profile-Request": profiling.sign("GET", "/slow/a")})
+    assert response.status_code == 200
+    name = response.headers["X-Profile-Id"]
+    assert os.path.exists(tmp_path / name)
+
+def test_bad_or_stale_signatures_are_ignored(profiled_client):
+    """Wrong paths, wrong secrets and old timestamps don't trigger profiling."""
+    for header in [
+        profiling.sign("GET", "/slow/other"),
+        profiling.sign("GET", "/slow/a", secret="wrong"),
+        profiling.sign("GET", "/slow/a", timestamp=int(time.time()) - 3600),
+    ]:
+        response = profiled_client.get("/slow/a", headers={"X-Profile-Request": header})
+        assert response.status_code == 200
+        assert "X-Profile-Id" not in response.headers
+
+def test_rate_limit_and_directory_bound(profiled_client, tmp_path):
+    """At most PROFILING_RATE_LIMIT_PER_MINUTE profiles are taken and only PROFILING_MAX_FILES are kept."""
+    profiling.state.arm("/slow/", 5)
+    profiled = [("X-Profile-Id" in profiled_client.get(f"/slow/{i}").headers) for i in range(5)]
+    assert profiled == [True, True, True, False, False]
+    assert len(os.listdir(tmp_path)) == 2
+
+def test_admin_arm_requires_profiling_enabled(client, monkeypatch):
+    """Arming is refused while profiling is disabled."""
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(settings, "PROFILING_ENABLED", False)
+    response = client.post("/admin/profiling/arm", json={"path_prefix": "/users/"}, headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 409
+
+def test_refused_armed_request_keeps_its_slot(profiled_client):
+    """An armed request refused while the profiler is busy leaves the armed profile for the next one."""
+    profiling.state.arm("/slow/", 1)
+    assert profiling.state.acquire() is None
+    assert "X-Profile-Id" not in profiled_client.get("/slow/a").headers
+    assert profiling.state.armed()["remaining"] == 1
+
+    profiling.state.release()
+    assert "X-Profile-Id" in profiled_client.get("/slow/b").headers
+    assert profiling.state.armed()["remaining"] == 0
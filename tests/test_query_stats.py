@@ -0,0 +1,54 @@
+import logging
+
+from config import settings
+from models import User
+from query_stats import QueryStats, statement_shape, track_queries
+
+def test_statement_shape_ignores_parameters():
+    """Statements that differ only in their bind lists share a shape."""
+    assert statement_shape("SELECT * FROM users\n  WHERE id IN (?, ?, ?)") == "SELECT * FROM users WHERE id IN (...)"
+    assert statement_shape("SELECT * FROM users WHERE id IN (?)") == "SELECT * FROM users WHERE id IN (...)"
+
+def test_repeated_shapes_are_flagged():
+    """Shapes executed more often than the threshold are reported."""
+    stats = QueryStats()
+    for _ in range(4):
+        stats.record("SELECT * FROM habit_targets WHERE id = ?", 0.001)
+    stats.record("SELECT * FROM users WHERE id = ?", 0.001)
+    assert stats.count == 5
+    assert stats.repeated(3) == [("SELECT * FROM habit_targets WHERE id = ?", 4)]
+
+def test_track_queries_uses_current_context(db, make_user):
+    """Statements run inside the block are counted for it."""
+    user_id = make_user("queries").id
+    with track_queries() as stats:
+        db.query(User).filter(User.id == user_id).first()
+    assert stats.count == 1
+    assert stats.duration > 0
+
+def test_response_headers_report_queries(client, db, make_user):
+    """Every response carries the statement count and database time."""
+    user_id = make_user("queries").id
+    response = client.get(f"/users/{user_id}/habit-logs")
+    assert response.status_code == 200
+    assert int(response.headers["X-DB-Query-Count"]) == 2  # user lookup, log rows
+    assert float(response.headers["X-DB-Time-Ms"]) >= 0
+
+def test_create_habit_log_query_budget(client, db, query_budget, make_user):
+    """Creating a habit log stays within its query budget."""
+    user_id = make_user("queries").id
+    with query_budget(3):  # user lookup, duplicate check, insert
+        response = client.post(f"/users/{user_id}/habit-logs",
+                               json={"log_date": "2024-01-15", "habit_type": "water", "logged_value": 1500, "unit": "ml"})
+    assert response.status_code == 200
+
+def test_n_plus_one_is_logged(client, db, monkeypatch, caplog, make_user):
+    """A request repeating one statement shape past the threshold logs a warning."""
+    user_id = make_user("queries").id
+    for day in range(1, 4):
+        client.post(f"/users/{user_id}/habit-targets",
+                    json={"habit_type": f"habit{day}", "target_value": 1, "target_unit": "count"})
+    monkeypatch.setattr(settings, "N_PLUS_ONE_THRESHOLD", 0)
+    with caplog.at_level(logging.WARNING, logger="query_stats"):
+        client.get(f"/users/{user_id}/habit-logs")
+    assert "Possible N+1 on GET /users/{user_id}/habit-logs" in caplog.text
@@ -0,0 +1,51 @@
+import json
+import logging
+
+import pytest
+
+import request_logging
+from config import settings
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+@pytest.fixture
+def access_log():
+    """Run the access log listener with an in-memory handler."""
+    handler = ListHandler()
+    handler.setFormatter(request_logging.JSONFormatter())
+    request_logging.start([handler])
+    yield handler
+    request_logging.stop()
+
+def records(handler):
+    return [json.loads(line) for line in handler.lines]
+
+def test_access_records_are_structured(client, access_log, monkeypatch):
+    """Each logged request is a JSON record with route, status, timing and query counts."""
+    monkeypatch.setattr(settings, "ACCESS_LOG_SAMPLE_RATE", 1.0)
+    client.get("/users/12345")
+    request_logging.stop()
+
+    [record] = records(access_log)
+    assert record["method"] == "GET"
+    assert record["path"] == "/users/12345"
+    assert record["route"] == "/users/{user_id}"
+    assert record["status"] == 404
+    assert record["duration_ms"] >= 0
+    assert record["db_queries"] == 1
+
+def test_successful_requests_are_sampled(client, access_log, monkeypatch):
+    """With sampling at zero only non-2xx responses are logged."""
+    monkeypatch.setattr(settings, "ACCESS_LOG_SAMPLE_RATE", 0.0)
+    for _ in range(5):
+        client.get("/health")
+    client.get("/users/12345")
+    request_logging.stop()
+
+    assert [record["status"] for record in records(access_log)] == [404]
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+import slow_query_log
+from config import settings
+from crud import get_user_by_email
+from models import User
+
+@pytest.fixture
+def slow_log(tmp_path, monkeypatch):
+    """Log every statement as slow into a temporary file."""
+    monkeypatch.setattr(settings, "SLOW_QUERY_LOG_ENABLED", True)
+    monkeypatch.setattr(settings, "SLOW_QUERY_THRESHOLD_MS", 0)
+    monkeypatch.setattr(settings, "SLOW_QUERY_EXPLAIN", True)
+    monkeypatch.setattr(settings, "SLOW_QUERY_LOG_FILE", str(tmp_path / "slow.log"))
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+    slow_query_log.reset()
+    yield tmp_path / "slow.log"
+    slow_query_log.reset()
+
+def test_slow_queries_are_logged_with_plan_and_caller(db, slow_log):
+    """Slow statements are written with redacted parameters, caller and plan."""
+    get_user_by_email(db, "private@example.com")
+
+    entries = [json.loads(line) for line in slow_log.read_text().splitlines()]
+    entry = next(e for e in entries if e["function"] == "crud.get_user_by_email")
+    assert entry["statement"].startswith("SELECT")
+    assert "private@example.com" not in json.dumps(entry)
+    assert entry["parameters"][0] == "<str:19>"
+    assert entry["plan"]
+
+def test_admin_summary_lists_top_statements(client, db, slow_log):
+    """The admin endpoint ranks statement shapes by total time."""
+    for i in range(3):
+        db.add(User(email=f"slow{i}@example.com", username=f"slow{i}", hashed_password="x"))
+        db.commit()
+
+    response = client.get("/admin/slow-queries?top=1", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    queries = response.json()["queries"]
+    assert len(queries) == 1
+    assert queries[0]["count"] >= 1
+    assert queries[0]["total_ms"] >= queries[0]["max_ms"]
+
+def test_admin_endpoints_require_token(client, monkeypatch):
+    """Admin endpoints reject bad tokens and are hidden when no token is configured."""
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+    assert client.get("/admin/slow-queries", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "")
+    assert client.get("/admin/slow-queries", headers={"X-Admin-Token": ""}).status_code == 404
+
+def test_failed_postgres_explain_rolls_back_to_a_savepoint():
+    """A failing EXPLAIN on PostgreSQL is undone with its savepoint so the request's transaction survives."""
+    executed = []
+
+    class Cursor:
+        def execute(self, sql, parameters=None):
+            executed.append(sql)
+            if sql.startswith("EXPLAIN"):
+                raise RuntimeError("permission denied")
+
+        def close(self):
+            pass
+
+    class Conn:
+        class dialect:
+            name = "postgresql"
+
+        class connection:
+            class driver_connection:
+                autocommit = False
+
+                @staticmethod
+                def cursor():
+                    return Cursor()
+
+    assert slow_query_log.explain(Conn, "SELECT 1", ()) is None
+    assert executed == ["SAVEPOINT slow_query_explain", "EXPLAIN SELECT 1",
+                        "ROLLBACK TO SAVEPOINT slow_query_explain", "RELEASE SAVEPOINT slow_query_explain"]
@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import tracing
+from config import settings
+from models import User
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+TRACEPARENT = f"00-{TRACE_ID}-00f067aa0ba902b7-01"
+
+@pytest.fixture
+def spans(monkeypatch):
+    """Enable tracing with an in-memory exporter."""
+    exporter = tracing.InMemoryExporter(1000)
+    monkeypatch.setattr(settings, "TRACING_ENABLED", True)
+    monkeypatch.setattr(tracing, "exporter", exporter)
+    return exporter
+
+def test_parse_traceparent():
+    """Valid W3C headers are parsed; malformed or all-zero ids are rejected."""
+    assert tracing.parse_traceparent(TRACEPARENT) == (TRACE_ID, "00f067aa0ba902b7", True)
+    assert tracing.parse_traceparent(f"00-{TRACE_ID}-00f067aa0ba902b7-00")[2] is False
+    assert tracing.parse_traceparent("00-" + "0" * 32 + "-00f067aa0ba902b7-01") is None
+    assert tracing.parse_traceparent("garbage") is None
+
+def test_request_sql_and_function_spans_share_the_callers_trace(spans, db, make_user):
+    """The server span continues the incoming trace and SQL and traced functions nest under it."""
+    user = make_user("trace")
+
+    @tracing.traced("work.lookup")
+    def lookup(user_id):
+        return db.query(User).filter(User.id == user_id).first()
+
+    app = FastAPI()
+
+    @app.get("/users/{user_id}")
+    def read(user_id: int):
+        return {"email": lookup(user_id).email}
+
+    app.add_middleware(tracing.TracingMiddleware)
+    response = TestClient(app).get(f"/users/{user.id}", headers={"traceparent": TRACEPARENT})
+    assert response.status_code == 200
+    assert response.headers["traceresponse"].startswith(f"00-{TRACE_ID}-")
+
+    by_name = {span.name: span for span in spans.spans(TRACE_ID)}
+    server, function, query = by_name["GET /users/{user_id}"], by_name["work.lookup"], by_name["db.query"]
+    assert server.parent_id == "00f067aa0ba902b7"
+    assert server.kind == "server"
+    assert server.attributes["http.response.status_code"] == 200
+    assert function.parent_id == server.span_id
+    assert query.parent_id == function.span_id
+    assert query.attributes["db.statement"].startswith("SELECT")
+
+def test_unsampled_traces_record_nothing(spans, monkeypatch):
+    """With sampling off no spans are exported, but context still flows."""
+    monkeypatch.setattr(settings, "TRACING_SAMPLE_RATE", 0.0)
+
+    async def scenario():
+        with tracing.start_span("root") as root:
+            with tracing.start_span("child") as child:
+                return root, child
+
+    root, child = asyncio.run(scenario())
+    assert not root.recording and child is root
+    assert spans.spans() == []
+
+def test_incoming_sampled_flag_cannot_force_recording(spans, monkeypatch):
+    """The server applies its own sample rate; a caller's sampled flag only carries the trace id."""
+    monkeypatch.setattr(settings, "TRACING_SAMPLE_RATE", 0.0)
+    with tracing.start_span("server", traceparent=TRACEPARENT) as span:
+        assert span.trace_id == TRACE_ID and not span.recording
+    assert spans.spans() == []
+
+    monkeypatch.setattr(settings, "TRACING_SAMPLE_RATE", 1.0)
+    with tracing.start_span("server", traceparent=f"00-{TRACE_ID}-00f067aa0ba902b7-00") as span:
+        assert span.recording
+    assert [span.name for span in spans.spans(TRACE_ID)] == ["server"]
+
+def test_errors_mark_the_span(spans):
+    """Exceptions set an error status on the span."""
+    with pytest.raises(ValueError):
+        with tracing.start_span("failing"):
+            raise ValueError("boom")
+    [span] = spans.spans()
+    assert span.status == "error"
+    assert span.to_dict()["status"]["message"] == "ValueError: boom"
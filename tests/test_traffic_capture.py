@@ -0,0 +1,123 @@
+import json
+import logging
+import os
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+import traffic_capture
+from config import settings
+from main import app
+from traffic_capture import TrafficCaptureMiddleware, scrub
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+from replay_traffic import request_path  # noqa: E402
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+@pytest.fixture
+def captured(client, monkeypatch):
+    """A client whose requests all go through the capture middleware, and the captured records."""
+    monkeypatch.setattr(settings, "TRAFFIC_CAPTURE_SAMPLE_RATE", 1.0)
+    handler = ListHandler()
+    handler.setFormatter(traffic_capture.JSONFormatter())
+    traffic_capture.start([handler])
+    records = []
+
+    def flush():
+        traffic_capture.stop()
+        records.extend(json.loads(line) for line in handler.lines)
+        return records
+
+    yield TestClient(TrafficCaptureMiddleware(app), raise_server_exceptions=False), flush
+    traffic_capture.stop()
+
+def test_scrub_keeps_shape_but_not_personal_data():
+    """Emails and names are pseudonymised; only allowlisted enum, date and id values are kept."""
+    body = {
+        "email": "jane.doe@gmail.com",
+        "username": "janedoe",
+        "password": "hunter2!",
+        "habit_type": "water",
+        "logged_value": 750.5,
+        "log_date": "2026-01-02",
+        "notes": "Felt dizzy after lunch",
+        "tags": ["I skipped breakfast today", "ok"],
+        "phone": "+61412345678",
+        "date_of_birth": "1990-04-12",
+        "allergies": ["peanuts"],
+        "carb_choices": ["rice", "Jane Doe"],
+        "user_id": "jane",
+    }
+    scrubbed = scrub(body)
+    assert scrubbed["email"].endswith("@example.com") and "jane" not in scrubbed["email"]
+    assert scrubbed["email"] == scrub(body)["email"]
+    assert scrubbed["username"].startswith("user-") and scrubbed["username"] != "janedoe"
+    assert scrubbed["password"] != "hunter2!" and len(scrubbed["password"]) == len("hunter2!")
+    assert scrubbed["notes"] != body["notes"] and len(scrubbed["notes"]) == len(body["notes"])
+    assert scrubbed["tags"] == [scrub("I skipped breakfast today"), scrub("ok")] and "breakfast" not in scrubbed["tags"][0]
+    for key in ("phone", "date_of_birth", "user_id"):
+        assert scrubbed[key] != body[key] and len(scrubbed[key]) == len(body[key])
+    assert scrubbed["allergies"] != ["peanuts"]
+    assert scrubbed["carb_choices"][0] == "rice" and scrubbed["carb_choices"][1] != "Jane Doe"
+    assert (scrubbed["habit_type"], scrubbed["logged_value"], scrubbed["log_date"]) == ("water", 750.5, "2026-01-02")
+
+def test_requests_are_captured_with_route_and_scrubbed_body(captured):
+    """A captured request has its route template, parameters, status and a scrubbed JSON body."""
+    client, flush = captured
+    client.post("/users/1/habit-logs", json={"log_date": "2026-01-02", "habit_type": "water",
+                                              "logged_value": 500, "unit": "ml", "notes": "after the gym"},
+                headers={"Idempotency-Key": "abc"})
+
+    [record] = flush()
+    assert record["method"] == "POST"
+    assert record["route"] == "/users/{user_id}/habit-logs"
+    assert record["path_params"] == {"user_id": "1"}
+    assert record["idempotency_key"] is True
+    assert record["status"] == 404
+    assert record["duration_ms"] >= 0
+    assert record["body"]["habit_type"] == "water" and record["body"]["notes"] != "after the gym"
+    assert "path" not in record
+
+def test_signup_credentials_are_never_written(captured):
+    """Passwords and emails in a signup never reach the capture file."""
+    client, flush = captured
+    client.post("/users/", json={"email": "jane.doe@gmail.com", "username": "janedoe",
+                                 "full_name": "Jane Doe", "password": "correct horse battery"})
+
+    [record] = flush()
+    line = json.dumps(record)
+    for secret in ("jane.doe@gmail.com", "janedoe", "Jane Doe", "correct horse battery"):
+        assert secret not in line
+
+def test_operator_traffic_and_unsampled_requests_are_skipped(captured, monkeypatch):
+    """/admin and /metrics are never captured, and a zero sample rate captures nothing."""
+    client, flush = captured
+    client.get("/metrics")
+    client.get("/admin/memory")
+    monkeypatch.setattr(settings, "TRAFFIC_CAPTURE_SAMPLE_RATE", 0.0)
+    client.get("/users/1")
+    assert flush() == []
+
+def test_replay_rebuilds_the_captured_path(captured):
+    """The replay tool turns a record back into the request path, query string included."""
+    client, flush = captured
+    client.get("/users/1/habit-logs?habit_type=water&limit=5")
+    client.get("/users/1/jane-doe")
+
+    matched, unmatched = flush()
+    assert request_path(matched) == "/users/1/habit-logs?habit_type=water&limit=5"
+    # Unmatched paths keep route words and ids only
+    assert request_path(unmatched) == "/users/1/" + traffic_capture._filler(len("jane-doe"))
+
+def test_each_worker_writes_its_own_capture_file():
+    """Workers sharing one rotating file would interleave records when it rolls over."""
+    assert traffic_capture.capture_file("logs/traffic.ndjson", pid=42) == "logs/traffic.42.ndjson"
+    assert traffic_capture.capture_file("logs/traffic.ndjson") == f"logs/traffic.{os.getpid()}.ndjson"
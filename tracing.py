@@ -0,0 +1,326 @@
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import settings
+from query_stats import statement_shape
+
+logger = logging.getLogger(__name__)
+
+# W3C trace context: version-traceid-parentid-flags
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+class Span:
+    """
+    One timed operation in a trace.
+
+    Ids, kinds and the exported field names follow the OpenTelemetry data
+    model (OTLP JSON), so the files can be loaded into OTel tooling.
+    """
+
+    recording = True
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None, kind: str = "internal",
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.status = "unset"
+        self.status_message: Optional[str] = None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.status = "error"
+        self.status_message = f"{type(exc).__name__}: {exc}"
+
+    def end(self) -> None:
+        self.end_ns = time.time_ns()
+        if exporter is not None:
+            exporter.export(self)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": f"SPAN_KIND_{self.kind.upper()}",
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": self.attributes,
+            "status": {"code": f"STATUS_CODE_{self.status.upper()}", "message": self.status_message or ""},
+            "resource": {"service.name": settings.PROJECT_NAME, "process.pid": os.getpid()},
+        }
+
+class NonRecordingSpan:
+    """Carries trace context for unsampled traces; everything else is a no-op."""
+
+    recording = False
+
+    def __init__(self, trace_id: str = "0" * 32, span_id: str = "0" * 16):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def record_exception(self, exc: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+_NOOP = NonRecordingSpan()
+_current_span: ContextVar[Optional[Any]] = ContextVar("current_span", default=None)
+
+def current_span():
+    """The active span, or a no-op span outside any trace."""
+    return _current_span.get() or _NOOP
+
+def parse_traceparent(value: Optional[str]):
+    """Return (trace_id, parent_span_id, sampled) from a traceparent header, or None if invalid."""
+    match = _TRACEPARENT.match((value or "").strip().lower())
+    if not match or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return match.group(1), match.group(2), bool(int(match.group(3), 16) & 1)
+
+def format_traceparent(span) -> str:
+    return f"00-{span.trace_id}-{span.span_id}-{'01' if span.recording else '00'}"
+
+@contextmanager
+def start_span(name: str, kind: str = "internal", attributes: Optional[Dict[str, Any]] = None,
+               traceparent: Optional[str] = None) -> Iterator[Any]:
+    """
+    Run the enclosed block as a span, child of the current span.
+
+    A new trace is started at the root (or continued from an incoming
+    traceparent) and sampled with TRACING_SAMPLE_RATE. The incoming sampled
+    flag is ignored: callers are untrusted and must not be able to force
+    every request to be recorded. Children of an unsampled trace cost a
+    context variable lookup.
+    """
+    if not settings.TRACING_ENABLED:
+        yield _NOOP
+        return
+    parent = _current_span.get()
+    if parent is not None and not parent.recording:
+        yield parent
+        return
+
+    if parent is not None:
+        span = Span(name, parent.trace_id, parent.span_id, kind, attributes)
+    else:
+        incoming = parse_traceparent(traceparent)
+        if incoming:
+            trace_id, parent_id, _ = incoming
+        else:
+            trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+        if random.random() >= settings.TRACING_SAMPLE_RATE:
+            span = NonRecordingSpan(trace_id, f"{random.getrandbits(64):016x}")
+        else:
+            span = Span(name, trace_id, parent_id, kind, attributes)
+
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as exc:
+        span.record_exception(exc)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+
+def traced(name: Optional[str] = None, kind: str = "internal"):
+    """Decorator running each call of a sync or async function in a span."""
+    def decorator(func: Callable) -> Callable:
+        span_name = name or f"{func.__module__}.{func.__qualname__}"
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not settings.TRACING_ENABLED:
+                    return await func(*args, **kwargs)
+                with start_span(span_name, kind):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not settings.TRACING_ENABLED:
+                return func(*args, **kwargs)
+            with start_span(span_name, kind):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+def instrument_module(namespace: Dict[str, Any], module_name: str, prefix: str,
+                      span_names: Optional[Dict[str, str]] = None) -> None:
+    """Wrap every public function defined in a module with a span; used at the bottom of crud.py."""
+    span_names = span_names or {}
+    for attr, value in list(namespace.items()):
+        if attr.startswith("_") or not inspect.isfunction(value) or value.__module__ != module_name:
+            continue
+        namespace[attr] = traced(span_names.get(attr, f"{prefix}.{attr}"))(value)
+
+# Exporters
+class InMemoryExporter:
+    """Keep the most recent finished spans in memory (tests, /admin/traces)."""
+
+    def __init__(self, max_spans: int):
+        self._spans: deque = deque(maxlen=max_spans)
+
+    def export(self, span: Span) -> None:
+        self._spans.append(span)
+
+    def spans(self, trace_id: Optional[str] = None) -> List[Span]:
+        return [span for span in list(self._spans) if trace_id is None or span.trace_id == trace_id]
+
+    def clear(self) -> None:
+        self._spans.clear()
+
+    def shutdown(self) -> None:
+        pass
+
+class JSONLExporter(InMemoryExporter):
+    """Append finished spans as OTLP-style JSON lines to a local file from a background thread."""
+
+    def __init__(self, path: str, max_spans: int):
+        super().__init__(max_spans)
+        self.path = path
+        self._queue: queue.Queue = queue.Queue(maxsize=max_spans)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        super().export(span)
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                    self._thread.start()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            logger.debug("Trace export queue full - span dropped")
+
+    def _run(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        while True:
+            span = self._queue.get()
+            if span is None:
+                return
+            batch = [span]
+            while len(batch) < 512:
+                try:
+                    span = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if span is None:
+                    self._write(batch)
+                    return
+                batch.append(span)
+            self._write(batch)
+
+    def _write(self, batch: List[Span]) -> None:
+        try:
+            with open(self.path, "a") as f:
+                f.writelines(json.dumps(span.to_dict(), default=str) + "\n" for span in batch)
+        except OSError as e:
+            logger.warning(f"Could not write traces: {e}")
+
+    def shutdown(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+def _create_exporter():
+    if settings.TRACING_EXPORTER == "memory":
+        return InMemoryExporter(settings.TRACING_MAX_SPANS)
+    return JSONLExporter(settings.TRACING_FILE, settings.TRACING_MAX_SPANS)
+
+exporter = _create_exporter() if settings.TRACING_ENABLED else None
+
+# SQL statement spans
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    parent = _current_span.get()
+    if parent is None or not parent.recording or context is None:
+        return
+    context._trace_span = Span("db.query", parent.trace_id, parent.span_id, "client", {
+        "db.system": conn.dialect.name,
+        "db.statement": statement_shape(statement),
+    })
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    span = getattr(context, "_trace_span", None)
+    if span is not None:
+        if cursor.rowcount is not None and cursor.rowcount >= 0:
+            span.set_attribute("db.rowcount", cursor.rowcount)
+        span.end()
+        context._trace_span = None
+
+class TracingMiddleware:
+    """Server span per HTTP request, continuing the caller's W3C traceparent."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for name, value in scope.get("headers", []):
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+
+        with start_span(f"{scope['method']} {scope['path']}", "server",
+                        {"http.request.method": scope["method"], "url.path": scope["path"]},
+                        traceparent=traceparent) as span:
+            async def send_with_trace(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.response.status_code", message["status"])
+                    if message["status"] >= 500:
+                        span.status = "error"
+                    message = {**message, "headers": list(message.get("headers", [])) + [
+                        (b"traceresponse", format_traceparent(span).encode())]}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_trace)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if route and span.recording:
+                    span.name = f"{scope['method']} {route}"
+                    span.set_attribute("http.route", route)
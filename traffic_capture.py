@@ -0,0 +1,215 @@
+import hashlib
+import hmac
+import logging
+import os
+import queue
+import random
+import re
+import time
+from functools import lru_cache
+from logging.handlers import QueueListener, RotatingFileHandler
+from typing import Any, Optional
+from urllib.parse import parse_qsl
+
+import orjson
+
+from config import settings
+from metrics import counter
+from request_logging import JSONFormatter, NonBlockingQueueHandler
+
+capture_logger = logging.getLogger("traffic_capture")
+capture_logger.propagate = False
+capture_logger.setLevel(logging.INFO)
+
+dropped_captures = counter(
+    "traffic_capture_dropped_total",
+    "Captured requests dropped because the capture queue was full",
+)
+
+# Never captured: scrapes and operator traffic
+EXCLUDED_PREFIXES = ("/admin", "/metrics")
+
+# Strings are kept only under these keys, and only when they look like what
+# the key holds; everything else is replaced, whatever it looks like
+ENUM_KEYS = {
+    "habit_type", "unit", "target_unit", "activity_level", "stress_level", "energy_level",
+    "weight_goal", "role", "goal", "diet_style", "exercise_intensity", "seafood_frequency",
+    "carb_choices", "fat_choices", "kcal_confidence", "kind", "status",
+}
+DATE_KEYS = {"log_date", "start_date", "end_date", "week_start", "target_date", "month_year"}
+ID_KEYS = {"id", "user_id", "profile_id", "job_id", "year", "month", "skip", "limit", "days"}
+# Kept as consistent pseudonyms so a replayed signup stays valid and unique
+PSEUDONYM_KEYS = {"email", "username"}
+
+_EMAIL = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+_ENUM = re.compile(r"^[a-z][a-z0-9_\-]{0,39}$")
+_DATE = re.compile(r"^\d{4}-\d{2}(-\d{2})?$")
+_ID = re.compile(r"^\d{1,19}$")
+_FILLER = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+
+def _pseudonym(value: str) -> str:
+    return hmac.new(settings.SECRET_KEY.encode(), value.encode(), hashlib.sha256).hexdigest()[:12]
+
+def _filler(length: int) -> str:
+    # Same length as the original so prompts keep roughly the same token count
+    return (_FILLER * (length // len(_FILLER) + 1))[:length]
+
+def _allowed(value: str, key: Optional[str]) -> bool:
+    if key in ENUM_KEYS:
+        return bool(_ENUM.match(value))
+    if key in DATE_KEYS:
+        return bool(_DATE.match(value))
+    if key in ID_KEYS:
+        return bool(_ID.match(value))
+    return False
+
+def scrub(value: Any, key: Optional[str] = None) -> Any:
+    """
+    Copy of a JSON value with personal data removed but its shape kept.
+
+    Emails and usernames become stable pseudonyms. Other strings are kept
+    only under an allowlisted enum, date or id key and only when they look
+    like one; everything else becomes same-length filler. Numbers and
+    booleans are kept so replayed requests still validate.
+    """
+    if isinstance(value, dict):
+        return {k: scrub(v, k.lower()) for k, v in value.items()}
+    if isinstance(value, list):
+        return [scrub(item, key) for item in value]
+    if not isinstance(value, str):
+        return value
+    if key == "email" or _EMAIL.match(value):
+        return f"user-{_pseudonym(value)}@example.com"
+    if key in PSEUDONYM_KEYS:
+        return f"user-{_pseudonym(value)}"
+    if _allowed(value, key):
+        return value
+    return _filler(len(value))
+
+@lru_cache(maxsize=8)
+def _route_words(app) -> frozenset:
+    """Literal segments of the app's route templates, e.g. "users" and "habit-logs"."""
+    return frozenset(segment for route in getattr(app, "routes", []) for segment in getattr(route, "path", "").split("/")
+                     if segment and not segment.startswith("{"))
+
+def _scrub_path(path: str, app) -> str:
+    # Route words and numeric ids are kept; any other segment may be personal
+    words = _route_words(app)
+    return "/".join(segment if not segment or segment in words or _ID.match(segment) else _filler(len(segment))
+                    for segment in path.split("/"))
+
+def capture_file(path: str, pid: Optional[int] = None) -> str:
+    """Per-process capture file, e.g. logs/traffic.1234.ndjson, so workers never share a rotating file."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{os.getpid() if pid is None else pid}{ext}"
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+
+class _CaptureQueueHandler(NonBlockingQueueHandler):
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped_captures.inc()
+
+def start(handlers=None) -> None:
+    """Start the background writer for captured requests; call at application startup."""
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+    if handlers is None:
+        path = capture_file(settings.TRAFFIC_CAPTURE_FILE)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        file_handler = RotatingFileHandler(path, maxBytes=settings.TRAFFIC_CAPTURE_MAX_BYTES,
+                                           backupCount=settings.TRAFFIC_CAPTURE_BACKUP_COUNT)
+        file_handler.setFormatter(JSONFormatter())
+        handlers = [file_handler]
+    log_queue = queue.Queue(maxsize=settings.ACCESS_LOG_QUEUE_SIZE)
+    _queue_handler = _CaptureQueueHandler(log_queue)
+    capture_logger.addHandler(_queue_handler)
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+def stop() -> None:
+    """Flush queued captures and stop the writer; call at application shutdown."""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    capture_logger.removeHandler(_queue_handler)
+    _listener.stop()
+    _listener = None
+    _queue_handler = None
+
+class TrafficCaptureMiddleware:
+    """
+    Record a sample of requests for replay.
+
+    Each record has the method, route template, scrubbed path and query
+    parameters, the scrubbed JSON body, whether an Idempotency-Key was sent,
+    and the status and duration. Headers, cookies and response bodies are
+    never recorded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or _listener is None or scope["path"].startswith(EXCLUDED_PREFIXES)
+                or random.random() >= settings.TRAFFIC_CAPTURE_SAMPLE_RATE):
+            await self.app(scope, receive, send)
+            return
+
+        started = time.time()
+        start = time.perf_counter()
+        chunks = []
+        size = 0
+        status = 500
+
+        async def receive_and_record():
+            nonlocal size
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                size += len(body)
+                if size <= settings.TRAFFIC_CAPTURE_MAX_BODY_BYTES:
+                    chunks.append(body)
+            return message
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive_and_record, send_with_status)
+        finally:
+            self._record(scope, started, time.perf_counter() - start, status, chunks, size)
+
+    def _record(self, scope, started: float, duration: float, status: int, chunks, size: int) -> None:
+        headers = dict(scope.get("headers", []))
+        route = getattr(scope.get("route"), "path", None)
+        fields = {
+            "start": round(started, 3),
+            "method": scope["method"],
+            "route": route,
+            "path_params": scrub(scope.get("path_params", {})),
+            "query": scrub({key: value for key, value in parse_qsl(scope.get("query_string", b"").decode("latin-1"))}),
+            "idempotency_key": b"idempotency-key" in headers,
+            "status": status,
+            "duration_ms": round(duration * 1000, 2),
+        }
+        if route is None:
+            # Kept (scrubbed segment by segment) so unmatched requests replay too
+            fields["path"] = _scrub_path(scope["path"], scope.get("app"))
+        if size:
+            fields["body_bytes"] = size
+            if size <= settings.TRAFFIC_CAPTURE_MAX_BODY_BYTES and b"json" in headers.get(b"content-type", b""):
+                try:
+                    fields["body"] = scrub(orjson.loads(b"".join(chunks)))
+                except orjson.JSONDecodeError:
+                    pass
+        capture_logger.info("request", extra={"fields": fields})